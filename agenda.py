@@ -0,0 +1,123 @@
+import heapq
+from datetime import date, timedelta
+from itertools import islice
+
+from dates import parse_date
+from storage import priority_rank
+
+NO_DUE_DATE = date.max.toordinal() + 1
+
+
+def task_key(task):
+    due_date = parse_date(task.due_date)
+    return (due_date.toordinal() if due_date else NO_DUE_DATE, priority_rank(task.priority), task.id)
+
+
+class Agenda:
+    # Куча невыполненных задач по ключу (срок, ранг приоритета, id). Удаление
+    # ленивое: актуальный ключ каждой задачи лежит в keys, а устаревшие
+    # элементы кучи пропускаются при обходе и выбрасываются при перестройке.
+    # Для выборок по датам задачи дополнительно разложены по дням срока.
+    def __init__(self, repository):
+        self.repository = repository
+        self.loaded = False
+        repository.subscribe(self.on_change)
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        self.keys = {}
+        self.days = {}
+        for task in self.repository.all():
+            if not task.done:
+                self.put(task_key(task))
+        self.heap = list(self.keys.values())
+        heapq.heapify(self.heap)
+        self.loaded = True
+
+    def put(self, key):
+        self.keys[key[2]] = key
+        self.days.setdefault(key[0], {})[key[2]] = key
+
+    def discard(self, task_id):
+        key = self.keys.pop(task_id, None)
+        if key is not None:
+            day = self.days[key[0]]
+            del day[task_id]
+            if not day:
+                del self.days[key[0]]
+
+    def on_change(self, before, after):
+        if not self.loaded:
+            return
+        task_id = after.id if after is not None else before["id"]
+        if after is None or after.done:
+            self.discard(task_id)
+        else:
+            key = task_key(after)
+            if self.keys.get(task_id) != key:
+                self.discard(task_id)
+                self.put(key)
+                heapq.heappush(self.heap, key)
+        self.clean()
+
+    def clean(self):
+        while self.heap and self.keys.get(self.heap[0][2]) != self.heap[0]:
+            heapq.heappop(self.heap)
+        if len(self.heap) > 2 * len(self.keys) + 64:
+            self.heap = list(self.keys.values())
+            heapq.heapify(self.heap)
+
+    def walk(self):
+        # Обход кучи по возрастанию ключа без полной сортировки: очередной
+        # минимум берём из «фронта» — узлов, чьи родители уже выданы.
+        heap = self.heap
+        frontier = [(heap[0], 0)] if heap else []
+        seen = set()
+        while frontier:
+            key, position = heapq.heappop(frontier)
+            if self.keys.get(key[2]) == key and key[2] not in seen:
+                seen.add(key[2])
+                yield key
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def tasks(self, keys):
+        return [self.repository.get(key[2]) for key in keys]
+
+    def next(self, limit=10):
+        self.ensure_loaded()
+        return self.tasks(islice(self.walk(), limit))
+
+    def between(self, start, end):
+        self.ensure_loaded()
+        keys = []
+        for day in range(start.toordinal(), end.toordinal() + 1):
+            keys.extend(sorted(self.days.get(day, {}).values()))
+        return self.tasks(keys)
+
+    def overdue(self, today=None):
+        today = (today or date.today()).toordinal()
+        self.ensure_loaded()
+        keys = []
+        for day in sorted(day for day in self.days if day < today):
+            keys.extend(sorted(self.days[day].values()))
+        return self.tasks(keys)
+
+    def today(self, today=None):
+        today = today or date.today()
+        return self.between(today, today)
+
+    def week(self, today=None):
+        today = today or date.today()
+        return self.between(today, today + timedelta(days=6))
+
+
+_agendas = {}
+
+
+def open_agenda(repository):
+    if id(repository) not in _agendas:
+        _agendas[id(repository)] = Agenda(repository)
+    return _agendas[id(repository)]
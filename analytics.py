@@ -0,0 +1,254 @@
+import itertools
+from array import array
+from datetime import date
+
+from dates import parse_date
+from lazy import optional_module
+from metrics import timed
+from money import DEFAULT_CURRENCY, to_minor
+from rates import open_rates
+from storage import field_value
+
+numpy = optional_module("numpy")
+
+def compressed(typecode, values, mask):
+    result = array(typecode)
+    if numpy is not None:
+        result.frombytes(numpy.asarray(values, dtype=typecode)[numpy.asarray(mask, dtype=bool)].tobytes())
+    else:
+        result.extend(itertools.compress(values, mask))
+    return result
+
+
+class FinanceColumns:
+    # Столбцовое представление журнала операций: id, суммы в копейках, дни
+    # (ordinal), месяцы и коды категорий лежат в компактных массивах, строки
+    # категорий хранятся один раз. Записи могут быть словарями или объектами,
+    # поэтому таблицу можно собрать прямо из потока хранилища.
+    def __init__(self):
+        self.ids = array("q")
+        self.amounts = array("q")
+        self.days = array("i")
+        self.months = array("i")
+        self.categories = array("i")
+        self.currencies = array("i")
+        self.descriptions = []
+        self.category_names = []
+        self.category_codes = {}
+        self.currency_names = []
+        self.currency_codes = {}
+        self.skipped = 0
+        self.unconverted = 0
+
+    @classmethod
+    def from_records(cls, records):
+        columns = cls()
+        for record in records:
+            columns.append(record)
+        return columns
+
+    @classmethod
+    def from_storage(cls, storage, filters=()):
+        return cls.from_records(storage.iter_records(filters))
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def row(self, index):
+        return {
+            "id": self.ids[index],
+            "amount": self.amounts[index],
+            "currency": self.currency_names[self.currencies[index]],
+            "category": self.category_names[self.categories[index]],
+            "date": date.fromordinal(self.days[index]).strftime("%d-%m-%Y"),
+            "description": self.descriptions[index],
+        }
+
+    def rows(self):
+        return (self.row(index) for index in range(len(self)))
+
+    def category_code(self, category):
+        key = category.casefold()
+        code = self.category_codes.get(key)
+        if code is None:
+            code = self.category_codes[key] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+
+    def currency_code(self, currency):
+        code = self.currency_codes.get(currency)
+        if code is None:
+            code = self.currency_codes[currency] = len(self.currency_names)
+            self.currency_names.append(currency)
+        return code
+
+    def append(self, record):
+        day = parse_date(field_value(record, "date"))
+        amount = to_minor(field_value(record, "amount"))
+        record_id = field_value(record, "id")
+        # Колонка id целочисленная: запись с id другого типа не попадает в таблицу.
+        if day is None or amount is None or not isinstance(record_id, int) or isinstance(record_id, bool):
+            self.skipped += 1
+            return
+        self.ids.append(record_id)
+        self.amounts.append(amount)
+        self.days.append(day.toordinal())
+        self.months.append(day.year * 12 + day.month - 1)
+        self.categories.append(self.category_code(field_value(record, "category") or ""))
+        self.currencies.append(self.currency_code(field_value(record, "currency") or DEFAULT_CURRENCY))
+        self.descriptions.append(field_value(record, "description") or "")
+
+    def converted(self, rates):
+        # Копия таблицы с суммами в базовой валюте. Строки без курса на дату
+        # операции в копию не попадают, их число остаётся в unconverted.
+        amounts, found = rates.convert_many(self.amounts, self.currencies, self.days, self.currency_names)
+        columns = FinanceColumns()
+        for name in ("ids", "days", "months", "categories", "currencies"):
+            setattr(columns, name, compressed(getattr(self, name).typecode, getattr(self, name), found))
+        columns.amounts = compressed("q", amounts, found)
+        columns.descriptions = list(itertools.compress(self.descriptions, found))
+        columns.category_names, columns.category_codes = self.category_names, self.category_codes
+        columns.currency_names, columns.currency_codes = self.currency_names, self.currency_codes
+        columns.skipped = self.skipped
+        columns.unconverted = len(self) - len(columns)
+        return columns
+
+    def bounds(self, start, end):
+        start = parse_date(start) if start else None
+        end = parse_date(end) if end else None
+        return (start.toordinal() if start else None), (end.toordinal() if end else None)
+
+    def column(self, name):
+        if name == "weeks":
+            return array("q", ((day - 1) // 7 for day in self.days)) if numpy is None else (self.vector("days") - 1) // 7
+        return getattr(self, name) if numpy is None else self.vector(name)
+
+    def vector(self, name):
+        values = getattr(self, name)
+        return numpy.frombuffer(values, dtype=values.typecode)
+
+    def grouped(self, key_name, start=None, end=None):
+        start, end = self.bounds(start, end)
+        if numpy is not None:
+            return self.grouped_numpy(key_name, start, end)
+
+        groups = {}
+        for key, day, amount in zip(self.column(key_name), self.days, self.amounts):
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+            totals = groups.get(key)
+            if totals is None:
+                totals = groups[key] = [0, 0]
+            totals[0 if amount > 0 else 1] += amount
+        return sorted((key, income, expense) for key, (income, expense) in groups.items())
+
+    def grouped_numpy(self, key_name, start, end):
+        keys = self.column(key_name)
+        amounts = self.vector("amounts")
+        days = self.vector("days")
+        mask = numpy.ones(len(amounts), dtype=bool)
+        if start is not None:
+            mask &= days >= start
+        if end is not None:
+            mask &= days <= end
+        keys, amounts = keys[mask], amounts[mask]
+        unique, inverse = numpy.unique(keys, return_inverse=True)
+        # Суммы копятся в int64: bincount с весами считал бы во float.
+        income = numpy.zeros(len(unique), dtype=numpy.int64)
+        expense = numpy.zeros(len(unique), dtype=numpy.int64)
+        numpy.add.at(income, inverse, numpy.where(amounts > 0, amounts, 0))
+        numpy.add.at(expense, inverse, numpy.where(amounts < 0, amounts, 0))
+        return list(zip(unique.tolist(), income.tolist(), expense.tolist()))
+
+    @timed("analytics.summary")
+    def summary(self, start=None, end=None):
+        rows = self.grouped("months", start, end)
+        income = sum(row[1] for row in rows)
+        expense = sum(row[2] for row in rows)
+        return income, expense, income + expense
+
+    @timed("analytics.by_month")
+    def by_month(self, start=None, end=None):
+        return [
+            (f"{month // 12:04d}-{month % 12 + 1:02d}", income, expense, income + expense)
+            for month, income, expense in self.grouped("months", start, end)
+        ]
+
+    @timed("analytics.by_week")
+    def by_week(self, start=None, end=None):
+        return [
+            (date.fromordinal(week * 7 + 1).strftime("%d-%m-%Y"), income, expense, income + expense)
+            for week, income, expense in self.grouped("weeks", start, end)
+        ]
+
+    @timed("analytics.by_category")
+    def by_category(self, start=None, end=None):
+        rows = [
+            (self.category_names[code], income, expense, income + expense)
+            for code, income, expense in self.grouped("categories", start, end)
+        ]
+        return sorted(rows, key=lambda row: row[0].casefold())
+
+    def top_categories(self, count, start=None, end=None):
+        rows = self.by_category(start, end)
+        return sorted((row for row in rows if row[2] < 0), key=lambda row: row[2])[:count]
+
+    @timed("analytics.daily")
+    def daily(self, start=None, end=None):
+        return [(day, income + expense) for day, income, expense in self.grouped("days", start, end)]
+
+    def balance_before(self, day):
+        # Сумма всех операций до дня day — входящий остаток для периода.
+        if numpy is not None:
+            amounts = self.vector("amounts")
+            return int(amounts[self.vector("days") < day].sum())
+        return sum(amount for other, amount in zip(self.days, self.amounts) if other < day)
+
+    @timed("analytics.running_balance")
+    def running_balance(self, start=None, end=None):
+        first, _ = self.bounds(start, end)
+        balance = 0 if first is None else self.balance_before(first)
+        result = []
+        for day, amount in self.daily(start, end):
+            balance += amount
+            result.append((date.fromordinal(day).strftime("%d-%m-%Y"), balance))
+        return result
+
+    @timed("analytics.rolling")
+    def rolling(self, window, start=None, end=None):
+        daily = self.daily(start, end)
+        if not daily:
+            return []
+        first = daily[0][0]
+        totals = [0] * (daily[-1][0] - first + 1)
+        for day, amount in daily:
+            totals[day - first] = amount
+
+        if numpy is not None:
+            prefix = numpy.concatenate(([0], numpy.cumsum(numpy.array(totals, dtype=numpy.int64))))
+            lower = numpy.maximum(numpy.arange(1, len(totals) + 1) - window, 0)
+            sums = (prefix[1:] - prefix[lower]).tolist()
+        else:
+            sums = []
+            current = 0
+            for index, amount in enumerate(totals):
+                current += amount
+                if index >= window:
+                    current -= totals[index - window]
+                sums.append(current)
+        return [(date.fromordinal(first + index).strftime("%d-%m-%Y"), total) for index, total in enumerate(sums)]
+
+
+_columns = {}
+
+
+def finance_columns(repository):
+    # Сводки считаются в базовой валюте по текущей таблице курсов.
+    rates = open_rates()
+    # Ревизия растёт при синхронизации, поэтому ключ берём после неё.
+    repository.sync()
+    cached = _columns.get(id(repository))
+    if cached is None or cached[0] != (repository.revision, rates):
+        columns = FinanceColumns.from_records(repository.all()).converted(rates)
+        cached = _columns[id(repository)] = ((repository.revision, rates), columns)
+    return cached[1]
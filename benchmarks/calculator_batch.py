@@ -0,0 +1,40 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from expressions import Expression, compile_expression, evaluate_column
+
+SIZES = (100_000, 1_000_000)
+# Разбор на каждой строке слишком медленный, его время оцениваем по выборке.
+SAMPLE = 10_000
+FORMULA = "round(max(x * 1.2 - 150, 0) / 12 + sqrt(abs(x)) * 0.13, 2)"
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main(sizes):
+    for count in sizes:
+        rng = random.Random(42)
+        values = [rng.uniform(-10_000, 100_000) for _ in range(count)]
+        compile_expression.cache_clear()
+        reparsed, reparse = timed(lambda: [Expression(FORMULA).evaluate({"x": value}) for value in values[:SAMPLE]])
+        cached, per_row = timed(lambda: [compile_expression(FORMULA).evaluate({"x": value}) for value in values])
+        batch, vector = timed(lambda: evaluate_column(FORMULA, values))
+        drift = max(abs(a - b) for a, b in zip(cached, batch))
+
+        print(f"Строк: {count}, формула: {FORMULA}")
+        print(f"  разбор на каждой строке: {reparse * count / SAMPLE * 1000:8.0f} мс (оценка по {SAMPLE} строкам)")
+        print(f"  кэш выражения, по строке: {per_row * 1000:8.0f} мс")
+        print(f"  столбцом за один вызов:   {vector * 1000:8.0f} мс, расхождение с построчным {drift:g}")
+        print(f"  {compile_expression.cache_info()}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
@@ -0,0 +1,66 @@
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import FinanceColumns
+from rates import RATE_SCALE, RateTable
+
+SIZES = (1_000_000,)
+CURRENCIES = ["RUB", "EUR", "USD"]
+CATEGORIES = ["Еда", "Транспорт", "Жильё", "Зарплата", "Развлечения"]
+START = date(2020, 1, 1).toordinal()
+DAYS = 6 * 365
+
+
+def rate_table():
+    # Курс на каждый день для EUR и USD.
+    rng = random.Random(1)
+    rates = {}
+    for currency, level in (("EUR", 90.0), ("USD", 80.0)):
+        days = list(range(START, START + DAYS))
+        rates[currency] = (days, [int((level + rng.uniform(-10, 10)) * RATE_SCALE) for _ in days])
+    return RateTable("RUB", rates)
+
+
+def generate(count, seed=42):
+    rng = random.Random(seed)
+    for index in range(count):
+        yield {
+            "id": index + 1,
+            "amount": rng.randint(-500_000, 300_000),
+            "currency": CURRENCIES[index % len(CURRENCIES)],
+            "category": CATEGORIES[index % len(CATEGORIES)],
+            "date": date.fromordinal(START + rng.randrange(DAYS)).strftime("%d-%m-%Y"),
+            "description": "",
+        }
+
+
+def main(sizes):
+    for count in sizes:
+        columns = FinanceColumns.from_records(generate(count))
+        rates = rate_table()
+
+        started = time.perf_counter()
+        converted = columns.converted(rates)
+        batch = time.perf_counter() - started
+
+        rates = rate_table()
+        started = time.perf_counter()
+        rates.convert_rows(columns.amounts, columns.currencies, columns.days, columns.currency_names)
+        rows = time.perf_counter() - started
+
+        started = time.perf_counter()
+        summary = converted.by_category()
+        grouping = time.perf_counter() - started
+
+        print(f"Записей: {count}, валют: {len(CURRENCIES)}, пар (валюта, день): {len(CURRENCIES) * DAYS}")
+        print(f"  перевод пакетом: {batch * 1000:.0f} мс, по записи с кэшем курсов: {rows * 1000:.0f} мс")
+        print(f"  сводка по категориям в RUB: {grouping * 1000:.0f} мс, категорий: {len(summary)}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
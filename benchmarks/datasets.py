@@ -0,0 +1,164 @@
+import argparse
+import csv
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    "встреча проект отчёт бюджет план задача звонок письмо договор счёт оплата поездка ремонт покупка "
+    "врач анализы школа родители подарок праздник отпуск билеты гостиница машина страховка налог "
+    "квартира аренда продукты рецепт книга фильм спорт тренировка бассейн собрание презентация клиент "
+    "поставщик заказ доставка склад сервер релиз ошибка тест документация идея заметка список напоминание"
+).split()
+FIRST_NAMES = ("Александр Алексей Андрей Анна Виктория Дмитрий Екатерина Елена Иван Ирина Мария Михаил "
+               "Наталья Никита Ольга Павел Сергей Светлана Татьяна Юлия").split()
+LAST_NAMES = ("Иванов Смирнов Кузнецов Попов Васильев Петров Соколов Михайлов Новиков Фёдоров Морозов "
+              "Волков Алексеев Лебедев Семёнов Егоров Павлов Козлов Степанов Николаев").split()
+TRANSLIT = dict(zip("абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+                    "a b v g d e e zh z i y k l m n o p r s t u f h ts ch sh sch - y - e yu ya".split()))
+DOMAINS = ("mail.ru", "yandex.ru", "gmail.com", "bk.ru", "example.org")
+PHONE_FORMATS = ("+7 ({0}) {1}-{2}-{3}", "8-{0}-{1}-{2}-{3}", "+7{0}{1}{2}{3}", "8 ({0}) {1} {2} {3}")
+PRIORITIES = (("Высокий", 2), ("Средний", 5), ("Низкий", 3))
+RECURRENCES = ((None, 20), ("daily", 1), ("weekly:пн,ср,пт", 2), ("monthly:1", 1), ("monthly:-1", 1))
+# Расходы по категориям: вес и типичная сумма в рублях.
+EXPENSES = (("Еда", 30, 900), ("Транспорт", 15, 300), ("Жильё", 3, 25000), ("Развлечения", 8, 2500),
+            ("Здоровье", 5, 3000), ("Связь", 3, 700), ("Одежда", 4, 4000), ("Подарки", 2, 3500))
+INCOMES = (("Зарплата", 4, 90000), ("Подработка", 1, 15000), ("Кэшбэк", 2, 400))
+EXPENSE_POOL = [(name, amount) for name, weight, amount in EXPENSES for _ in range(weight)]
+INCOME_POOL = [(name, amount) for name, weight, amount in INCOMES for _ in range(weight)]
+CURRENCIES = (("RUB", 18), ("USD", 1), ("EUR", 1))
+RATE_LEVELS = {"USD": 90.0, "EUR": 98.0}
+FIELDS = {
+    "notes": ("title", "content", "timestamp"),
+    "tasks": ("title", "description", "done", "priority", "due_date", "recurrence", "remind_at"),
+    "contacts": ("name", "phone", "email"),
+    "finances": ("amount", "currency", "category", "date", "description"),
+}
+
+
+def weighted(rng, choices):
+    return rng.choices([choice[0] for choice in choices], weights=[choice[1] for choice in choices])[0]
+
+
+def sentence(rng, low, high):
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    return " ".join(words).capitalize()
+
+
+def moment(rng, start, days):
+    return start + timedelta(days=rng.randrange(days), seconds=rng.randrange(86400))
+
+
+def notes(count, rng, start, days):
+    for _ in range(count):
+        yield {
+            "title": sentence(rng, 2, 5),
+            "content": ". ".join(sentence(rng, 5, 15) for _ in range(rng.randint(1, 4))),
+            "timestamp": moment(rng, start, days).strftime("%d-%m-%Y %H:%M:%S"),
+        }
+
+
+def tasks(count, rng, start, days):
+    for _ in range(count):
+        due = moment(rng, start, days + 60) if rng.random() < 0.8 else None
+        yield {
+            "title": sentence(rng, 2, 6),
+            "description": sentence(rng, 0, 12) if rng.random() < 0.6 else "",
+            "done": rng.random() < 0.4,
+            "priority": weighted(rng, PRIORITIES),
+            "due_date": due.strftime("%d-%m-%Y") if due else None,
+            "recurrence": weighted(rng, RECURRENCES) if due else None,
+            "remind_at": f"{rng.randint(8, 21):02d}:{rng.choice((0, 15, 30, 45)):02d}" if due and rng.random() < 0.3 else None,
+        }
+
+
+def transliterate(text):
+    return "".join(TRANSLIT.get(char, char) for char in text.lower()).replace("-", "")
+
+
+def contacts(count, rng, start, days):
+    for _ in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        if first.endswith("а") or first.endswith("я"):
+            last += "а"
+        digits = (f"9{rng.randint(0, 99):02d}", f"{rng.randint(0, 999):03d}", f"{rng.randint(0, 99):02d}", f"{rng.randint(0, 99):02d}")
+        yield {
+            "name": f"{first} {last}",
+            "phone": rng.choice(PHONE_FORMATS).format(*digits) if rng.random() < 0.9 else "",
+            "email": f"{transliterate(first)}.{transliterate(last)}{rng.randint(1, 999)}@{rng.choice(DOMAINS)}" if rng.random() < 0.7 else "",
+        }
+
+
+def finances(count, rng, start, days):
+    for _ in range(count):
+        income = rng.random() < 0.12
+        category, typical = rng.choice(INCOME_POOL if income else EXPENSE_POOL)
+        sign = 1 if income else -1
+        amount = round(rng.lognormvariate(0, 0.5) * typical, 2)
+        currency = weighted(rng, CURRENCIES)
+        if currency != "RUB":
+            amount = round(amount / RATE_LEVELS[currency], 2)
+        yield {
+            "amount": f"{sign * amount:.2f}",
+            "currency": currency,
+            "category": category,
+            "date": moment(rng, start, days).strftime("%d-%m-%Y"),
+            "description": sentence(rng, 0, 4) if rng.random() < 0.5 else "",
+        }
+
+
+GENERATORS = {"notes": notes, "tasks": tasks, "contacts": contacts, "finances": finances}
+
+
+def generate(dataset, count, seed=42, start=date(2021, 1, 1), days=5 * 365):
+    # Записи в виде строк, как в CSV для импорта; одинаковые при одном seed.
+    rng = random.Random(f"{dataset}-{seed}")
+    start = datetime.combine(start, datetime.min.time())
+    return GENERATORS[dataset](count, rng, start, days)
+
+
+def write_csv(dataset, count, file_name, seed=42):
+    with open(file_name, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS[dataset])
+        writer.writeheader()
+        writer.writerows(generate(dataset, count, seed))
+
+
+def write_rates(file_name, seed=42, start=date(2021, 1, 1), days=5 * 365 + 60):
+    # Курсы на каждый день периода, чтобы у всех операций в валюте был курс.
+    rng = random.Random(f"rates-{seed}")
+    with open(file_name, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["date", "currency", "rate"])
+        for currency, level in RATE_LEVELS.items():
+            for day in range(days):
+                level *= 1 + rng.gauss(0, 0.005)
+                writer.writerow([(start + timedelta(days=day)).strftime("%d-%m-%Y"), currency, f"{level:.4f}"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Синтетические наборы данных в CSV для импорта и замеров")
+    parser.add_argument("--size", type=int, default=10_000, help="записей в каждом наборе")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=".", help="каталог для файлов")
+    parser.add_argument("datasets", nargs="*", help=f"какие наборы: {', '.join(GENERATORS)}; по умолчанию все")
+    args = parser.parse_args(argv)
+    unknown = [dataset for dataset in args.datasets if dataset not in GENERATORS]
+    if unknown:
+        parser.error(f"неизвестные наборы: {', '.join(unknown)}")
+    args.datasets = args.datasets or list(GENERATORS)
+    os.makedirs(args.out, exist_ok=True)
+    for dataset in args.datasets:
+        file_name = os.path.join(args.out, f"{dataset}.csv")
+        write_csv(dataset, args.size, file_name, args.seed)
+        print(f"{file_name}: {args.size} записей")
+    if "finances" in args.datasets:
+        write_rates(os.path.join(args.out, "rates.csv"), args.seed)
+        print(f"{os.path.join(args.out, 'rates.csv')}: курсы USD и EUR")
+
+
+if __name__ == "__main__":
+    main()
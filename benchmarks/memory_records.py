@@ -0,0 +1,64 @@
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import FinanceColumns
+from personal_assistant import FinancesManager
+
+SIZES = (10_000, 100_000, 1_000_000)
+CATEGORIES = ["Еда", "Транспорт", "Жильё", "Зарплата", "Развлечения", "Здоровье", "Связь"]
+
+
+class LegacyFinance:
+    # Прежнее представление записи: обычный класс с __dict__ и без интернирования.
+    def __init__(self, id=None, amount=None, category=None, date=None, description=None):
+        self.id = id
+        self.amount = amount
+        self.category = category
+        self.date = date
+        self.description = description
+
+
+def generate(count):
+    # Строки создаются заново для каждой записи, как после json.load.
+    for index in range(count):
+        yield {
+            "id": index + 1,
+            "amount": float(index % 5000 - 2500) + 0.25,
+            "category": "".join(CATEGORIES[index % len(CATEGORIES)]),
+            "date": f"{index % 28 + 1:02d}-{index % 12 + 1:02d}-{2020 + index % 6}",
+            "description": "",
+        }
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    result = build(generate(count))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def legacy(records):
+    return [LegacyFinance(**record) for record in records]
+
+
+def slotted(records):
+    return [FinancesManager.from_dict(record) for record in records]
+
+
+def main(sizes):
+    print(f"{'записей':>10} {'__dict__':>12} {'__slots__':>12} {'массивы':>12}   байт на запись")
+    for count in sizes:
+        results = [measure(build, count) for build in (legacy, slotted, FinanceColumns.from_records)]
+        per_record = " / ".join(f"{size / count:.0f}" for size in results)
+        print(f"{count:>10} " + " ".join(f"{size / 2**20:>10.1f}МБ" for size in results) + f"   {per_record}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
@@ -0,0 +1,76 @@
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from money import parse_amount, to_decimal
+
+SIZES = (1_000_000, 3_000_000)
+
+
+def generate(count, seed=42):
+    # Суммы как во вводе пользователя: строки с копейками, доходы и расходы вперемешку.
+    rng = random.Random(seed)
+    for _ in range(count):
+        cents = rng.randint(-500_000, 300_000)
+        sign = "-" if cents < 0 else ""
+        yield f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def float_report(amounts):
+    # Прежний путь: float в записях и суммирование float.
+    income = sum(amount for amount in amounts if amount > 0)
+    expense = sum(amount for amount in amounts if amount < 0)
+    return income, expense, income + expense
+
+
+def decimal_report(amounts):
+    income = sum((amount for amount in amounts if amount > 0), Decimal(0))
+    expense = sum((amount for amount in amounts if amount < 0), Decimal(0))
+    return income, expense, income + expense
+
+
+def minor_report(amounts):
+    # Копейки целыми числами, Decimal только для результата.
+    income = sum(amount for amount in amounts if amount > 0)
+    expense = sum(amount for amount in amounts if amount < 0)
+    return to_decimal(income), to_decimal(expense), to_decimal(income + expense)
+
+
+def as_decimal(value):
+    # float переводим без потерь, чтобы увидеть накопленную ошибку целиком.
+    return value if isinstance(value, Decimal) else Decimal(value)
+
+
+def timed(report, amounts):
+    started = time.perf_counter()
+    result = report(amounts)
+    return result, time.perf_counter() - started
+
+
+def main(sizes):
+    for count in sizes:
+        texts = list(generate(count))
+        paths = {
+            "float": [float(text) for text in texts],
+            "Decimal": [Decimal(text) for text in texts],
+            "копейки": [parse_amount(text) for text in texts],
+        }
+        reports = {"float": float_report, "Decimal": decimal_report, "копейки": minor_report}
+        results = {name: timed(reports[name], amounts) for name, amounts in paths.items()}
+        exact = results["Decimal"][0]
+
+        print(f"Записей: {count}")
+        for name, (result, elapsed) in results.items():
+            drift = max(abs(as_decimal(value) - reference) for value, reference in zip(result, exact))
+            print(
+                f"  {name:>8}: {elapsed * 1000:8.0f} мс, {count / elapsed / 1e6:6.1f} млн записей/с, "
+                f"баланс {result[2]}, отклонение от точного {drift}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RULES = [None, "daily", "daily:2", "weekly:пн,ср,пт", "monthly:-1", "cron:0 9-18/3 * * 1-5"]
+
+
+def generate(count, start):
+    from personal_assistant import TasksManager
+
+    for index in range(count):
+        yield TasksManager(
+            title=f"Задача {index}",
+            due_date=(start + timedelta(days=index % 30)).strftime("%d-%m-%Y"),
+            recurrence=RULES[index % len(RULES)],
+            remind_at=f"{index % 24:02d}:{index % 60:02d}",
+        )
+
+
+def rescan(tasks, now, after):
+    # Прежний подход: на каждом тике пересчитываем напоминания по всем задачам.
+    from reminders import next_reminder
+
+    return [task for task in tasks if (moment := next_reminder(task, after)) is not None and moment <= now]
+
+
+def main(count=50_000, ticks=24 * 60):
+    os.chdir(tempfile.mkdtemp(prefix="pa-reminders-"))
+    from personal_assistant import TasksManager
+    from reminders import open_reminders
+
+    start = date.today()
+    repository = TasksManager.repository()
+    repository.add_many(list(generate(count, start)))
+    tasks = repository.all()
+
+    moment = datetime.combine(start, datetime.min.time())
+    reminders = open_reminders(repository)
+    started = time.perf_counter()
+    reminders.ensure_loaded(moment)
+    loaded = time.perf_counter() - started
+
+    # Сутки тиков раз в минуту: очередь смотрит только на вершину кучи.
+    fired = 0
+    started = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        fired += len(reminders.due(moment + timedelta(minutes=tick)))
+    heap_time = time.perf_counter() - started
+
+    sample = 5
+    started = time.perf_counter()
+    for tick in range(1, sample + 1):
+        rescan(tasks, moment + timedelta(minutes=tick), moment + timedelta(minutes=tick - 1))
+    rescan_time = (time.perf_counter() - started) / sample * ticks
+
+    print(f"Задач: {count}, тиков: {ticks}, сработало напоминаний: {fired}")
+    print(f"Загрузка очереди: {loaded * 1000:.0f} мс")
+    print(f"Куча: {heap_time * 1000:.0f} мс на все тики ({heap_time / ticks * 1e6:.0f} мкс на тик)")
+    print(f"Перебор всех задач: ~{rescan_time * 1000:.0f} мс на все тики (оценка по {sample} тикам)")
+
+
+if __name__ == "__main__":
+    main(*[int(value) for value in sys.argv[1:]])
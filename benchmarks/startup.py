@@ -0,0 +1,202 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import git_commit
+
+SCRIPT = os.path.join(ROOT, "personal_assistant.py")
+REPEAT = 15
+IMPORT_RUNS = 3
+# Допустимая задержка старта сверх пустого интерпретатора, мс.
+BUDGET_MS = 50
+# Рост времени больше этой доли считается регрессией при сравнении.
+REGRESSION = 0.10
+# Команды: аргументы, ввод для меню и модули, которых при таком запуске быть не должно.
+COMMANDS = {
+    "menu": ([], "9\n", ("numpy", "cProfile", "tracemalloc", "socket", "csv", "gzip", "argparse", "analytics", "expressions", "pages", "query", "server",
+                        "decimal", "history", "text_index", "contact_index")),
+    "help": (["--help"], None, ("numpy", "socket", "csv", "gzip", "analytics", "expressions", "server", "decimal", "history", "text_index", "contact_index")),
+    "notes-list": (["notes", "list", "--limit", "20"], None, ("numpy", "socket", "csv", "gzip", "analytics", "rates", "expressions", "recurrence")),
+    "notes-add": (["notes", "add", "Заметка", "Текст"], None, ("numpy", "socket", "csv", "gzip", "analytics", "rates", "expressions")),
+    "contacts-search": (["contacts", "search", "Иван"], None, ("numpy", "socket", "csv", "gzip", "analytics", "rates", "expressions", "dedup", "difflib")),
+    "tasks-agenda": (["tasks", "agenda"], None, ("numpy", "socket", "csv", "gzip", "analytics", "rates", "expressions")),
+    "finances-add": (["finances", "add", "-500", "Еда", "01-06-2025"], None, ("numpy", "socket", "gzip", "expressions")),
+    "calc-eval": (["calc", "eval", "(2 + 3) * 4"], None, ("numpy", "socket", "csv", "gzip", "analytics", "rates", "pages", "decimal", "history", "text_index", "contact_index")),
+}
+
+
+def environment(pycache):
+    # Байт-код пишется в отдельный каталог, чтобы замер не включал компиляцию
+    # исходников и не оставлял __pycache__ в дереве.
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env.pop("PA_SERVER", None)
+    env.pop("PA_PROFILE", None)
+    env.pop("PA_STATS", None)
+    env["PYTHONPYCACHEPREFIX"] = pycache
+    return env
+
+
+def launch(argv, stdin, env, cwd, flags=()):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *flags, *argv], input=stdin, capture_output=True, text=True, env=env, cwd=cwd)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode:
+        raise RuntimeError(f"{' '.join(argv)}: код {result.returncode}\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def parse_importtime(text):
+    # Строки -X importtime: «import time: собственное | суммарное | имя», вложенность — отступом.
+    # Возвращает суммарное время модулей верхнего уровня и все импортированные имена.
+    top, modules = {}, set()
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        modules.add(name.strip())
+        if not name.startswith("  "):
+            top[name.strip()] = int(parts[1]) / 1000
+    return top, modules
+
+
+def measure(name, repeat, env, cwd):
+    argv, stdin, forbidden = COMMANDS[name]
+    argv = [SCRIPT, *argv]
+    launch(argv, stdin, env, cwd)
+    times = sorted(launch(argv, stdin, env, cwd)[0] for _ in range(repeat))
+    # Время импорта — лучший из нескольких прогонов под -X importtime, состав модулей от этого не зависит.
+    traces = [parse_importtime(launch(argv, stdin, env, cwd, ("-X", "importtime"))[1]) for _ in range(IMPORT_RUNS)]
+    top, modules = min(traces, key=lambda trace: sum(trace[0].values()))
+    slowest = sorted(top.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "command": name,
+        "min_ms": round(times[0], 2),
+        "median_ms": round(statistics.median(times), 2),
+        "import_ms": round(sum(top.values()), 2),
+        "slowest_imports": [{"module": module, "ms": round(ms, 2)} for module, ms in slowest],
+        "modules": len(modules),
+        "unexpected": sorted(module for module in forbidden if module in modules),
+    }
+
+
+def run(options):
+    with tempfile.TemporaryDirectory(prefix="pa-startup-") as directory:
+        env = environment(os.path.join(directory, "pycache"))
+        cwd = os.path.join(directory, "data")
+        os.makedirs(cwd)
+        launch(["-c", "pass"], None, env, cwd)
+        baseline = min(launch(["-c", "pass"], None, env, cwd)[0] for _ in range(options.repeat))
+        results = []
+        for name in options.commands:
+            print(f"{name}...", file=sys.stderr)
+            item = measure(name, options.repeat, env, cwd)
+            item["overhead_ms"] = round(item["min_ms"] - baseline, 2)
+            results.append(item)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "interpreter_ms": round(baseline, 2),
+            "repeat": options.repeat,
+            "budget_ms": options.budget,
+        },
+        "results": results,
+    }
+
+
+def check(report):
+    # Превышение бюджета и лишние модули при старте считаются ошибками.
+    failures = 0
+    for item in report["results"]:
+        if item["overhead_ms"] > report["meta"]["budget_ms"]:
+            print(f"  {item['command']}: старт {item['overhead_ms']:.1f} мс сверх интерпретатора, бюджет {report['meta']['budget_ms']} мс",
+                  file=sys.stderr)
+            failures += 1
+        if item["unexpected"]:
+            print(f"  {item['command']}: при старте импортированы {', '.join(item['unexpected'])}", file=sys.stderr)
+            failures += 1
+    return failures
+
+
+def compare(report, baseline):
+    # Сравнение времени импорта и задержки старта сверх интерпретатора по совпадающим командам.
+    previous = {item["command"]: item for item in baseline["results"]}
+    regressions = 0
+    print(f"Сравнение с {baseline['meta'].get('commit')}:")
+    for item in report["results"]:
+        old = previous.get(item["command"])
+        if old is None:
+            continue
+        for key in ("import_ms", "overhead_ms"):
+            if not old.get(key):
+                continue
+            ratio = item[key] / old[key]
+            mark = ""
+            if ratio > 1 + REGRESSION:
+                mark = "  <-- регрессия"
+                regressions += 1
+            print(f"  {item['command']:<16} {key:<12}: {old[key]:>8.2f} -> {item[key]:>8.2f} мс (x{ratio:.2f}){mark}")
+    return regressions
+
+
+def print_summary(report):
+    print(f"Пустой интерпретатор: {report['meta']['interpreter_ms']:.1f} мс", file=sys.stderr)
+    for item in report["results"]:
+        slowest = ", ".join(f"{entry['module']} {entry['ms']:.1f}" for entry in item["slowest_imports"][:3])
+        print(f"{item['command']:<16} {item['min_ms']:>7.1f} мс (сверх интерпретатора {item['overhead_ms']:.1f}), "
+              f"импорт {item['import_ms']:.1f} мс, модулей {item['modules']}; дольше всех: {slowest}", file=sys.stderr)
+
+
+def commands_arg(value):
+    commands = [command.strip() for command in value.split(",")]
+    unknown = [command for command in commands if command not in COMMANDS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"неизвестные команды: {', '.join(unknown)}")
+    return commands
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время старта и импорта personal_assistant.py (по -X importtime)")
+    parser.add_argument("--commands", type=commands_arg, default=list(COMMANDS), help="команды через запятую")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="запусков каждой команды")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="допустимая задержка старта сверх интерпретатора, мс")
+    parser.add_argument("--output", help="файл для JSON, по умолчанию stdout")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    options = parser.parse_args(argv)
+
+    report = run(options)
+    print_summary(report)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    failures = check(report)
+    if options.compare:
+        with open(options.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        with contextlib.redirect_stdout(sys.stderr):
+            failures += compare(report, baseline)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
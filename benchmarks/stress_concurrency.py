@@ -0,0 +1,92 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def worker(directory, backend, worker_id, operations, results):
+    # Процесс запускается через spawn, поэтому хранилища и репозитории открываются заново.
+    os.chdir(directory)
+    os.environ["PA_STORAGE"] = backend
+    from personal_assistant import Note, TasksManager
+    from storage import ConflictError
+
+    conflicts = 0
+    for index in range(operations):
+        TasksManager.add(f"Задача {worker_id}-{index}")
+        # Счётчик читается без блокировки и записывается с проверкой версии:
+        # при конфликте читаем заново и повторяем.
+        while True:
+            counter = Note.repository().get(1)
+            try:
+                Note.modify(1, content=str(int(counter.content) + 1), version=counter.version)
+                break
+            except ConflictError:
+                conflicts += 1
+    results.put(conflicts)
+
+
+def run(processes, operations, backend):
+    directory = tempfile.mkdtemp(prefix="pa-stress-")
+    os.chdir(directory)
+    os.environ["PA_STORAGE"] = backend
+    from personal_assistant import Note, TasksManager
+
+    Note.add("Счётчик", "0")
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    started = time.perf_counter()
+    workers = [
+        context.Process(target=worker, args=(directory, backend, worker_id, operations, results))
+        for worker_id in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    conflicts = sum(results.get() for _ in workers)
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    # Проверяем по данным на диске, а не по памяти этого процесса.
+    from repository import Repository
+    from storage import open_storage
+    expected = processes * operations
+    counter = Repository(Note, open_storage(Note.NOTES_FILE)).get(1)
+    tasks = Repository(TasksManager, open_storage(TasksManager.TASKS_FILE)).all()
+    titles = {task.title for task in tasks}
+    ids = [task.id for task in tasks]
+
+    print(f"Хранилище: {backend}, каталог: {directory}")
+    print(f"Процессов: {processes}, операций на процесс: {operations}, время: {elapsed:.2f} с")
+    print(f"Счётчик: {counter.content} (ожидалось {expected}), версия {counter.version}, конфликтов: {conflicts}")
+    print(f"Задач: {len(tasks)} (ожидалось {expected}), уникальных ID: {len(set(ids))}, уникальных заголовков: {len(titles)}")
+    failed = [
+        int(counter.content) != expected,
+        len(tasks) != expected,
+        len(set(ids)) != expected,
+        len(titles) != expected,
+    ]
+    if any(failed):
+        print("ОШИБКА: часть изменений потеряна")
+        return 1
+    print("Потерянных изменений нет")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельные писатели в одни файлы данных")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=100)
+    parser.add_argument("--backend", default="journal", choices=["json", "journal", "sqlite"])
+    args = parser.parse_args()
+    sys.exit(run(args.processes, args.operations, args.backend))
+
+
+if __name__ == "__main__":
+    main()
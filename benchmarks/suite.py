@@ -0,0 +1,353 @@
+import argparse
+import contextlib
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = (1_000, 10_000)
+SAMPLES = 200
+REPEAT = 3
+DATASETS = ("notes", "tasks", "contacts", "finances", "calculator")
+PERCENTILES = (50, 90, 99)
+# «Сегодня» для повестки и повторяющихся задач — внутри диапазона дат синтетических данных.
+TODAY = date(2025, 6, 1)
+# Падение пропускной способности больше этой доли считается регрессией при сравнении.
+REGRESSION = 0.10
+
+
+def percentile(ordered, share):
+    index = min(len(ordered) - 1, max(0, round(share / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    # Замеры одного прогона. Прогон идёт дважды в отдельных процессах с одной и
+    # той же последовательностью операций: в первом только время, во втором под
+    # tracemalloc — пиковая память каждой операции, чтобы трассировка не искажала время.
+    def __init__(self, size, memory):
+        self.size = size
+        self.memory = memory
+        self.results = []
+
+    def run(self, dataset, operation, function, calls, records_per_call=1):
+        gc.collect()
+        if self.memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        timings = []
+        for index in range(calls):
+            started = time.perf_counter()
+            function(index)
+            timings.append(time.perf_counter() - started)
+        result = {"dataset": dataset, "operation": operation, "size": self.size}
+        if self.memory:
+            result["peak_memory_kb"] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+        else:
+            total = sum(timings)
+            ordered = sorted(timings)
+            result.update({
+                "calls": calls,
+                "records": calls * records_per_call,
+                "seconds": round(total, 6),
+                "throughput": round(calls * records_per_call / total, 1) if total else None,
+                "throughput_unit": "records/s" if records_per_call > 1 else "ops/s",
+                "latency_ms": dict(
+                    {f"p{share}": round(percentile(ordered, share) * 1000, 4) for share in PERCENTILES},
+                    mean=round(total / calls * 1000, 4),
+                    max=round(ordered[-1] * 1000, 4),
+                ),
+            })
+        self.results.append(result)
+
+
+def run_notes(recorder, size, rng, options):
+    from datasets import WORDS, write_csv
+    from exporter import export_records
+    from importer import CsvImporter
+    from personal_assistant import Note
+    from repository import Repository
+
+    write_csv("notes", size, "notes.csv")
+    repository = Note.repository()
+    recorder.run("notes", "import_csv", lambda _: CsvImporter(repository, Note.SCHEMA, Note.REQUIRED_FIELDS, progress=False).run("notes.csv"), 1, size)
+    recorder.run("notes", "load_notes", lambda _: Repository(Note, repository.storage).all(), options.repeat, size)
+    notes = Note.load_notes()
+    recorder.run("notes", "save_notes", lambda _: Note.save_notes(notes), options.repeat, size)
+    ids = rng.sample([note.id for note in notes], min(options.samples, len(notes)))
+    recorder.run("notes", "add", lambda index: Note.add(f"Заметка {index}", "Замер добавления"), options.samples)
+    recorder.run("notes", "modify", lambda index: Note.modify(ids[index % len(ids)], content=f"Изменено {index}"), options.samples)
+    # Отмена и повтор многих правок одной записи подряд: каждый откат меняет её версию.
+    recorder.run("notes", "modify_same", lambda index: Note.modify(ids[0], title=f"Версия {index}"), options.samples)
+    recorder.run("notes", "undo", lambda _: revert("undo"), options.samples)
+    recorder.run("notes", "redo", lambda _: revert("redo"), options.samples)
+    if Note.repository().get(ids[0]).title != f"Версия {options.samples - 1}":
+        raise RuntimeError("после отмены и повтора запись не вернулась к последней версии")
+    queries = [rng.choice(WORDS) + (" " + rng.choice(WORDS) if rng.random() < 0.5 else "") for _ in range(options.samples)]
+    recorder.run("notes", "find", lambda index: Note.find(queries[index]), options.samples)
+    recorder.run("notes", "export_csv", lambda _: export_records(repository, "notes.export.csv", Note.SCHEMA), options.repeat, size)
+    recorder.run("notes", "remove", lambda index: Note.remove(ids[index]), len(ids))
+
+
+def revert(kind):
+    # Откат, которому нечего откатывать, — ошибка прогона, а не замер.
+    from personal_assistant import HistoryManager
+    if HistoryManager.revert(kind) is None:
+        raise RuntimeError(f"history {kind}: нечего откатывать")
+
+
+def run_tasks(recorder, size, rng, options):
+    from datasets import write_csv
+    from exporter import export_records
+    from importer import CsvImporter
+    from personal_assistant import TasksManager
+    from repository import Repository
+
+    write_csv("tasks", size, "tasks.csv")
+    repository = TasksManager.repository()
+    recorder.run("tasks", "import_csv", lambda _: CsvImporter(repository, TasksManager.SCHEMA, TasksManager.REQUIRED_FIELDS, progress=False).run("tasks.csv"), 1, size)
+    recorder.run("tasks", "load_tasks", lambda _: Repository(TasksManager, repository.storage).all(), options.repeat, size)
+    tasks = TasksManager.load_tasks()
+    recorder.run("tasks", "save_tasks", lambda _: TasksManager.save_tasks(tasks), options.repeat, size)
+    ids = rng.sample([task.id for task in tasks], min(options.samples, len(tasks)))
+    recorder.run("tasks", "add", lambda index: TasksManager.add(f"Задача {index}", due_date="01-06-2025"), options.samples)
+    recorder.run("tasks", "complete", lambda index: TasksManager.complete(ids[index % len(ids)], today=TODAY), options.samples)
+    views = ("next", "overdue", "today", "week")
+    today = TODAY.strftime("%d-%m-%Y")
+    recorder.run("tasks", "agenda", lambda index: TasksManager.agenda(views[index % len(views)], 10, today), options.samples)
+    recorder.run("tasks", "reminders", lambda index: TasksManager.reminders(10), options.samples)
+    recorder.run("tasks", "export_csv", lambda _: export_records(repository, "tasks.export.csv", TasksManager.SCHEMA), options.repeat, size)
+    recorder.run("tasks", "remove", lambda index: TasksManager.remove(ids[index]), len(ids))
+
+
+def run_contacts(recorder, size, rng, options):
+    from datasets import write_csv
+    from dedup import find_duplicates
+    from exporter import export_records
+    from importer import CsvImporter
+    from personal_assistant import ContactsManager
+    from repository import Repository
+
+    write_csv("contacts", size, "contacts.csv")
+    repository = ContactsManager.repository()
+    recorder.run("contacts", "import_csv", lambda _: CsvImporter(repository, ContactsManager.SCHEMA, ContactsManager.REQUIRED_FIELDS, progress=False).run("contacts.csv"), 1, size)
+    recorder.run("contacts", "load_contacts", lambda _: Repository(ContactsManager, repository.storage).all(), options.repeat, size)
+    contacts = ContactsManager.load_contacts()
+    recorder.run("contacts", "save_contacts", lambda _: ContactsManager.save_contacts(contacts), options.repeat, size)
+    ids = rng.sample([contact.id for contact in contacts], min(options.samples, len(contacts)))
+    recorder.run("contacts", "add", lambda index: ContactsManager.add(f"Контакт {index}", f"+7900{index:07d}"), options.samples)
+    recorder.run("contacts", "modify", lambda index: ContactsManager.modify(ids[index % len(ids)], email=f"bench{index}@example.org"), options.samples)
+    # Запросы как у пользователя: начало имени или фамилии, кусок телефона, часть email.
+    samples = [rng.choice(contacts) for _ in range(options.samples)]
+    terms = [rng.choice([contact.name.split()[0][:3], contact.name.split()[-1][:4], contact.phone[-5:], contact.email[:5]]) or contact.name
+             for contact in samples]
+    recorder.run("contacts", "find", lambda index: ContactsManager.find(terms[index]), options.samples)
+    recorder.run("contacts", "find_duplicates", lambda _: find_duplicates(contacts, ContactsManager.CONTACTS_FILE), options.repeat, size)
+    recorder.run("contacts", "find_duplicates_fuzzy", lambda _: find_duplicates(contacts, ContactsManager.CONTACTS_FILE, fuzzy=True), options.repeat, size)
+    recorder.run("contacts", "export_csv", lambda _: export_records(repository, "contacts.export.csv", ContactsManager.SCHEMA), options.repeat, size)
+    recorder.run("contacts", "remove", lambda index: ContactsManager.remove(ids[index]), len(ids))
+
+
+def run_finances(recorder, size, rng, options):
+    from datasets import write_csv, write_rates
+    from dedup import find_duplicates, import_filter
+    from exporter import export_records
+    from importer import CsvImporter
+    from personal_assistant import FinancesManager
+    from repository import Repository
+
+    write_csv("finances", size, "finances.csv")
+    write_rates("rates.csv")
+    repository = FinancesManager.repository()
+    recorder.run("finances", "import_csv", lambda _: CsvImporter(repository, FinancesManager.SCHEMA, FinancesManager.REQUIRED_FIELDS, progress=False).run("finances.csv"), 1, size)
+    recorder.run("finances", "load_finances", lambda _: Repository(FinancesManager, repository.storage).all(), options.repeat, size)
+    finances = FinancesManager.load_finances()
+    recorder.run("finances", "save_finances", lambda _: FinancesManager.save_finances(finances), options.repeat, size)
+    ids = rng.sample([record.id for record in finances], min(options.samples, len(finances)))
+    recorder.run("finances", "add", lambda index: FinancesManager.add(f"-{index % 900 + 100}.50", "Еда", f"{index % 28 + 1:02d}-05-2024"), options.samples)
+    periods = []
+    for _ in range(options.samples):
+        year = rng.randint(2021, 2025)
+        periods.append((f"{rng.randint(1, 28):02d}-{rng.randint(1, 6):02d}-{year}", f"{rng.randint(1, 28):02d}-{rng.randint(7, 12):02d}-{year}"))
+    recorder.run("finances", "generate_report", lambda index: FinancesManager.report(*periods[index]), options.samples)
+    recorder.run("finances", "analytics_by_category", lambda _: FinancesManager.analytics().by_category(), options.repeat, size)
+    recorder.run("finances", "find_duplicates", lambda _: find_duplicates(finances, FinancesManager.FINANCES_FILE), options.repeat, size)
+    # Повторный импорт того же файла: все строки отсеиваются как дубликаты.
+    recorder.run("finances", "reimport_csv", lambda _: CsvImporter(repository, FinancesManager.SCHEMA, FinancesManager.REQUIRED_FIELDS, progress=False,
+                                                                   duplicates=import_filter(repository, FinancesManager.FINANCES_FILE)).run("finances.csv"), 1, size)
+    recorder.run("finances", "export_csv", lambda _: export_records(repository, "finances.export.csv", FinancesManager.SCHEMA), options.repeat, size)
+    recorder.run("finances", "remove", lambda index: FinancesManager.remove(ids[index]), len(ids))
+
+
+def run_calculator(recorder, size, rng, options):
+    from expressions import compile_expression
+    from personal_assistant import Calculator
+
+    formulas = [f"round(x * {rng.randint(2, 20)} / 3 + sqrt(abs(x)) - {rng.randint(1, 100)}, 2)" for _ in range(options.samples)]
+    values = [rng.uniform(-1000, 1000) for _ in range(size)]
+    recorder.run("calculator", "compile", lambda index: compile_expression.__wrapped__(formulas[index]), options.samples)
+    recorder.run("calculator", "evaluate", lambda index: Calculator.evaluate(formulas[index], {"x": values[index % size]}), options.samples)
+    recorder.run("calculator", "evaluate_column", lambda index: Calculator.evaluate_column(formulas[index], values), options.repeat, size)
+
+
+RUNNERS = {
+    "notes": run_notes,
+    "tasks": run_tasks,
+    "contacts": run_contacts,
+    "finances": run_finances,
+    "calculator": run_calculator,
+}
+
+
+def run_size(size, options, memory, results):
+    # Каждый размер — в свежем процессе и пустом каталоге: кэши модулей не переживают прогон.
+    directory = tempfile.mkdtemp(prefix="pa-bench-")
+    os.chdir(directory)
+    os.environ["PA_STORAGE"] = options.storage
+    os.environ.pop("PA_SERVER", None)
+    os.environ.pop("PA_RATES", None)
+    if memory:
+        tracemalloc.start()
+    recorder = Recorder(size, memory)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for dataset in options.datasets:
+            RUNNERS[dataset](recorder, size, random.Random(f"{dataset}-{size}"), options)
+    results.put(recorder.results)
+
+
+def in_process(size, options, memory):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_size, args=(size, options, memory, results))
+    process.start()
+    while True:
+        try:
+            measured = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"прогон размера {size} завершился с ошибкой, код {process.exitcode}")
+    process.join()
+    return measured
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def run(options):
+    results = []
+    for size in options.sizes:
+        print(f"Размер {size}: замер времени...", file=sys.stderr)
+        measured = in_process(size, options, False)
+        if options.memory:
+            print(f"Размер {size}: замер памяти...", file=sys.stderr)
+            peaks = {(item["dataset"], item["operation"]): item["peak_memory_kb"] for item in in_process(size, options, True)}
+            for item in measured:
+                item["peak_memory_kb"] = peaks.get((item["dataset"], item["operation"]))
+        results.extend(measured)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "storage": options.storage,
+            "sizes": options.sizes,
+            "samples": options.samples,
+            "repeat": options.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    # Сравнение пропускной способности по совпадающим (набор, операция, размер).
+    previous = {(item["dataset"], item["operation"], item["size"]): item for item in baseline["results"]}
+    regressions = 0
+    print(f"Сравнение с {baseline['meta'].get('commit')} ({baseline['meta'].get('storage')}):")
+    for item in report["results"]:
+        old = previous.get((item["dataset"], item["operation"], item["size"]))
+        if old is None or not old.get("throughput") or not item.get("throughput"):
+            continue
+        ratio = item["throughput"] / old["throughput"]
+        mark = ""
+        if ratio < 1 - REGRESSION:
+            mark = "  <-- регрессия"
+            regressions += 1
+        print(f"  {item['dataset']:>10} {item['operation']:<22} {item['size']:>8}: {old['throughput']:>12.1f} -> {item['throughput']:>12.1f} {item['throughput_unit']} (x{ratio:.2f}){mark}")
+    return regressions
+
+
+def print_summary(report):
+    for item in report["results"]:
+        latency = item["latency_ms"]
+        memory = f", память {item['peak_memory_kb']:.0f} КБ" if item.get("peak_memory_kb") is not None else ""
+        print(f"{item['dataset']:>10} {item['operation']:<22} {item['size']:>8}: {item['throughput']:>12.1f} {item['throughput_unit']}, "
+              f"p50 {latency['p50']:.3f} мс, p99 {latency['p99']:.3f} мс{memory}", file=sys.stderr)
+
+
+def sizes_arg(value):
+    try:
+        return [int(size) for size in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидался список размеров через запятую, получено {value!r}")
+
+
+def datasets_arg(value):
+    datasets = [dataset.strip() for dataset in value.split(",")]
+    unknown = [dataset for dataset in datasets if dataset not in RUNNERS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"неизвестные наборы: {', '.join(unknown)}")
+    return datasets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры операций всех менеджеров на синтетических данных")
+    parser.add_argument("--sizes", type=sizes_arg, default=list(SIZES), help="размеры наборов через запятую")
+    parser.add_argument("--datasets", type=datasets_arg, default=list(DATASETS), help="наборы через запятую")
+    parser.add_argument("--storage", choices=["json", "journal", "sqlite"], default="journal")
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="вызовов для точечных операций")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="повторов для операций над всем набором")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="не замерять пиковую память")
+    parser.add_argument("--output", help="файл для JSON, по умолчанию stdout")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    options = parser.parse_args(argv)
+
+    report = run(options)
+    print_summary(report)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    if options.compare:
+        with open(options.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        with contextlib.redirect_stdout(sys.stderr):
+            regressions = compare(report, baseline)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,649 @@
+import argparse
+import os
+import shlex
+import sys
+from contextlib import ExitStack
+from datetime import date
+
+from dates import parse_date, parse_timestamp
+from money import DEFAULT_CURRENCY, parse_amount, parse_currency
+from personal_assistant import Calculator, ContactsManager, FinancesManager, HistoryManager, Note, TasksManager
+from remote import DEFAULT_SOCKET, SERVER_ENV, remote_client
+from storage import StorageError
+
+MANAGERS = {
+    "notes": Note,
+    "tasks": TasksManager,
+    "contacts": ContactsManager,
+    "finances": FinancesManager,
+}
+
+
+class CommandError(Exception):
+    pass
+
+
+def date_arg(value):
+    if parse_date(value) is None:
+        raise argparse.ArgumentTypeError(f"некорректная дата {value!r}, используйте формат ДД-ММ-ГГГГ")
+    return value
+
+
+def amount_arg(value):
+    try:
+        parse_amount(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+    return value
+
+
+def currency_arg(value):
+    try:
+        return parse_currency(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def timestamp_arg(value):
+    moment = parse_timestamp(value)
+    if moment is None:
+        raise argparse.ArgumentTypeError(f"некорректный момент {value!r}, используйте формат ДД-ММ-ГГГГ ЧЧ:ММ:СС")
+    return moment
+
+
+def variable_arg(value):
+    name, separator, number = value.partition("=")
+    try:
+        return name.strip(), float(number.replace(",", "."))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидалось имя=число, получено {value!r}")
+
+
+def cursor_arg(value):
+    from pages import decode_cursor
+    try:
+        return decode_cursor(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def print_records(records):
+    from pages import write_lines
+    write_lines(record.summary() for record in records)
+
+
+def paged(args):
+    return any((args.limit, args.after, args.before, args.from_id is not None, args.sort != "id", args.desc))
+
+
+def print_page(manager, args):
+    from pages import PAGE_SIZE, cursor_key, encode_cursor, fetch_page
+    # Постраничный вывод по курсору: курсоры соседних страниц печатаются в stderr.
+    try:
+        after, before = cursor_key(args.after, args.sort, args.desc), cursor_key(args.before, args.sort, args.desc)
+        page = fetch_page(manager.repository(), args.sort, args.desc, after, before, args.from_id, args.limit or PAGE_SIZE)
+    except ValueError as error:
+        raise CommandError(str(error))
+    if page is None:
+        not_found(args.from_id)
+    print_records(page.records)
+    print(page.describe(), file=sys.stderr)
+    if page.has_prev:
+        print(f"Предыдущая страница: --before {encode_cursor(page.field, page.descending, page.first)}", file=sys.stderr)
+    if page.has_next:
+        print(f"Следующая страница: --after {encode_cursor(page.field, page.descending, page.last)}", file=sys.stderr)
+
+
+def not_found(record_id):
+    raise CommandError(f"запись с ID {record_id} не найдена")
+
+
+def list_records(manager, args):
+    if paged(args):
+        print_page(manager, args)
+        return
+    print_records(manager.repository().all())
+
+
+def delete_record(manager, args):
+    if not manager.repository().delete(args.id):
+        not_found(args.id)
+    print(f"Удалено: {args.id}")
+
+
+def import_records(manager, args):
+    from dedup import import_filter
+    from importer import import_csv
+    repository = manager.repository()
+    duplicates = None if getattr(args, "keep_duplicates", True) else import_filter(repository, dataset_file(args))
+    try:
+        report = import_csv(repository, manager.SCHEMA, manager.REQUIRED_FIELDS, args.file, duplicates)
+    except FileNotFoundError:
+        raise CommandError(f"файл {args.file} не найден")
+    report.print_summary()
+
+
+def dataset_file(args):
+    return HistoryManager.SECTIONS[args.section][1]
+
+
+def dedup_records(manager, args):
+    from dedup import NAME_THRESHOLD, deduplicate, describe
+    from pages import write_lines
+    fuzzy, threshold = getattr(args, "fuzzy", False), getattr(args, "threshold", None)
+    if threshold is None:
+        threshold = NAME_THRESHOLD
+    try:
+        groups, removed = deduplicate(manager.repository(), dataset_file(args), fuzzy, threshold, args.apply)
+    except ValueError as error:
+        raise CommandError(str(error))
+    write_lines(describe(groups))
+    print(f"Групп дубликатов: {len(groups)}" + (f", удалено записей: {removed}" if args.apply else ""))
+
+
+def export_filters(manager, args):
+    if manager is TasksManager and args.open:
+        return [("done", "=", False)]
+    if manager is FinancesManager:
+        return FinancesManager.filters(args.category, args.start_date, args.end_date)
+    return []
+
+
+def export_to_file(manager, args):
+    from exporter import export_records
+    count = export_records(manager.repository(), args.file, manager.SCHEMA, export_filters(manager, args))
+    print(f"Экспортировано записей: {count}")
+
+
+def note_add(manager, args):
+    print(f"Создана заметка, ID: {Note.add(args.title, args.content).id}")
+
+
+def note_show(manager, args):
+    note = Note.repository().get(args.id) or not_found(args.id)
+    print(f"Заголовок: {note.title}\nСодержимое: {note.content}\nДата: {note.timestamp}")
+
+
+def note_edit(manager, args):
+    if not Note.modify(args.id, args.title, args.content):
+        not_found(args.id)
+    print(f"Обновлено: {args.id}")
+
+
+def note_search(manager, args):
+    for note, score in Note.find(args.query, args.limit):
+        print(f"{note.summary()}, Релевантность: {score:.2f}")
+
+
+def task_add(manager, args):
+    try:
+        task = TasksManager.add(args.title, args.description, args.priority, args.due_date, args.recurrence, args.remind_at)
+    except ValueError as error:
+        raise CommandError(str(error))
+    print(f"Создана задача, ID: {task.id}")
+
+
+def task_list(manager, args):
+    if paged(args):
+        if args.open:
+            raise CommandError("постраничный вывод не сочетается с --open")
+        print_page(manager, args)
+        return
+    repository = TasksManager.repository()
+    print_records(repository.find([("done", "=", False)]) if args.open else repository.all())
+
+
+def task_agenda(manager, args):
+    print_records(TasksManager.agenda(args.view, args.limit, args.date))
+
+
+def task_reminders(manager, args):
+    from reminders import format_reminder
+    for moment, task in TasksManager.reminders(args.limit):
+        print(format_reminder(moment, task))
+
+
+def task_watch(manager, args):
+    from reminders import dispatch, format_reminder, open_reminders
+    repository = TasksManager.repository()
+    if repository.remote:
+        raise CommandError("напоминания при запущенном сервере выводит сам сервер")
+    print("Ожидание напоминаний, Ctrl+C — выход")
+    try:
+        dispatch(open_reminders(repository), lambda moment, task: print(f"Напоминание: {format_reminder(moment, task)}", flush=True))
+    except KeyboardInterrupt:
+        pass
+
+
+def task_done(manager, args):
+    if not TasksManager.complete(args.id):
+        not_found(args.id)
+    print(f"Выполнено: {args.id}")
+
+
+def task_edit(manager, args):
+    changes = dict(title=args.title, description=args.description, priority=args.priority, due_date=args.due_date,
+                   recurrence=args.recurrence, remind_at=args.remind_at)
+    try:
+        task = TasksManager.modify(args.id, **changes)
+    except ValueError as error:
+        raise CommandError(str(error))
+    if not task:
+        not_found(args.id)
+    print(f"Обновлено: {args.id}")
+
+
+def contact_add(manager, args):
+    print(f"Создан контакт, ID: {ContactsManager.add(args.name, args.phone, args.email).id}")
+
+
+def contact_search(manager, args):
+    print_records(ContactsManager.find(args.term, args.limit))
+
+
+def contact_edit(manager, args):
+    if not ContactsManager.modify(args.id, name=args.name, phone=args.phone, email=args.email):
+        not_found(args.id)
+    print(f"Обновлено: {args.id}")
+
+
+def finance_add(manager, args):
+    try:
+        record = FinancesManager.add(args.amount, args.category, args.date, args.description, args.currency)
+    except ValueError as error:
+        raise CommandError(str(error))
+    print(f"Создана запись, ID: {record.id}")
+
+
+def finance_list(manager, args):
+    if paged(args):
+        if args.category or args.start_date or args.end_date:
+            raise CommandError("постраничный вывод не сочетается с фильтрами")
+        print_page(manager, args)
+        return
+    print_records(FinancesManager.repository().find(FinancesManager.filters(args.category, args.start_date, args.end_date)))
+
+
+def finance_report(manager, args):
+    total_income, total_expense, balance = FinancesManager.report(args.start_date, args.end_date)
+    print(f"Доход: {total_income:.2f}\nРасход: {total_expense:.2f}\nБаланс: {balance:.2f}")
+    FinancesManager.print_conversion()
+
+
+def finance_rates(manager, args):
+    from rates import open_rates, rates_file_name
+    rates = open_rates()
+    print(f"Базовая валюта: {rates.base}, файл курсов: {rates_file_name()}")
+    for currency, first, last, count, latest in rates.describe():
+        print(f"{currency}: курсов {count}, с {date.fromordinal(first):%d-%m-%Y} по {date.fromordinal(last):%d-%m-%Y}, последний {latest}")
+
+
+def history_list(manager, args):
+    for section, entry in reversed(HistoryManager.entries(args.limit)):
+        print(HistoryManager.describe(section, entry))
+
+
+def history_revert(manager, args):
+    result = HistoryManager.revert(args.command)
+    if result is None:
+        raise CommandError("нечего отменять" if args.command == "undo" else "нечего повторять")
+    print(f"{'Отменено' if args.command == 'undo' else 'Повторено'}: {HistoryManager.describe(*result)}")
+
+
+def history_show(manager, args):
+    records, started = HistoryManager.as_of(args.dataset, args.moment)
+    if started is None or args.moment < started:
+        print("Внимание: история начинается позже, показано самое раннее известное состояние.", file=sys.stderr)
+    print_records(records)
+
+
+def run_query(manager, args):
+    from pages import write_lines
+    from personal_assistant import SearchManager
+    try:
+        results = SearchManager.query(" ".join(args.text), args.limit, parse_date(args.today) if args.today else None)
+    except ValueError as error:
+        raise CommandError(str(error))
+    if args.explain:
+        for result in results:
+            print(f"{result.dataset}: {result.plan}", file=sys.stderr)
+    write_lines(SearchManager.describe(results) or ["Ничего не найдено."])
+
+
+def run_stats(manager, args):
+    # Без сервера видны замеры только этой команды; статистику целого сеанса
+    # сохраняет переменная окружения PA_STATS.
+    import metrics
+    from pages import write_lines
+    from personal_assistant import StatsManager
+    data = StatsManager.snapshot(args.reset)
+    if args.json:
+        metrics.dump(args.json, data)
+    else:
+        write_lines(metrics.describe(data))
+
+
+def run_profile(manager, args):
+    from pages import write_lines
+    from personal_assistant import StatsManager
+    if not os.environ.get(SERVER_ENV):
+        raise CommandError("без сервера профилирование включается переменной окружения PA_PROFILE=префикс")
+    try:
+        files = StatsManager.profile(args.action, args.output)
+    except ValueError as error:
+        raise CommandError(str(error))
+    if files:
+        write_lines(files)
+
+
+def calc_eval(manager, args):
+    from expressions import format_number
+    try:
+        result = Calculator.evaluate(args.expression, dict(args.variables))
+    except ValueError as error:
+        raise CommandError(str(error))
+    print(format_number(result))
+
+
+def calc_column(manager, args):
+    # Значения по одному в строке, результат для каждого — в той же строке вывода.
+    from expressions import format_number
+    file = open_input(args.file)
+    with file:
+        lines = [line.strip() for line in file if line.strip()]
+    values = []
+    for line in lines:
+        try:
+            values.append(float(line.replace(",", ".")))
+        except ValueError:
+            values.append(None)
+    try:
+        results = Calculator.evaluate_column(args.expression, values, args.name, dict(args.variables))
+    except ValueError as error:
+        raise CommandError(str(error))
+    for result in results:
+        print(format_number(result) if result is not None else "")
+
+
+def calc_csv(manager, args):
+    try:
+        rows, failed = Calculator.evaluate_file(args.expression, args.file, args.output, args.column, dict(args.variables))
+    except FileNotFoundError:
+        raise CommandError(f"файл {args.file} не найден")
+    except ValueError as error:
+        raise CommandError(str(error))
+    print(f"Вычислено строк: {rows}, без результата: {failed}")
+
+
+def add_command(commands, name, handler, help_text):
+    parser = commands.add_parser(name, help=help_text)
+    parser.set_defaults(handler=handler)
+    return parser
+
+
+def add_paging(parser, manager):
+    from pages import PAGE_SIZE
+    parser.add_argument("--sort", choices=list(manager.SCHEMA), default="id", help="поле сортировки")
+    parser.add_argument("--desc", action="store_true", help="по убыванию")
+    parser.add_argument("--limit", type=int, help=f"размер страницы (по умолчанию {PAGE_SIZE} при постраничном выводе)")
+    parser.add_argument("--after", type=cursor_arg, help="курсор: страница после него")
+    parser.add_argument("--before", type=cursor_arg, help="курсор: страница перед ним")
+    parser.add_argument("--from-id", dest="from_id", type=int, help="страница, начиная с записи с этим ID")
+
+
+def add_date_range(parser, required=False):
+    parser.add_argument("--from", dest="start_date", type=date_arg, required=required, help="начальная дата ДД-ММ-ГГГГ")
+    parser.add_argument("--to", dest="end_date", type=date_arg, required=required, help="конечная дата ДД-ММ-ГГГГ")
+
+
+def build_notes(notes):
+    command = add_command(notes, "add", note_add, "создать заметку")
+    command.add_argument("title")
+    command.add_argument("content", nargs="?", default="")
+    add_paging(add_command(notes, "list", list_records, "список заметок"), Note)
+    add_command(notes, "show", note_show, "показать заметку").add_argument("id", type=int)
+    command = add_command(notes, "edit", note_edit, "изменить заметку")
+    command.add_argument("id", type=int)
+    command.add_argument("--title")
+    command.add_argument("--content")
+    add_command(notes, "delete", delete_record, "удалить заметку").add_argument("id", type=int)
+    command = add_command(notes, "search", note_search, "поиск по заметкам")
+    command.add_argument("query")
+    command.add_argument("--limit", type=int, default=20)
+    add_transfer(notes, "notes")
+
+
+def build_tasks(tasks):
+    from recurrence import RULE_HELP
+    command = add_command(tasks, "add", task_add, "создать задачу")
+    command.add_argument("title")
+    command.add_argument("--description", default="")
+    command.add_argument("--priority", default="Средний")
+    command.add_argument("--due", dest="due_date", type=date_arg)
+    command.add_argument("--repeat", dest="recurrence", help=f"правило повтора: {RULE_HELP}")
+    command.add_argument("--remind", dest="remind_at", help="время напоминания ЧЧ:ММ")
+    command = add_command(tasks, "list", task_list, "список задач")
+    command.add_argument("--open", action="store_true", help="только невыполненные")
+    add_paging(command, TasksManager)
+    add_command(tasks, "done", task_done, "отметить выполненной").add_argument("id", type=int)
+    command = add_command(tasks, "agenda", task_agenda, "повестка: просроченные, сегодня, неделя, ближайшие")
+    command.add_argument("--view", choices=["next", "overdue", "today", "week"], default="next")
+    command.add_argument("--limit", type=int, default=10, help="сколько задач показать для next")
+    command.add_argument("--date", type=date_arg, help="считать сегодняшней эту дату")
+    add_command(tasks, "reminders", task_reminders, "ближайшие напоминания").add_argument("--limit", type=int, default=10)
+    add_command(tasks, "watch", task_watch, "ждать и выводить напоминания по мере срабатывания")
+    command = add_command(tasks, "edit", task_edit, "изменить задачу")
+    command.add_argument("id", type=int)
+    command.add_argument("--title")
+    command.add_argument("--description")
+    command.add_argument("--priority")
+    command.add_argument("--due", dest="due_date", type=date_arg)
+    command.add_argument("--repeat", dest="recurrence", help=f"правило повтора: {RULE_HELP}")
+    command.add_argument("--remind", dest="remind_at", help="время напоминания ЧЧ:ММ")
+    add_command(tasks, "delete", delete_record, "удалить задачу").add_argument("id", type=int)
+    add_transfer(tasks, "tasks")
+
+
+def build_contacts(contacts):
+    command = add_command(contacts, "add", contact_add, "создать контакт")
+    command.add_argument("name")
+    command.add_argument("--phone", default="")
+    command.add_argument("--email", default="")
+    add_paging(add_command(contacts, "list", list_records, "список контактов"), ContactsManager)
+    command = add_command(contacts, "search", contact_search, "поиск по имени, телефону или email")
+    command.add_argument("term")
+    command.add_argument("--limit", type=int, default=50)
+    command = add_command(contacts, "edit", contact_edit, "изменить контакт")
+    command.add_argument("id", type=int)
+    command.add_argument("--name")
+    command.add_argument("--phone")
+    command.add_argument("--email")
+    add_command(contacts, "delete", delete_record, "удалить контакт").add_argument("id", type=int)
+    add_dedup(contacts, "contacts")
+    add_transfer(contacts, "contacts")
+
+
+def build_finances(finances):
+    command = add_command(finances, "add", finance_add, "добавить операцию")
+    command.add_argument("amount", type=amount_arg)
+    command.add_argument("category")
+    command.add_argument("date", type=date_arg)
+    command.add_argument("--description", default="")
+    command.add_argument("--currency", type=currency_arg, default=DEFAULT_CURRENCY)
+    command = add_command(finances, "list", finance_list, "список операций")
+    command.add_argument("--category")
+    add_paging(command, FinancesManager)
+    add_date_range(command)
+    add_date_range(add_command(finances, "report", finance_report, "отчёт за период"), required=True)
+    add_command(finances, "rates", finance_rates, "таблица курсов валют")
+    add_command(finances, "delete", delete_record, "удалить операцию").add_argument("id", type=int)
+    add_dedup(finances, "finances")
+    add_transfer(finances, "finances")
+
+
+def add_dedup(section, name):
+    # Порог по умолчанию подставляется при выполнении: разбор аргументов не загружает dedup.
+    command = add_command(section, "dedup", dedup_records, "найти дубликаты, с --apply — объединить")
+    command.add_argument("--apply", action="store_true", help="объединить: остаётся запись с меньшим ID")
+    if name == "contacts":
+        command.add_argument("--fuzzy", action="store_true", help="искать и похожие имена")
+        command.add_argument("--threshold", type=float, help="порог похожести имён от 0 до 1, по умолчанию 0.85")
+
+
+def add_transfer(section, name):
+    command = add_command(section, "import", import_records, "импорт из CSV")
+    command.add_argument("file")
+    if name in ("contacts", "finances"):
+        command.add_argument("--keep-duplicates", action="store_true", help="не пропускать строки, которые уже есть в данных")
+    command = add_command(section, "export", export_to_file, "экспорт в CSV или JSONL (можно .gz)")
+    command.add_argument("file")
+    if name == "tasks":
+        command.add_argument("--open", action="store_true", help="только невыполненные")
+    if name == "finances":
+        command.add_argument("--category")
+        add_date_range(command)
+    for command in section.choices.values():
+        command.set_defaults(manager=MANAGERS[name])
+
+
+def build_calc(calc):
+    from expressions import FUNCTIONS_HELP
+    command = add_command(calc, "eval", calc_eval, "вычислить выражение")
+    command.add_argument("expression", help=f"например \"(доход + 1000) * 0.13\"; функции: {FUNCTIONS_HELP}")
+    command = add_command(calc, "column", calc_column, "вычислить выражение для столбца чисел")
+    command.add_argument("expression")
+    command.add_argument("file", nargs="?", default="-", help="файл с числами по одному в строке, - для stdin")
+    command.add_argument("--name", default="x", help="имя переменной для значения")
+    command = add_command(calc, "csv", calc_csv, "вычислить выражение для каждой строки CSV")
+    command.add_argument("expression", help="столбцы CSV доступны как переменные")
+    command.add_argument("file")
+    command.add_argument("output")
+    command.add_argument("--column", default="result", help="имя столбца с результатом")
+    for command in calc.choices.values():
+        command.add_argument("--var", dest="variables", type=variable_arg, action="append", default=[], help="переменная имя=число")
+
+
+def build_history(history):
+    add_command(history, "list", history_list, "последние изменения").add_argument("--limit", type=int, default=20)
+    add_command(history, "undo", history_revert, "отменить последнее действие")
+    add_command(history, "redo", history_revert, "повторить отменённое действие")
+    command = add_command(history, "show", history_show, "данные на момент времени")
+    command.add_argument("dataset", choices=list(MANAGERS))
+    command.add_argument("--at", dest="moment", type=timestamp_arg, required=True, help="момент ДД-ММ-ГГГГ ЧЧ:ММ:СС")
+
+
+SECTIONS = {
+    "notes": ("заметки", build_notes),
+    "tasks": ("задачи", build_tasks),
+    "contacts": ("контакты", build_contacts),
+    "finances": ("финансы", build_finances),
+    "calc": ("калькулятор выражений", build_calc),
+    "history": ("история изменений", build_history),
+}
+
+
+def build_parser(only=None):
+    # Команды раздела строятся, только если он нужен: для одной команды из
+    # командной строки достаточно её раздела, остальные видны лишь по имени.
+    parser = argparse.ArgumentParser(prog="personal_assistant", description="Персональный помощник")
+    sections = parser.add_subparsers(dest="section", required=True)
+    for name, (help_text, build) in SECTIONS.items():
+        section = sections.add_parser(name, help=help_text)
+        if only is None or only == name:
+            build(section.add_subparsers(dest="command", required=True))
+
+    command = add_command(sections, "query", run_query, "поиск по всем наборам данных")
+    command.add_argument("text", nargs="+", help="запрос: слова, поле:значение, поле>=значение, дата:от..до, за:30д, в:заметки")
+    command.add_argument("--limit", type=int, default=20, help="записей из каждого набора данных")
+    command.add_argument("--today", type=date_arg, help="дата, от которой считается за:, ДД-ММ-ГГГГ")
+    command.add_argument("--explain", action="store_true", help="вывести в stderr способ поиска по каждому набору")
+    command = add_command(sections, "stats", run_stats, "замеры времени операций")
+    command.add_argument("--json", metavar="FILE", help="сохранить замеры в JSON")
+    command.add_argument("--reset", action="store_true", help="сбросить замеры после вывода")
+    command = add_command(sections, "profile", run_profile, "профилирование сервера")
+    command.add_argument("action", choices=("start", "stop"))
+    command.add_argument("--output", default="profile", help="префикс файлов .prof, .txt и .alloc.txt")
+    command = add_command(sections, "batch", run_batch, "выполнить команды из файла одной транзакцией")
+    command.add_argument("file", nargs="?", default="-", help="файл с командами, - для stdin")
+    command = add_command(sections, "serve", run_server, "запустить сервер с данными в памяти")
+    command.add_argument("--socket", default=DEFAULT_SOCKET, help="путь к Unix-сокету")
+    return parser
+
+
+def run(parser, argv):
+    args = parser.parse_args(argv)
+    args.handler(getattr(args, "manager", None), args)
+
+
+def execute_batch(lines):
+    # Все команды применяются в памяти, а на диск изменения каждого набора
+    # данных попадают одной записью в конце. Первая же ошибка отменяет весь пакет.
+    parser = build_parser()
+    count = 0
+    with ExitStack() as stack:
+        for manager in MANAGERS.values():
+            stack.enter_context(manager.repository().transaction())
+        for line_number, line in enumerate(lines, start=1):
+            argv = shlex.split(line, comments=True)
+            if not argv:
+                continue
+            if argv[0] in ("batch", "serve"):
+                raise CommandError(f"строка {line_number}: команда {argv[0]} недоступна в пакете")
+            try:
+                run(parser, argv)
+            except SystemExit as error:
+                if error.code:
+                    raise CommandError(f"строка {line_number}: некорректная команда")
+            except (CommandError, StorageError, ValueError) as error:
+                raise CommandError(f"строка {line_number}: {error}")
+            count += 1
+    print(f"Выполнено команд: {count}")
+
+
+def open_input(file_name):
+    # Файл с входными данными команды, "-" — stdin.
+    if file_name == "-":
+        return sys.stdin
+    try:
+        return open(file_name, "r", encoding="utf-8")
+    except FileNotFoundError:
+        raise CommandError(f"файл {file_name} не найден")
+    except OSError as error:
+        raise CommandError(f"не удалось открыть файл {file_name}: {error.strerror}")
+
+
+def run_batch(manager, args):
+    file = open_input(args.file)
+    with file:
+        lines = file.readlines()
+    server = os.environ.get(SERVER_ENV)
+    if not server:
+        execute_batch(lines)
+        return
+    # Через сервер пакет выполняется целиком на его стороне, одной транзакцией.
+    ok, output = remote_client(server).call(None, "batch", lines=lines)
+    print(output, end="")
+    if not ok:
+        raise CommandError("пакет отменён")
+
+
+def run_server(manager, args):
+    from server import serve
+    serve(args.socket)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser(argv[0] if argv and argv[0] in SECTIONS else "")
+    try:
+        run(parser, argv)
+    except (CommandError, StorageError) as error:
+        print(f"Ошибка: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    from metrics import install
+    install()
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import bisect
+import re
+
+from metrics import timed, timer
+
+NON_DIGITS_RE = re.compile(r"\D")
+PHONE_QUERY_RE = re.compile(r"^[\d\s+()\-.]+$")
+WORD_RE = re.compile(r"\w+")
+
+DEFAULT_LIMIT = 50
+
+
+def normalize_name(name):
+    return " ".join(WORD_RE.findall(str(name or "").casefold().replace("ё", "е")))
+
+
+def normalize_phone(phone):
+    digits = NON_DIGITS_RE.sub("", str(phone or ""))
+    # +7 и 8 в начале российского номера считаем одним и тем же.
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits
+
+
+def phone_forms(query):
+    # Неполный номер с 8 в начале может быть началом и +7…, и местного номера.
+    digits = normalize_phone(query)
+    if digits.startswith("8") and len(digits) < 11:
+        return [digits, "7" + digits[1:]]
+    return [digits] if digits else []
+
+
+def normalize_email(email):
+    return str(email or "").strip().casefold()
+
+
+def trigrams(text):
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+# Списки id хранятся в словарях: порядок вставки сохраняется, и первые
+# результаты можно взять без сортировки всего списка.
+def add_to(index, key, record_id):
+    ids = index.get(key)
+    if ids is None:
+        ids = index[key] = {}
+    ids[record_id] = None
+    return len(ids) == 1
+
+
+def remove_from(index, key, record_id):
+    ids = index.get(key)
+    if ids is None:
+        return False
+    ids.pop(record_id, None)
+    if not ids:
+        del index[key]
+        return True
+    return False
+
+
+class SortedKeys:
+    # Отсортированный список ключей для поиска по префиксу через bisect.
+    def __init__(self):
+        self.keys = []
+
+    def add(self, key):
+        bisect.insort(self.keys, key)
+
+    def remove(self, key):
+        del self.keys[bisect.bisect_left(self.keys, key)]
+
+    def with_prefix(self, prefix):
+        index = bisect.bisect_left(self.keys, prefix)
+        while index < len(self.keys) and self.keys[index].startswith(prefix):
+            yield self.keys[index]
+            index += 1
+
+
+class Results:
+    # Результаты набираются по уровням релевантности (точное совпадение,
+    # начало слова, подстрока) и обрезаются, как только набран лимит.
+    def __init__(self, limit):
+        self.limit = limit
+        self.ids = []
+        self.seen = set()
+
+    @property
+    def full(self):
+        return len(self.ids) >= self.limit
+
+    def take(self, ids):
+        for contact_id in ids:
+            if self.full:
+                break
+            if contact_id not in self.seen:
+                self.ids.append(contact_id)
+                self.seen.add(contact_id)
+        return self.full
+
+
+class ContactIndex:
+    def __init__(self, repository):
+        self.repository = repository
+        self.loaded = False
+        repository.subscribe(self.on_change)
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        self.entries = {}
+        self.names = {}
+        self.tokens = {}
+        self.token_keys = SortedKeys()
+        self.name_grams = {}
+        self.phones = {}
+        self.phone_keys = SortedKeys()
+        self.phone_grams = {}
+        self.emails = {}
+        self.domains = {}
+        self.loaded = True
+        with timer("contacts.index_build"):
+            for contact in self.repository.all():
+                self.add(contact)
+
+    def on_change(self, before, after):
+        if not self.loaded:
+            return
+        self.remove(after.id if after is not None else before["id"])
+        if after is not None:
+            self.add(after)
+
+    def add(self, contact):
+        name = normalize_name(contact.name)
+        phone = normalize_phone(contact.phone)
+        email = normalize_email(contact.email)
+        self.entries[contact.id] = (name, phone, email)
+
+        add_to(self.names, name, contact.id)
+        for token in set(name.split()):
+            if add_to(self.tokens, token, contact.id):
+                self.token_keys.add(token)
+        for gram in trigrams(name):
+            add_to(self.name_grams, gram, contact.id)
+        if phone:
+            if add_to(self.phones, phone, contact.id):
+                self.phone_keys.add(phone)
+            for gram in trigrams(phone):
+                add_to(self.phone_grams, gram, contact.id)
+        if email:
+            add_to(self.emails, email, contact.id)
+            add_to(self.domains, email.rpartition("@")[2], contact.id)
+
+    def remove(self, contact_id):
+        entry = self.entries.pop(contact_id, None)
+        if entry is None:
+            return
+        name, phone, email = entry
+        remove_from(self.names, name, contact_id)
+        for token in set(name.split()):
+            if remove_from(self.tokens, token, contact_id):
+                self.token_keys.remove(token)
+        for gram in trigrams(name):
+            remove_from(self.name_grams, gram, contact_id)
+        if phone:
+            if remove_from(self.phones, phone, contact_id):
+                self.phone_keys.remove(phone)
+            for gram in trigrams(phone):
+                remove_from(self.phone_grams, gram, contact_id)
+        if email:
+            remove_from(self.emails, email, contact_id)
+            remove_from(self.domains, email.rpartition("@")[2], contact_id)
+
+    def substring(self, grams_index, text, field):
+        # Кандидатов берём из самого короткого списка триграмм и проверяем лениво,
+        # чтобы остановиться, как только набран лимит.
+        grams = sorted((grams_index.get(gram, {}) for gram in trigrams(text)), key=len)
+        for contact_id in grams[0] if grams else ():
+            if all(contact_id in ids for ids in grams[1:]) and text in self.entries[contact_id][field]:
+                yield contact_id
+
+    def search_name(self, query, results):
+        name = normalize_name(query)
+        if not name or results.take(self.names.get(name, {})):
+            return
+        # Все слова, кроме последнего, должны совпасть целиком; последнее ищем по префиксу.
+        words = name.split()
+        required = [self.tokens.get(word, {}) for word in words[:-1]]
+        for key in self.token_keys.with_prefix(words[-1]) if all(required) else ():
+            ids = (contact_id for contact_id in self.tokens[key] if all(contact_id in other for other in required))
+            if results.take(ids):
+                return
+        if len(name) >= 3:
+            results.take(self.substring(self.name_grams, name, 0))
+
+    def search_phone(self, query, results):
+        forms = phone_forms(query)
+        for digits in forms:
+            for key in self.phone_keys.with_prefix(digits):
+                if results.take(self.phones[key]):
+                    return
+        for digits in forms:
+            if len(digits) >= 3 and results.take(self.substring(self.phone_grams, digits, 1)):
+                return
+
+    def search_email(self, query, results):
+        email = normalize_email(query)
+        local, _, domain = email.rpartition("@")
+        if local and results.take(self.emails.get(email, {})):
+            return
+        results.take(self.domains.get(domain, {}))
+
+    @timed("contacts.search")
+    def search(self, query, limit=DEFAULT_LIMIT):
+        self.ensure_loaded()
+        query = query.strip()
+        results = Results(limit)
+        if "@" in query:
+            self.search_email(query, results)
+        elif PHONE_QUERY_RE.match(query):
+            self.search_phone(query, results)
+        else:
+            self.search_name(query, results)
+        return [self.repository.get(contact_id) for contact_id in results.ids]
+
+
+_indexes = {}
+
+
+def open_contact_index(repository):
+    if id(repository) not in _indexes:
+        _indexes[id(repository)] = ContactIndex(repository)
+    return _indexes[id(repository)]
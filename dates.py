@@ -0,0 +1,36 @@
+from datetime import datetime
+
+DATE_FORMAT = "%d-%m-%Y"
+TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M:%S"
+TIME_FORMAT = "%H:%M"
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(str(value).strip(), DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_timestamp(value):
+    try:
+        return datetime.strptime(str(value).strip(), TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_time(value):
+    try:
+        return datetime.strptime(str(value).strip(), TIME_FORMAT).time()
+    except (TypeError, ValueError):
+        return None
+
+
+def iso_date(value):
+    date = parse_date(value)
+    return date.isoformat() if date else None
+
+
+def iso_timestamp(value):
+    timestamp = parse_timestamp(value)
+    return timestamp.isoformat(sep=" ") if timestamp else None
@@ -0,0 +1,295 @@
+import os
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from contact_index import normalize_email, normalize_name, normalize_phone
+from dates import iso_date
+from metrics import timed
+from money import DEFAULT_CURRENCY, to_minor
+from storage import field_value
+
+# Похожесть имён (0..1), начиная с которой контакты считаются возможными дубликатами.
+NAME_THRESHOLD = 0.85
+# Блок больше этого сравнивается не попарно, а с соседями в порядке имён.
+MAX_BLOCK = 200
+WINDOW = 20
+# Номера короче этого (внутренние, служебные) не считаются признаком одного человека.
+MIN_PHONE_DIGITS = 5
+# Ключи, которые у разных людей не совпадают.
+IDENTITY_KEYS = {"phone", "email"}
+
+
+def contact_keys(record):
+    keys = []
+    phone = normalize_phone(field_value(record, "phone"))
+    if len(phone) >= MIN_PHONE_DIGITS:
+        keys.append(("phone", phone))
+    email = normalize_email(field_value(record, "email"))
+    if email:
+        keys.append(("email", email))
+    # Контакт без телефона и email узнаётся только по имени.
+    if not keys:
+        name = normalize_name(field_value(record, "name"))
+        if name:
+            keys.append(("name", name))
+    return keys
+
+
+def finance_keys(record):
+    # Отпечаток операции: дата, сумма в копейках, валюта, категория и описание.
+    return [(
+        iso_date(field_value(record, "date")),
+        to_minor(field_value(record, "amount")),
+        str(field_value(record, "currency") or DEFAULT_CURRENCY).upper(),
+        normalize_name(field_value(record, "category")),
+        normalize_name(field_value(record, "description")),
+    )]
+
+
+# Для каждого набора данных: ключи точного совпадения, сравниваются ли имена
+# и считаются ли одинаковые строки одного файла разными записями.
+RULES = {
+    "contacts.json": (contact_keys, True, False),
+    "finance.json": (finance_keys, False, True),
+}
+
+
+def rules(file_name):
+    return RULES.get(os.path.basename(file_name))
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+class DuplicateGroup:
+    def __init__(self, kind, records, score=None):
+        self.kind = kind
+        self.records = records
+        self.score = score
+
+    def to_dict(self):
+        return {"kind": self.kind, "records": [record.to_dict() for record in self.records], "score": self.score}
+
+    @classmethod
+    def from_dict(cls, record_cls, data):
+        return cls(data["kind"], [record_cls.from_dict(record) for record in data["records"]], data["score"])
+
+
+def name_blocks(tokens):
+    # Ключи блоков: пары начал слов имени, для одного слова — начало слова.
+    # Имена сравниваются только внутри общего блока, а не каждое с каждым.
+    if len(tokens) == 1:
+        return [(tokens[0][:3],)]
+    return [(first[:2], second[:2]) for first, second in combinations(tokens[:3], 2)]
+
+
+def name_owners(records):
+    # Нормализованное имя (слова по алфавиту) -> id записей с этим именем.
+    owners = defaultdict(list)
+    for record in records:
+        name = " ".join(sorted(normalize_name(record.name).split()))
+        if name:
+            owners[name].append(record.id)
+    return owners
+
+
+def similar_names(owners, threshold):
+    # Пары (id, id, похожесть) для различных похожих имён. Сравниваются только
+    # имена из общего блока, а в слишком большом блоке — соседи по алфавиту.
+    blocks = defaultdict(list)
+    for name in owners:
+        for block in name_blocks(name.split()):
+            blocks[block].append(name)
+    compared, pairs = set(), []
+    for names in blocks.values():
+        if len(names) > MAX_BLOCK:
+            names.sort()
+            candidates = ((names[index], other) for index in range(len(names)) for other in names[index + 1:index + 1 + WINDOW])
+        else:
+            candidates = combinations(names, 2)
+        for left, right in candidates:
+            pair = (left, right) if left < right else (right, left)
+            if pair in compared:
+                continue
+            compared.add(pair)
+            matcher = SequenceMatcher(None, left, right)
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            score = matcher.ratio()
+            if score >= threshold:
+                # Каждая запись одного имени — с первой записью другого.
+                for ids, other in ((owners[left], min(owners[right])), (owners[right], min(owners[left]))):
+                    pairs.extend((record_id, other, score) for record_id in ids)
+    return pairs
+
+
+@timed("dedup.find")
+def find_duplicates(records, file_name, fuzzy=False, threshold=NAME_THRESHOLD):
+    # Точные дубликаты — записи с общим нормализованным ключом, за один проход
+    # по словарю ключей. Похожие имена (fuzzy) добавляются к тем же группам,
+    # такая группа помечается как возможная. Группы, у каждой из которых свой
+    # телефон (email), по имени не объединяются: скорее это тёзки — общий номер
+    # или адрес уже объединил бы их на точном шаге.
+    keys, compare_names, _ = rules(file_name)
+    groups, owners, kinds = UnionFind(), {}, defaultdict(set)
+    for record in records:
+        for key in keys(record):
+            kinds[record.id].add(key[0])
+            if key in owners:
+                groups.union(owners[key], record.id)
+            else:
+                owners[key] = record.id
+    scores = {}
+    if fuzzy and compare_names:
+        found = defaultdict(set)
+        for record_id, record_kinds in kinds.items():
+            found[groups.find(record_id)] |= record_kinds & IDENTITY_KEYS
+
+        def attach(first, second, score):
+            left, right = groups.find(first), groups.find(second)
+            if left == right:
+                return True
+            if found[left] & found[right]:
+                return False
+            groups.union(left, right)
+            found[groups.find(left)] = found[left] | found[right]
+            scores[second] = min(scores.get(second, score), score)
+            return True
+
+        names = name_owners(records)
+        # Одно и то же имя: запись присоединяется к одной из последних WINDOW групп
+        # этого имени, с которой нет конфликта, иначе начинает новую.
+        for ids in names.values():
+            clusters = []
+            for record_id in sorted(ids):
+                if not any(attach(cluster, record_id, 1.0) for cluster in clusters[-WINDOW:]):
+                    clusters.append(record_id)
+        for first, second, score in sorted(similar_names(names, threshold), key=lambda pair: (-pair[2], pair[0], pair[1])):
+            attach(first, second, score)
+    members = defaultdict(list)
+    for record in records:
+        if record.id in groups.parent:
+            members[groups.find(record.id)].append(record)
+    result = []
+    for _, group in sorted(members.items()):
+        if len(group) < 2:
+            continue
+        group.sort(key=lambda record: record.id)
+        score = min((scores[record.id] for record in group if record.id in scores), default=None)
+        result.append(DuplicateGroup("exact" if score is None else "fuzzy", group, score))
+    return result
+
+
+def merged_changes(survivor, others, schema):
+    # Пустые поля остающейся записи заполняются из дубликатов по порядку id.
+    changes = {}
+    for field in schema:
+        if field == "id" or field_value(survivor, field) not in (None, ""):
+            continue
+        for other in others:
+            value = field_value(other, field)
+            if value not in (None, ""):
+                changes[field] = value
+                break
+    return changes
+
+
+def merge_groups(repository, groups):
+    # Остаётся запись с меньшим id, остальные удаляются; всё одной транзакцией,
+    # поэтому объединение отменяется одним шагом истории.
+    removed = 0
+    with repository.transaction():
+        for group in groups:
+            survivor, *others = [repository.get(record.id) for record in group.records]
+            others = [record for record in others if record is not None]
+            if survivor is None or not others:
+                continue
+            changes = merged_changes(survivor, others, repository.record_cls.SCHEMA)
+            if changes:
+                repository.update(survivor, **changes)
+            for record in others:
+                repository.delete(record.id)
+                removed += 1
+    return removed
+
+
+def deduplicate(repository, file_name, fuzzy=False, threshold=NAME_THRESHOLD, apply=False):
+    # Группы дубликатов и число удалённых записей (0, если apply не задан).
+    if repository.remote:
+        groups, removed = repository.call("deduplicate", fuzzy=fuzzy, threshold=threshold, apply=apply)
+        return [DuplicateGroup.from_dict(repository.record_cls, data) for data in groups], removed
+    if rules(file_name) is None:
+        raise ValueError(f"поиск дубликатов недоступен для {os.path.basename(file_name)}")
+    if not 0 < threshold <= 1:
+        raise ValueError("порог похожести должен быть больше 0 и не больше 1")
+    groups = find_duplicates(repository.all(), file_name, fuzzy, threshold)
+    return groups, merge_groups(repository, groups) if apply and groups else 0
+
+
+def describe(groups):
+    lines = []
+    for group in groups:
+        kind = "точное совпадение" if group.kind == "exact" else f"похожие имена, {group.score:.0%}"
+        lines.append(f"Группа ({kind}), останется ID {group.records[0].id}:")
+        lines.extend(f"  {record.summary()}" for record in group.records)
+    return lines
+
+
+def manage_duplicates(manager, file_name, fuzzy=False):
+    # Диалог из меню: группы показываются, объединяются после подтверждения.
+    groups, _ = deduplicate(manager.repository(), file_name, fuzzy)
+    if not groups:
+        print("Дубликаты не найдены.")
+        return
+    for line in describe(groups):
+        print(line)
+    answer = input(f"Объединить найденные группы ({len(groups)})? (да/нет): ").strip().lower()
+    if answer not in ("да", "д", "yes", "y"):
+        return
+    _, removed = deduplicate(manager.repository(), file_name, fuzzy, apply=True)
+    print(f"Дубликаты объединены, удалено записей: {removed}")
+
+
+class ImportFilter:
+    # Отсев при импорте строк, которые уже есть в наборе данных: повторный
+    # импорт того же файла ничего не добавляет. Если одинаковые строки файла
+    # считаются разными записями (две одинаковые покупки за день), каждая
+    # существующая запись поглощает только одну такую строку.
+    def __init__(self, records, keys, repeats):
+        self.keys = keys
+        self.repeats = repeats
+        self.counts = Counter(key for record in records for key in keys(record))
+
+    def duplicate(self, record):
+        keys = self.keys(record)
+        found = [key for key in keys if self.counts[key] > 0]
+        if found:
+            if self.repeats:
+                for key in found:
+                    self.counts[key] -= 1
+            return True
+        if not self.repeats:
+            self.counts.update(keys)
+        return False
+
+
+def import_filter(repository, file_name):
+    found = rules(file_name)
+    if found is None:
+        return None
+    keys, _, repeats = found
+    return ImportFilter(repository.all(), keys, repeats)
@@ -0,0 +1,58 @@
+import csv
+import gzip
+import json
+
+from metrics import timed
+from money import format_amount, parse_currency
+
+# Значения, которые в хранилище лежат во внутреннем виде, выводятся по типу поля схемы.
+FORMATTERS = {
+    "money": format_amount,
+    "currency": parse_currency,
+}
+
+
+def export_format(file_name):
+    name = file_name[:-3] if file_name.endswith(".gz") else file_name
+    return "jsonl" if name.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def open_output(file_name):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "wt", newline="", encoding="utf-8")
+    return open(file_name, "w", newline="", encoding="utf-8")
+
+
+def write_csv(file, records, fieldnames):
+    writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def write_jsonl(file, records, fieldnames):
+    count = 0
+    for record in records:
+        file.write(json.dumps({field: record.get(field) for field in fieldnames}, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def formatted(records, schema):
+    formatters = {field: FORMATTERS[type_name] for field, (type_name, _) in schema.items() if type_name in FORMATTERS}
+    for record in records:
+        if formatters:
+            record = dict(record)
+            for field, formatter in formatters.items():
+                record[field] = formatter(record.get(field))
+        yield record
+
+
+@timed("export")
+def export_records(source, file_name, schema, filters=()):
+    write = write_jsonl if export_format(file_name) == "jsonl" else write_csv
+    with open_output(file_name) as file:
+        return write(file, formatted(source.iter_records(filters), schema), list(schema))
@@ -0,0 +1,346 @@
+import math
+import operator
+import re
+from functools import lru_cache, reduce
+
+from importer import BATCH_SIZE
+from lazy import optional_module
+
+numpy = optional_module("numpy")
+
+EXPRESSION_CACHE_SIZE = 256
+TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([^\W\d]\w*)|(\*\*|//|[-+*/%^(),]))")
+CONSTANTS = {"pi": math.pi, "e": math.e}
+# Приоритет и правая ассоциативность бинарных операторов.
+BINARY = {"+": (1, False), "-": (1, False), "*": (2, False), "/": (2, False), "//": (2, False), "%": (2, False),
+          "^": (4, True), "**": (4, True)}
+UNARY_PRECEDENCE = 3
+# Сколько аргументов принимает функция: (минимум, максимум или None).
+ARITY = {
+    "abs": (1, 1), "round": (1, 2), "min": (1, None), "max": (1, None), "sqrt": (1, 1), "floor": (1, 1),
+    "ceil": (1, 1), "exp": (1, 1), "ln": (1, 1), "log": (1, 2), "pow": (2, 2),
+}
+FUNCTIONS_HELP = "abs, round(x[, знаков]), min, max, sqrt, floor, ceil, exp, ln, log(x[, основание]), pow; константы pi, e"
+
+
+def divide(a, b):
+    if b == 0:
+        raise ZeroDivisionError("Деление на ноль недопустимо.")
+    return a / b
+
+
+def floor_divide(a, b):
+    if b == 0:
+        raise ZeroDivisionError("Деление на ноль недопустимо.")
+    return a // b
+
+
+def modulo(a, b):
+    if b == 0:
+        raise ZeroDivisionError("Деление на ноль недопустимо.")
+    return a % b
+
+
+def power(a, b):
+    return math.pow(a, b)
+
+
+def log(x, base=10):
+    return math.log(x, base)
+
+
+SCALAR_OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": divide, "//": floor_divide,
+                    "%": modulo, "^": power, "**": power}
+SCALAR_FUNCTIONS = {
+    "abs": abs, "round": lambda x, digits=0: round(x, int(digits)),
+    "min": lambda *values: min(values), "max": lambda *values: max(values), "sqrt": math.sqrt,
+    "floor": math.floor, "ceil": math.ceil, "exp": math.exp, "ln": math.log, "log": log, "pow": power,
+}
+
+
+@lru_cache(maxsize=None)
+def vector_tables():
+    # Таблицы для numpy строятся при первом векторном вычислении, чтобы не импортировать numpy при старте.
+    operators = {"+": numpy.add, "-": numpy.subtract, "*": numpy.multiply, "/": numpy.true_divide,
+                 "//": numpy.floor_divide, "%": numpy.mod, "^": numpy.power, "**": numpy.power}
+    functions = {
+        "abs": numpy.abs, "round": lambda x, digits=0: numpy.round(x, int(digits)),
+        "min": lambda *values: reduce(numpy.minimum, values), "max": lambda *values: reduce(numpy.maximum, values),
+        "sqrt": numpy.sqrt, "floor": numpy.floor, "ceil": numpy.ceil, "exp": numpy.exp, "ln": numpy.log,
+        "log": lambda x, base=10: numpy.log(x) / numpy.log(base), "pow": numpy.power,
+    }
+    return operators, functions
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"непонятный символ {text[position:].strip()[:1]!r} в позиции {position + 1}")
+        number, name, symbol = match.groups()
+        if number is not None:
+            tokens.append(("num", float(number)))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("op", symbol))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    # Разбор с подъёмом приоритетов в дерево из кортежей:
+    # ("num", x), ("var", имя), ("neg", узел), ("bin", оператор, левый, правый), ("call", имя, аргументы).
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, symbol):
+        if self.take() != ("op", symbol):
+            raise ValueError(f"ожидалось {symbol!r}")
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("пустое выражение")
+        node = self.expression(0)
+        if self.position < len(self.tokens):
+            value = self.peek()[1]
+            raise ValueError(f"лишний элемент {format_number(value) if isinstance(value, float) else value!r}")
+        return node
+
+    def expression(self, min_precedence):
+        left = self.unary()
+        while True:
+            kind, symbol = self.peek()
+            if kind != "op" or symbol not in BINARY:
+                return left
+            precedence, right_assoc = BINARY[symbol]
+            if precedence < min_precedence:
+                return left
+            self.take()
+            right = self.expression(precedence if right_assoc else precedence + 1)
+            left = fold(("bin", symbol, left, right))
+
+    def unary(self):
+        kind, symbol = self.peek()
+        if (kind, symbol) in (("op", "-"), ("op", "+")):
+            self.take()
+            operand = self.expression(UNARY_PRECEDENCE)
+            return fold(("neg", operand)) if symbol == "-" else operand
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "num":
+            return ("num", value)
+        if kind == "name":
+            if self.peek() == ("op", "("):
+                return self.call(value)
+            if value in CONSTANTS:
+                return ("num", CONSTANTS[value])
+            return ("var", value)
+        if (kind, value) == ("op", "("):
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        raise ValueError("выражение оборвано" if kind is None else f"неожиданный элемент {value!r}")
+
+    def call(self, name):
+        if name not in ARITY:
+            raise ValueError(f"неизвестная функция {name}")
+        self.expect("(")
+        args = []
+        if self.peek() != ("op", ")"):
+            args.append(self.expression(0))
+            while self.peek() == ("op", ","):
+                self.take()
+                args.append(self.expression(0))
+        self.expect(")")
+        low, high = ARITY[name]
+        if len(args) < low or (high is not None and len(args) > high):
+            raise ValueError(f"неверное число аргументов у {name}: {len(args)}")
+        return fold(("call", name, tuple(args)))
+
+
+def fold(node):
+    # Подвыражения из одних чисел вычисляются один раз при компиляции.
+    children = node[2:] if node[0] == "bin" else node[1:] if node[0] == "neg" else node[2]
+    if all(child[0] == "num" for child in children):
+        try:
+            return ("num", build(node, SCALAR_OPERATORS, SCALAR_FUNCTIONS)(None))
+        except (ArithmeticError, ValueError, TypeError):
+            # Ошибку вроде деления на ноль покажем при вычислении.
+            pass
+    return node
+
+
+def build(node, operators, functions):
+    # Дерево превращается в цепочку замыканий: при вычислении нет ни разбора, ни обхода дерева.
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda env: value
+    if kind == "var":
+        name = node[1]
+        return lambda env: env[name]
+    if kind == "neg":
+        operand = build(node[1], operators, functions)
+        return lambda env: -operand(env)
+    if kind == "bin":
+        function = operators[node[1]]
+        left, right = build(node[2], operators, functions), build(node[3], operators, functions)
+        return lambda env: function(left(env), right(env))
+    function = functions[node[1]]
+    args = [build(arg, operators, functions) for arg in node[2]]
+    if len(args) == 1:
+        arg = args[0]
+        return lambda env: function(arg(env))
+    return lambda env: function(*[arg(env) for arg in args])
+
+
+def variables_of(node):
+    if node[0] == "var":
+        return {node[1]}
+    if node[0] == "bin":
+        return variables_of(node[2]) | variables_of(node[3])
+    if node[0] == "neg":
+        return variables_of(node[1])
+    if node[0] == "call":
+        return set().union(*(variables_of(arg) for arg in node[2]))
+    return set()
+
+
+class Expression:
+    __slots__ = ("text", "tree", "variables", "scalar", "_vector")
+
+    def __init__(self, text):
+        self.text = text
+        self.tree = Parser(text).parse()
+        self.variables = frozenset(variables_of(self.tree))
+        self.scalar = build(self.tree, SCALAR_OPERATORS, SCALAR_FUNCTIONS)
+        self._vector = None
+
+    @property
+    def vector(self):
+        if self._vector is None:
+            self._vector = build(self.tree, *vector_tables())
+        return self._vector
+
+    def check(self, names):
+        missing = sorted(self.variables - set(names))
+        if missing:
+            raise ValueError(f"неизвестная переменная: {', '.join(missing)}")
+
+    def evaluate(self, variables=None):
+        variables = variables or {}
+        self.check(variables)
+        try:
+            result = self.scalar(variables)
+        except OverflowError:
+            raise ValueError("слишком большое число")
+        except ArithmeticError as error:
+            raise ValueError(str(error))
+        except (TypeError, ValueError):
+            raise ValueError("значение вне области определения функции")
+        if isinstance(result, complex) or not math.isfinite(result):
+            raise ValueError("значение вне области определения функции")
+        return result
+
+    def evaluate_rows(self, columns, count, variables=None):
+        # Без numpy: та же скомпилированная функция, но построчно.
+        env = dict(variables or {})
+        results = []
+        for index in range(count):
+            for name, column in columns.items():
+                env[name] = column[index]
+            try:
+                results.append(None if any(env[name] is None for name in columns) else self.evaluate(env))
+            except (ValueError, ArithmeticError):
+                results.append(None)
+        return results
+
+    def evaluate_many(self, columns, count, variables=None):
+        # Одно вычисление на весь столбец. columns — имя -> список чисел (None —
+        # пропуск), результат — список чисел, None там, где значение не определено.
+        self.check(set(columns) | set(variables or {}))
+        if numpy is None:
+            return self.evaluate_rows(columns, count, variables)
+        env = dict(variables or {})
+        for name, column in columns.items():
+            env[name] = numpy.array([numpy.nan if value is None else value for value in column], dtype=float)
+        with numpy.errstate(all="ignore"):
+            try:
+                result = numpy.broadcast_to(numpy.asarray(self.vector(env), dtype=float), (count,))
+            except (TypeError, ValueError):
+                return self.evaluate_rows(columns, count, variables)
+        return [value if math.isfinite(value) else None for value in result.tolist()]
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(text):
+    return Expression(text.strip())
+
+
+def evaluate_column(text, values, name="x", variables=None):
+    return compile_expression(text).evaluate_many({name: values}, len(values), variables)
+
+
+def evaluate_csv(text, file_name, output_name, column="result", variables=None, batch_size=BATCH_SIZE):
+    # Потоково, пачками по batch_size строк: в каждой пачке столбцы из выражения
+    # разбираются в числа и вычисляются одним вызовом. Возвращает число строк и
+    # число строк без результата (пустые или нечисловые значения, вне области определения).
+    import csv
+    expression = compile_expression(text)
+    rows = failed = 0
+    with open(file_name, "r", newline="", encoding="utf-8-sig") as source, \
+            open(output_name, "w", newline="", encoding="utf-8") as output:
+        reader = csv.DictReader(source)
+        fieldnames = reader.fieldnames or []
+        names = [name for name in fieldnames if name in expression.variables]
+        expression.check(set(names) | set(variables or {}))
+        writer = csv.DictWriter(output, fieldnames=fieldnames + ([column] if column not in fieldnames else []))
+        writer.writeheader()
+        batch = []
+        for row in reader:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                failed += write_batch(expression, batch, names, column, variables, writer)
+                rows += len(batch)
+                batch = []
+        failed += write_batch(expression, batch, names, column, variables, writer)
+        rows += len(batch)
+    return rows, failed
+
+
+def number_or_none(value):
+    # Число из ячейки CSV: пробелы и неразрывные пробелы между разрядами, запятая вместо точки.
+    try:
+        return float(str(value or "").strip().replace("\xa0", "").replace(" ", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def write_batch(expression, batch, names, column, variables, writer):
+    if not batch:
+        return 0
+    columns = {name: [number_or_none(row[name]) for row in batch] for name in names}
+    results = expression.evaluate_many(columns, len(batch), variables)
+    for row, result in zip(batch, results):
+        row[column] = format_number(result) if result is not None else ""
+    writer.writerows(batch)
+    return results.count(None)
+
+
+def format_number(value):
+    return f"{value:.12g}"
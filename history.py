@@ -0,0 +1,193 @@
+import json
+import os
+from datetime import datetime
+
+from storage import ConflictError, StorageError
+
+# Сколько последних групп изменений хранится; журнал сжимается, когда их вдвое больше.
+HISTORY_LIMIT = 1000
+
+
+def history_file_name(file_name):
+    return os.path.splitext(file_name)[0] + ".history.jsonl"
+
+
+def without_version(data):
+    if data is None:
+        return None
+    return {field: value for field, value in data.items() if field != "version"}
+
+
+class History:
+    # История изменений набора данных из дельт: на каждую записанную
+    # транзакцию — группа [id, было, стало] только по затронутым записям,
+    # поэтому память и файл растут с числом изменений, а не с объёмом данных.
+    # Отмена и повтор откатывают дельты группы новой транзакцией, а состояние
+    # на момент T — это текущие записи с откатом всех групп позже T.
+    # Файл общий для процессов и читается с последнего прочитанного байта.
+    def __init__(self, repository, file_name):
+        self.repository = repository
+        self.file_name = file_name
+        self.groups = []
+        self.by_seq = {}
+        self.done = []
+        self.undone = []
+        self.offset = 0
+        self.last_action = None
+        self.identity = None
+        self.mode = None
+        repository.history = self
+
+    def reset(self):
+        self.groups = []
+        self.by_seq = {}
+        self.done = []
+        self.undone = []
+        self.offset = 0
+        self.last_action = None
+
+    def refresh(self):
+        # Вызывается под блокировкой хранилища.
+        try:
+            stat = os.stat(self.file_name)
+        except FileNotFoundError:
+            self.reset()
+            self.identity = None
+            return
+        if (stat.st_ino, stat.st_dev) != self.identity or stat.st_size < self.offset:
+            self.reset()
+            self.identity = (stat.st_ino, stat.st_dev)
+        if stat.st_size == self.offset:
+            return
+        with open(self.file_name, "rb") as file:
+            file.seek(self.offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                self.add_entry(json.loads(line))
+
+    def add_entry(self, entry):
+        self.groups.append(entry)
+        self.by_seq[entry["seq"]] = entry
+        if entry["kind"] == "do":
+            self.last_action = entry["time"]
+            self.done.append(entry["seq"])
+            self.undone.clear()
+        elif entry["kind"] == "undo":
+            if entry["target"] in self.done:
+                self.done.remove(entry["target"])
+            self.undone.append(entry["seq"])
+        else:
+            if entry["target"] in self.undone:
+                self.undone.remove(entry["target"])
+            self.done.append(entry["seq"])
+
+    def record(self, changes):
+        # Вызывается репозиторием после записи транзакции, ещё под блокировкой.
+        if not changes:
+            return
+        self.refresh()
+        kind, target = self.mode or ("do", None)
+        entry = {
+            "seq": self.groups[-1]["seq"] + 1 if self.groups else 1,
+            "time": datetime.now().isoformat(),
+            "kind": kind,
+            "target": target,
+            "changes": changes,
+        }
+        data = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.file_name, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        if self.identity is None:
+            stat = os.stat(self.file_name)
+            self.identity = (stat.st_ino, stat.st_dev)
+        self.offset += len(data)
+        self.add_entry(entry)
+        if len(self.groups) > 2 * HISTORY_LIMIT:
+            self.compact()
+
+    def compact(self):
+        kept = self.groups[-HISTORY_LIMIT:]
+        tmp_name = f"{self.file_name}.{os.getpid()}.tmp"
+        with open(tmp_name, "wb") as file:
+            for entry in kept:
+                file.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_name, self.file_name)
+        self.identity = None
+        self.refresh()
+
+    def entries(self, limit=20):
+        with self.repository.storage.locked(exclusive=False):
+            self.refresh()
+            return self.groups[-limit:]
+
+    def latest(self, kind):
+        # Группа, которую откатит undo или redo, если она есть, и время последнего нового действия.
+        with self.repository.storage.locked(exclusive=False):
+            self.refresh()
+            stack = self.done if kind == "undo" else self.undone
+            return (self.by_seq[stack[-1]] if stack else None), self.last_action
+
+    def revert(self, kind):
+        if self.repository.pending is not None:
+            raise StorageError("Отмена и повтор недоступны внутри транзакции")
+        try:
+            with self.repository.transaction():
+                self.refresh()
+                stack = self.done if kind == "undo" else self.undone
+                if not stack:
+                    return None
+                entry = self.by_seq[stack[-1]]
+                self.mode = (kind, entry["seq"])
+                for record_id, before, after in reversed(entry["changes"]):
+                    self.restore(record_id, after, before)
+            # Для повтора возвращаем исходное действие, а не его отмену.
+            return entry if kind == "undo" else self.by_seq.get(entry["target"], entry)
+        finally:
+            self.mode = None
+
+    def restore(self, record_id, expected, target):
+        # Версию увеличивает и сам откат, поэтому она в сравнении не участвует:
+        # иначе второй откат той же записи подряд считался бы конфликтом.
+        current = self.repository.get(record_id)
+        if without_version(current.to_dict() if current is not None else None) != without_version(expected):
+            raise ConflictError(f"Запись {record_id} изменена позже, действие нельзя откатить")
+        if target is None:
+            self.repository.delete(record_id)
+        elif current is None:
+            self.repository.add(self.repository.record_cls.from_dict(target))
+        else:
+            self.repository.update(current, **{field: value for field, value in target.items() if field not in ("id", "version")})
+
+    def state_at(self, moment):
+        # Возвращает записи на момент moment и начало хранимой истории.
+        with self.repository.storage.locked(exclusive=False):
+            self.repository.sync()
+            self.refresh()
+            records = {record.id: record.to_dict() for record in self.repository.index().values()}
+            stamp = moment.isoformat()
+            for entry in reversed(self.groups):
+                if entry["time"] <= stamp:
+                    break
+                for record_id, before, after in reversed(entry["changes"]):
+                    if before is None:
+                        records.pop(record_id, None)
+                    else:
+                        records[record_id] = before
+            started = datetime.fromisoformat(self.groups[0]["time"]) if self.groups else None
+        records = [self.repository.record_cls.from_dict(data) for data in records.values()]
+        return sorted(records, key=lambda record: record.id), started
+
+
+_histories = {}
+
+
+def open_history(repository, file_name):
+    if id(repository) not in _histories:
+        _histories[id(repository)] = History(repository, history_file_name(file_name))
+    return _histories[id(repository)]
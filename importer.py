@@ -0,0 +1,181 @@
+import time
+from datetime import datetime
+
+from dates import DATE_FORMAT, TIMESTAMP_FORMAT, parse_date, parse_timestamp
+from metrics import timed
+from money import parse_amount, parse_currency
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 10
+
+TRUE_VALUES = ("true", "1", "да", "yes")
+FALSE_VALUES = ("false", "0", "нет", "no")
+
+
+def to_str(value):
+    return value.strip()
+
+
+def to_int(value):
+    try:
+        return int(value.strip())
+    except ValueError:
+        raise ValueError(f"ожидалось целое число, получено {value!r}")
+
+
+def to_bool(value):
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"ожидалось логическое значение, получено {value!r}")
+
+
+def to_date(value):
+    date = parse_date(value)
+    if date is None:
+        try:
+            date = datetime.strptime(value.strip(), "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError(f"некорректная дата {value!r}")
+    return date.strftime(DATE_FORMAT)
+
+
+def to_timestamp(value):
+    timestamp = parse_timestamp(value)
+    if timestamp is None:
+        raise ValueError(f"некорректная дата и время {value!r}")
+    return timestamp.strftime(TIMESTAMP_FORMAT)
+
+
+COERCERS = {
+    "str": to_str,
+    "int": to_int,
+    "bool": to_bool,
+    "date": to_date,
+    "timestamp": to_timestamp,
+    "money": parse_amount,
+    "currency": parse_currency,
+}
+
+
+def coerce_row(row, schema, required_fields):
+    data = {}
+    for field, (type_name, default) in schema.items():
+        value = row.get(field)
+        if value is None or not value.strip():
+            if field in required_fields:
+                raise ValueError(f"не заполнено поле {field}")
+            data[field] = default
+            continue
+        try:
+            data[field] = COERCERS[type_name](value)
+        except ValueError as error:
+            raise ValueError(f"поле {field}: {error}")
+    return data
+
+
+class ImportReport:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.rejected_file = file_name + ".rejected.csv"
+        self.imported = 0
+        self.rejected = 0
+        self.reassigned = 0
+        self.duplicates = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def processed(self):
+        return self.imported + self.rejected + self.duplicates
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def print_progress(self):
+        print(f"\rОбработано строк: {self.processed} ({self.rate:.0f} строк/с)", end="", flush=True)
+
+    def print_summary(self):
+        print()
+        print(f"Импортировано записей: {self.imported}, отклонено: {self.rejected}, новых ID выдано: {self.reassigned}")
+        if self.duplicates:
+            print(f"Пропущено дубликатов уже имеющихся записей: {self.duplicates}")
+        print(f"Время: {self.elapsed:.2f} с ({self.rate:.0f} строк/с)")
+        for line_number, message in self.errors:
+            print(f"Строка {line_number}: {message}")
+        if self.rejected > len(self.errors):
+            print(f"... и ещё {self.rejected - len(self.errors)} ошибок")
+        if self.rejected:
+            print(f"Отклонённые строки сохранены в {self.rejected_file}")
+
+
+class CsvImporter:
+    def __init__(self, repository, schema, required_fields=(), batch_size=BATCH_SIZE, progress=True, duplicates=None):
+        self.repository = repository
+        self.schema = schema
+        self.required_fields = required_fields
+        self.duplicates = duplicates
+        self.batch_size = batch_size
+        self.progress = progress
+
+    @timed("import.csv")
+    def run(self, file_name):
+        import csv
+        report = ImportReport(file_name)
+        rejected_file = None
+        rejected_writer = None
+        batch = []
+        try:
+            with open(file_name, "r", newline="", encoding="utf-8-sig") as file:
+                reader = csv.DictReader(file)
+                for line_number, row in enumerate(reader, start=2):
+                    try:
+                        record = self.repository.record_cls.from_dict(coerce_row(row, self.schema, self.required_fields))
+                    except ValueError as error:
+                        report.rejected += 1
+                        if len(report.errors) < MAX_REPORTED_ERRORS:
+                            report.errors.append((line_number, str(error)))
+                        if rejected_writer is None:
+                            rejected_file = open(report.rejected_file, "w", newline="", encoding="utf-8")
+                            rejected_writer = csv.DictWriter(rejected_file, fieldnames=["line", "error"] + reader.fieldnames, extrasaction="ignore")
+                            rejected_writer.writeheader()
+                        rejected_writer.writerow(dict(row, line=line_number, error=str(error)))
+                        continue
+                    # id из файла в сравнении не участвует.
+                    if self.duplicates is not None and self.duplicates.duplicate(record):
+                        report.duplicates += 1
+                        continue
+                    batch.append(record)
+
+                    if len(batch) >= self.batch_size:
+                        self.flush(batch, report)
+                        batch = []
+                self.flush(batch, report)
+        finally:
+            if rejected_file is not None:
+                rejected_file.close()
+        report.finished = time.perf_counter()
+        return report
+
+    def flush(self, batch, report):
+        if batch:
+            original_ids = [record.id for record in batch]
+            self.repository.add_many(batch)
+            report.imported += len(batch)
+            report.reassigned += sum(
+                1 for record_id, record in zip(original_ids, batch) if record_id is not None and record_id != record.id
+            )
+        if self.progress:
+            report.print_progress()
+
+
+def import_csv(repository, schema, required_fields, file_name, duplicates=None):
+    return CsvImporter(repository, schema, required_fields, duplicates=duplicates).run(file_name)
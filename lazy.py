@@ -0,0 +1,26 @@
+import importlib
+
+
+class LazyModule:
+    # Заместитель модуля: настоящий импорт происходит при первом обращении к атрибуту.
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "загружен" if self._module is not None else "не загружен"
+        return f"<LazyModule {self._name}: {state}>"
+
+
+def optional_module(name):
+    # Необязательная зависимость без затрат на импорт при старте: None, если
+    # модуль не установлен, иначе заместитель, который загрузит его при первом использовании.
+    import importlib.util
+    if importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
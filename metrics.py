@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from functools import wraps
+
+# Верхние границы корзин гистограммы задержек, мс; всё дольше — в последней корзине.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PERCENTILES = (50, 90, 99)
+# Профилирование всего сеанса: префикс файлов .prof, .txt и .alloc.txt.
+PROFILE_ENV = "PA_PROFILE"
+# Файл, в который при выходе записывается статистика в JSON.
+STATS_ENV = "PA_STATS"
+PROFILE_TOP = 30
+
+
+class Metric:
+    __slots__ = ("count", "total", "low", "high", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.low = None
+        self.high = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.low = elapsed if self.low is None else min(self.low, elapsed)
+        self.high = max(self.high, elapsed)
+        self.buckets[bisect_left(BUCKETS, elapsed)] += 1
+
+    def percentile(self, share):
+        # Оценка по гистограмме: верхняя граница корзины, в которую попал процентиль.
+        rank = self.count * share / 100
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKETS[index], self.high) if index < len(BUCKETS) else self.high
+        return self.high
+
+    def to_dict(self):
+        return dict(
+            {f"p{share}_ms": round(self.percentile(share), 4) for share in PERCENTILES},
+            count=self.count,
+            total_ms=round(self.total, 3),
+            mean_ms=round(self.total / self.count, 4) if self.count else None,
+            min_ms=round(self.low, 4) if self.low is not None else None,
+            max_ms=round(self.high, 4),
+            buckets={("inf" if index == len(BUCKETS) else str(BUCKETS[index])): count
+                     for index, count in enumerate(self.buckets) if count},
+        )
+
+
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+_started = datetime.now()
+_profile = None
+
+
+def observe(name, elapsed):
+    with _lock:
+        metric = _timings.get(name)
+        if metric is None:
+            metric = _timings[name] = Metric()
+        metric.add(elapsed)
+
+
+def count(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+class timer:
+    # Замер блока кода: with timer("имя"): ...
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, (time.perf_counter() - self.started) * 1000)
+
+
+def timed(name):
+    # Декоратор: время каждого вызова попадает в гистограмму name, в том числе при исключении.
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, (time.perf_counter() - started) * 1000)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    with _lock:
+        timings = {name: metric.to_dict() for name, metric in sorted(_timings.items())}
+        counters = dict(sorted(_counters.items()))
+    return {
+        "pid": os.getpid(),
+        "started": _started.isoformat(timespec="seconds"),
+        "uptime_s": round((datetime.now() - _started).total_seconds(), 1),
+        "profiling": _profile is not None,
+        "timings": timings,
+        "counters": counters,
+    }
+
+
+def reset():
+    global _started
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+        _started = datetime.now()
+
+
+def dump(file_name, data=None):
+    with open(file_name, "w", encoding="utf-8") as file:
+        json.dump(data or snapshot(), file, ensure_ascii=False, indent=2)
+        file.write("\n")
+
+
+def describe(data=None):
+    # Таблица для меню и командной строки: самые затратные по суммарному времени — сверху.
+    data = data or snapshot()
+    lines = [f"Статистика с {data['started']} ({data['uptime_s']} с), процесс {data['pid']}"
+             + (", идёт профилирование" if data["profiling"] else "")]
+    if not data["timings"] and not data["counters"]:
+        lines.append("Замеров пока нет.")
+        return lines
+    if data["timings"]:
+        lines.append(f"{'операция':<26} {'вызовов':>8} {'всего, мс':>11} {'среднее':>9} {'p50':>8} {'p90':>8} {'p99':>8} {'макс':>9}")
+        for name, item in sorted(data["timings"].items(), key=lambda entry: entry[1]["total_ms"], reverse=True):
+            lines.append(f"{name:<26} {item['count']:>8} {item['total_ms']:>11.1f} {item['mean_ms']:>9.3f} "
+                         f"{item['p50_ms']:>8.3f} {item['p90_ms']:>8.3f} {item['p99_ms']:>8.3f} {item['max_ms']:>9.3f}")
+    for name, value in data["counters"].items():
+        lines.append(f"{name}: {value}")
+    return lines
+
+
+def profiling():
+    return _profile is not None
+
+
+def start_profiling():
+    # cProfile и tracemalloc подключаются только здесь: без профилирования они не загружаются.
+    global _profile
+    import cProfile
+    import tracemalloc
+    if _profile is not None:
+        raise ValueError("профилирование уже идёт")
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    profile.enable()
+    _profile = profile
+
+
+def stop_profiling(prefix):
+    # Записывает prefix.prof (для pstats/snakeviz), prefix.txt — самые затратные
+    # функции и prefix.alloc.txt — места наибольшего выделения памяти.
+    global _profile
+    import io
+    import pstats
+    import tracemalloc
+    if _profile is None:
+        raise ValueError("профилирование не запущено")
+    profile, _profile = _profile, None
+    profile.disable()
+    allocations = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    files = [prefix + ".prof", prefix + ".txt", prefix + ".alloc.txt"]
+    profile.dump_stats(files[0])
+    text = io.StringIO()
+    pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    with open(files[1], "w", encoding="utf-8") as file:
+        file.write(text.getvalue())
+    with open(files[2], "w", encoding="utf-8") as file:
+        file.write(f"Память: сейчас {current / 1024:.1f} КиБ, пик {peak / 1024:.1f} КиБ\n")
+        for stat in allocations.statistics("lineno")[:PROFILE_TOP]:
+            file.write(f"{stat}\n")
+    return files
+
+
+def finish_profiling(prefix):
+    if _profile is not None:
+        stop_profiling(prefix)
+
+
+def install():
+    # Включение без правки кода: PA_PROFILE профилирует весь сеанс, PA_STATS
+    # сохраняет статистику при выходе.
+    import atexit
+    prefix = os.environ.get(PROFILE_ENV)
+    if prefix:
+        start_profiling()
+        atexit.register(finish_profiling, prefix)
+    stats_file = os.environ.get(STATS_ENV)
+    if stats_file:
+        atexit.register(dump, stats_file)
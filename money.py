@@ -0,0 +1,54 @@
+# Суммы хранятся и складываются целыми числами в минимальных единицах
+# (копейках), Decimal появляется только при разборе ввода и при выводе.
+# У всех поддерживаемых валют две цифры после запятой. Модуль decimal
+# загружается при первом разборе суммы: командам без сумм он не нужен.
+AMOUNT_SCALE = 100
+CENT = "0.01"
+DEFAULT_CURRENCY = "RUB"
+
+
+def parse_amount(value):
+    # Сумма в основных единицах (строка, Decimal или число) -> копейки.
+    from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+    if isinstance(value, float):
+        value = repr(value)
+    text = str(value).strip().replace("\xa0", "").replace(" ", "").replace(",", ".")
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"ожидалась сумма, получено {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"ожидалась сумма, получено {value!r}")
+    return int(amount.quantize(Decimal(CENT), rounding=ROUND_HALF_UP) * AMOUNT_SCALE)
+
+
+def to_minor(value):
+    # Хранимое значение -> копейки. Целое уже в копейках; float и строки
+    # остались от прежнего формата, где сумма хранилась в рублях.
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return parse_amount(value)
+    except ValueError:
+        return None
+
+
+def to_decimal(minor):
+    from decimal import Decimal
+    return (Decimal(minor) / AMOUNT_SCALE).quantize(Decimal(CENT))
+
+
+def format_amount(value):
+    minor = to_minor(value)
+    return f"{to_decimal(minor):.2f}" if minor is not None else ""
+
+
+def parse_currency(value):
+    code = str(value or "").strip().upper()
+    if not code:
+        return DEFAULT_CURRENCY
+    if len(code) != 3 or not code.isalpha():
+        raise ValueError(f"код валюты должен состоять из трёх букв, получено {value!r}")
+    return code
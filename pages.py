@@ -0,0 +1,308 @@
+import json
+import sys
+from bisect import bisect_left, bisect_right, insort
+
+from dates import iso_timestamp
+from metrics import timed
+from money import to_minor
+from storage import field_value, filter_value, priority_rank
+
+PAGE_SIZE = 20
+# После стольких изменений индекс дешевле пересобрать, чем править по одному ключу.
+REBUILD_AFTER = 1000
+# Сколько строк выводится одной записью в stdout.
+OUTPUT_CHUNK = 1000
+
+
+def sort_value(field, value):
+    if value is None or value == "":
+        return None
+    if field == "priority":
+        return priority_rank(value)
+    if field == "timestamp":
+        return iso_timestamp(value)
+    if field == "amount":
+        return to_minor(value)
+    return filter_value(field, value)
+
+
+def sort_key(record, field):
+    # Ключ курсора: (значение пустое, значение, id). Пустые значения идут после
+    # непустых (по убыванию — перед ними),
+    # id делает ключ уникальным, поэтому страницы не теряют и не повторяют записи.
+    value = sort_value(field, field_value(record, field))
+    return (value is None, "" if value is None else value, field_value(record, "id"))
+
+
+# Курсор командной строки: поле и направление сортировки вместе с ключом
+# записи, иначе ключ одной сортировки сравнивался бы со значениями другой.
+# base64 нужен только таким курсорам, поэтому загружается при первом из них.
+def encode_cursor(field, descending, key):
+    import base64
+    data = [field, descending, list(key)]
+    return base64.urlsafe_b64encode(json.dumps(data, ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    import base64
+    import binascii
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(f"некорректный курсор {token!r}")
+    if (not isinstance(data, list) or len(data) != 3 or not isinstance(data[0], str)
+            or not isinstance(data[1], bool) or not valid_key(data[2])):
+        raise ValueError(f"некорректный курсор {token!r}")
+    return data[0], data[1], tuple(data[2])
+
+
+def valid_key(key):
+    return isinstance(key, (list, tuple)) and len(key) == 3 and isinstance(key[0], bool)
+
+
+def cursor_key(cursor, field, descending):
+    # Ключ из курсора, если он получен для той же сортировки.
+    if cursor is None:
+        return None
+    cursor_field, cursor_descending, key = cursor
+    if (cursor_field, cursor_descending) != (field, descending):
+        order = "по убыванию" if cursor_descending else "по возрастанию"
+        raise ValueError(f"некорректный курсор: он получен для сортировки {cursor_field} {order}")
+    return key
+
+
+class SortedIndex:
+    # Отсортированный список ключей (значение поля, id) для постраничного
+    # просмотра: страница — бинарный поиск курсора и срез, O(log n + размер страницы).
+    # Строится при первом обращении, дальше правится по изменениям репозитория.
+    def __init__(self, repository, field):
+        self.repository = repository
+        self.field = field
+        self.keys = None
+        self.pending = []
+        repository.subscribe(self.on_change)
+
+    def on_change(self, before, after):
+        if self.keys is None:
+            return
+        self.pending.append((
+            sort_key(before, self.field) if before is not None else None,
+            sort_key(after, self.field) if after is not None else None,
+        ))
+        if len(self.pending) > REBUILD_AFTER:
+            self.keys = None
+            self.pending = []
+
+    def current(self):
+        self.repository.sync()
+        if self.keys is None:
+            self.keys = sorted(sort_key(record, self.field) for record in self.repository.index().values())
+            self.pending = []
+        for before, after in self.pending:
+            if before is not None:
+                position = bisect_left(self.keys, before)
+                if position < len(self.keys) and self.keys[position] == before:
+                    del self.keys[position]
+            if after is not None:
+                insort(self.keys, after)
+        self.pending = []
+        return self.keys
+
+
+class Page:
+    def __init__(self, records, field, descending, position, total, size):
+        self.records = records
+        self.field = field
+        self.descending = descending
+        self.position = position
+        self.total = total
+        self.size = size
+
+    @property
+    def first(self):
+        return sort_key(self.records[0], self.field) if self.records else None
+
+    @property
+    def last(self):
+        return sort_key(self.records[-1], self.field) if self.records else None
+
+    @property
+    def has_prev(self):
+        return self.position > 0
+
+    @property
+    def has_next(self):
+        return self.position + len(self.records) < self.total
+
+    def to_dict(self):
+        return {
+            "records": [record.to_dict() for record in self.records],
+            "field": self.field,
+            "descending": self.descending,
+            "position": self.position,
+            "total": self.total,
+            "size": self.size,
+        }
+
+    @classmethod
+    def from_dict(cls, record_cls, data):
+        records = [record_cls.from_dict(record) for record in data["records"]]
+        return cls(records, data["field"], data["descending"], data["position"], data["total"], data["size"])
+
+    def describe(self):
+        order = "по убыванию" if self.descending else "по возрастанию"
+        if not self.records:
+            return f"Записей нет (всего {self.total}), сортировка: {self.field} {order}"
+        return (f"Записи {self.position + 1}–{self.position + len(self.records)} из {self.total}, "
+                f"сортировка: {self.field} {order}")
+
+
+def locate(search, keys, key):
+    # Значение ключа другого типа, чем у поля сортировки, — ошибка курсора, а не TypeError.
+    try:
+        return search(keys, tuple(key))
+    except TypeError:
+        raise ValueError(f"некорректный курсор {list(key)!r}: не подходит для этой сортировки")
+
+
+@timed("pages.fetch")
+def fetch_page(repository, field="id", descending=False, after=None, before=None, start_id=None, size=PAGE_SIZE):
+    # Страница по курсору: after — ключ последней показанной записи (следующая
+    # страница), before — ключ первой (предыдущая), start_id — страница с этой записи.
+    # Возвращает None, если записи start_id нет.
+    if repository.remote:
+        data = repository.call("page", field=field, descending=descending, after=after, before=before,
+                               start_id=start_id, size=size)
+        return Page.from_dict(repository.record_cls, data) if data is not None else None
+    if field not in repository.record_cls.SCHEMA:
+        raise ValueError(f"нельзя сортировать по полю {field}")
+    if size < 1:
+        raise ValueError("размер страницы должен быть больше нуля")
+    for key in (after, before):
+        if key is not None and not valid_key(key):
+            raise ValueError(f"некорректный курсор {key!r}")
+    keys = open_sorted_index(repository, field).current()
+    count = len(keys)
+    # По убыванию ключи читаются с конца: «следующая» страница лежит левее.
+    if start_id is not None:
+        record = repository.get(start_id)
+        if record is None:
+            return None
+        position = bisect_left(keys, sort_key(record, field))
+        low, high = (position + 1 - size, position + 1) if descending else (position, position + size)
+    elif after is not None:
+        if descending:
+            high = locate(bisect_left, keys, after)
+            low = high - size
+        else:
+            low = locate(bisect_right, keys, after)
+            high = low + size
+    elif before is not None:
+        # Первая страница всегда полная, даже если курсор ближе размера страницы к началу.
+        if descending:
+            low = locate(bisect_right, keys, before)
+            high = low + size
+            if high > count:
+                low, high = count - size, count
+        else:
+            high = locate(bisect_left, keys, before)
+            low = high - size
+            if low < 0:
+                low, high = 0, size
+    else:
+        low, high = (count - size, count) if descending else (0, size)
+    low, high = max(0, low), min(count, high)
+    chunk = keys[low:high]
+    if descending:
+        chunk.reverse()
+    records = [repository.get(key[2]) for key in chunk]
+    return Page(records, field, descending, count - high if descending else low, count, size)
+
+
+def write_lines(lines, file=None):
+    # Вывод пачками: одна запись в поток на OUTPUT_CHUNK строк вместо print на каждую.
+    file = file or sys.stdout
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= OUTPUT_CHUNK:
+            file.write("\n".join(chunk) + "\n")
+            chunk = []
+    if chunk:
+        file.write("\n".join(chunk) + "\n")
+
+
+def print_page(page):
+    write_lines([page.describe()] + [record.summary() for record in page.records])
+
+
+def parse_number(text):
+    if not text.strip().isdigit():
+        raise ValueError(f"ожидалось число, получено {text.strip()!r}")
+    return int(text)
+
+
+def browse(manager, empty_message):
+    repository = manager.repository()
+    field, descending, size = "id", False, PAGE_SIZE
+    page = fetch_page(repository, field, descending, size=size)
+    if not page.total:
+        print(empty_message)
+        return
+    print("Enter или > — следующая страница, < — предыдущая, #ID — страница с записи, "
+          "сорт поле (сорт -поле — по убыванию), размер N, в — выход")
+    while True:
+        print_page(page)
+        command = input("Страница: ").strip()
+        if command in ("в", "q"):
+            break
+        try:
+            if command in ("", ">"):
+                if page.has_next:
+                    page = fetch_page(repository, field, descending, after=page.last, size=size)
+                else:
+                    print("Это последняя страница.")
+            elif command == "<":
+                if page.has_prev:
+                    page = fetch_page(repository, field, descending, before=page.first, size=size)
+                else:
+                    print("Это первая страница.")
+            elif command.startswith("#"):
+                found = fetch_page(repository, field, descending, start_id=parse_number(command[1:]), size=size)
+                if found is None:
+                    print("Запись не найдена.")
+                else:
+                    page = found
+            elif command.startswith("сорт "):
+                name = command[5:].strip()
+                descending = name.startswith("-")
+                field = name.lstrip("-")
+                if field not in manager.SCHEMA:
+                    print(f"Нет такого поля. Доступные: {', '.join(manager.SCHEMA)}")
+                    field, descending = page.field, page.descending
+                    continue
+                page = fetch_page(repository, field, descending, size=size)
+            elif command.startswith("размер "):
+                size = parse_number(command[7:]) or PAGE_SIZE
+                start_id = page.records[0].id if page.records else None
+                page = fetch_page(repository, field, descending, start_id=start_id, size=size) or fetch_page(repository, field, descending, size=size)
+            else:
+                print("Некорректный ввод.")
+        except ValueError as error:
+            print(f"Ошибка: {error}")
+    print()
+
+
+_indexes = {}
+
+
+def open_sorted_index(repository, field):
+    key = (id(repository), field)
+    if key not in _indexes:
+        _indexes[key] = SortedIndex(repository, field)
+    return _indexes[key]
+
+
+def existing_sorted_index(repository, field):
+    # Индекс, уже построенный для постраничного просмотра, или None: сам он не строится.
+    return _indexes.get((id(repository), field))
@@ -1,13 +1,34 @@
-import json
-import csv
-from datetime import datetime
+from datetime import date, datetime, timedelta
+import os
+import re
 import sys
 
+from dates import DATE_FORMAT, TIMESTAMP_FORMAT, parse_date, parse_time, parse_timestamp
+from metrics import install, timed
+from money import DEFAULT_CURRENCY, format_amount, parse_amount, parse_currency, to_decimal, to_minor
+from repository import get_repository
+from storage import ConflictError, StorageError, parse_bool, parse_id
+
+def intern_text(value):
+    # Категории, приоритеты и даты повторяются в тысячах записей: храним одну копию строки.
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 class Note:
     NOTES_FILE = "notes.json"
+    SCHEMA = {
+        "id": ("int", None),
+        "title": ("str", ""),
+        "content": ("str", ""),
+        "timestamp": ("timestamp", None),
+    }
+    REQUIRED_FIELDS = ("title",)
 
-    def __init__(self, id=None, title=None, content=None, timestamp=None):
+    __slots__ = ("id", "title", "content", "timestamp", "version")
+
+    def __init__(self, id=None, title=None, content=None, timestamp=None, version=0):
         self.id = id
+        self.version = version
         self.title = title
         self.content = content
         self.timestamp = timestamp or datetime.now().strftime("%d-%m-%Y %H:%M:%S")
@@ -18,57 +39,86 @@ class Note:
             "title": self.title,
             "content": self.content,
             "timestamp": self.timestamp,
+            "version": self.version,
         }
 
     @staticmethod
     def from_dict(data):
         return Note(
-            id=data["id"],
+            id=parse_id(data["id"]),
             title=data["title"],
             content=data["content"],
-            timestamp=data["timestamp"]
+            timestamp=data["timestamp"],
+            version=data.get("version", 0)
         )
 
+    def summary(self):
+        return f"ID: {self.id}, Заголовок: {self.title}, Дата: {self.timestamp}"
+
+    @classmethod
+    def repository(cls):
+        from history import open_history
+        from text_index import open_text_index
+        repository = get_repository(cls, cls.NOTES_FILE)
+        if not repository.remote:
+            open_text_index(repository, cls.NOTES_FILE)
+            open_history(repository, cls.NOTES_FILE)
+        return repository
+
+    @classmethod
+    def search_index(cls):
+        from text_index import open_text_index
+        return open_text_index(cls.repository(), cls.NOTES_FILE)
+
     @classmethod
     def load_notes(cls):
-        try:
-            with open(cls.NOTES_FILE, "r") as file:
-                return [cls.from_dict(note) for note in json.load(file)]
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        return cls.repository().all()
 
     @classmethod
     def save_notes(cls, notes):
-        with open(cls.NOTES_FILE, "w") as file:
-            json.dump([note.to_dict() for note in notes], file, indent=4)
+        cls.repository().replace_all(notes)
+
+    @classmethod
+    def add(cls, title, content):
+        return cls.repository().add(cls(title=title, content=content))
+
+    @classmethod
+    def modify(cls, note_id, title=None, content=None, version=None):
+        note = cls.repository().get(note_id)
+        if note and version is not None and note.version != version:
+            raise ConflictError(f"Запись {note_id} изменена другим пользователем")
+        if note:
+            timestamp = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+            cls.repository().update(note, title=title or note.title, content=content or note.content, timestamp=timestamp)
+        return note
+
+    @classmethod
+    def remove(cls, note_id):
+        return cls.repository().delete(note_id)
+
+    @classmethod
+    def find(cls, query, limit=20):
+        repository = cls.repository()
+        if repository.remote:
+            return repository.search(query, limit)
+        return cls.search_index().search(query, limit)
 
     @classmethod
     def create(cls):
-        notes = cls.load_notes()
-        note_id = max((note.id for note in notes), default=0) + 1
         title = input("Введите заголовок заметки: ").strip()
         content = input("Введите содержимое заметки: ").strip()
-        note = cls(id=note_id, title=title, content=content)
-        notes.append(note)
-        cls.save_notes(notes)
+        cls.add(title, content)
         print("Заметка успешно создана!\n")
 
     @classmethod
     def view_all(cls):
-        notes = cls.load_notes()
-        if not notes:
-            print("Нет доступных заметок.\n")
-            return
-
-        for note in notes:
-            print(f"ID: {note.id}, Заголовок: {note.title}, Дата: {note.timestamp}")
-        print()
+        from pages import browse
+        browse(cls, "Нет доступных заметок.\n")
 
     @classmethod
     def view_detail(cls):
-        notes = cls.load_notes()
         note_id = int(input("Введите ID заметки для просмотра: ").strip())
-        note = next((note for note in notes if note.id == note_id), None)
+        note = cls.repository().get(note_id)
         if note:
             print(f"\nЗаголовок: {note.title}\nСодержимое: {note.content}\nДата: {note.timestamp}\n")
         else:
@@ -76,50 +126,58 @@ class Note:
 
     @classmethod
     def edit(cls):
-        notes = cls.load_notes()
         note_id = int(input("Введите ID заметки для редактирования: ").strip())
-        note = next((note for note in notes if note.id == note_id), None)
+        note = cls.repository().get(note_id)
         if note:
-            note.title = input(f"Введите новый заголовок (текущий: {note.title}): ").strip() or note.title
-            note.content = input(f"Введите новое содержимое (текущее: {note.content}): ").strip() or note.content
-            note.timestamp = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-            cls.save_notes(notes)
+            title = input(f"Введите новый заголовок (текущий: {note.title}): ").strip()
+            content = input(f"Введите новое содержимое (текущее: {note.content}): ").strip()
+            try:
+                cls.modify(note_id, title, content, version=note.version)
+            except ConflictError:
+                print("Заметку изменил другой пользователь, повторите редактирование.\n")
+                return
             print("Заметка успешно обновлена!\n")
         else:
             print("Заметка не найдена.\n")
 
     @classmethod
     def delete(cls):
-        notes = cls.load_notes()
         note_id = int(input("Введите ID заметки для удаления: ").strip())
-        notes = [note for note in notes if note.id != note_id]
-        cls.save_notes(notes)
-        print("Заметка успешно удалена!\n")
+        if cls.remove(note_id):
+            print("Заметка успешно удалена!\n")
+        else:
+            print("Заметка не найдена.\n")
+
+    @classmethod
+    def search(cls):
+        query = input("Введите поисковый запрос (* в конце слова — поиск по началу слова): ").strip()
+        results = cls.find(query)
+        if not results:
+            print("Заметки не найдены.\n")
+            return
+
+        for note, score in results:
+            print(f"{note.summary()}, Релевантность: {score:.2f}")
+        print()
 
     @classmethod
     def import_csv(cls):
+        from importer import import_csv
         file_name = input("Введите имя CSV-файла для импорта: ").strip()
         try:
-            with open(file_name, "r", newline="") as file:
-                reader = csv.DictReader(file)
-                notes = cls.load_notes()
-                for row in reader:
-                    notes.append(cls.from_dict(row))
-                cls.save_notes(notes)
-                print("Заметки успешно импортированы!\n")
+            report = import_csv(cls.repository(), cls.SCHEMA, cls.REQUIRED_FIELDS, file_name)
         except FileNotFoundError:
             print("Файл не найден.\n")
+            return
+        report.print_summary()
+        print("Заметки успешно импортированы!\n")
 
     @classmethod
     def export_csv(cls):
-        file_name = input("Введите имя CSV-файла для экспорта: ").strip()
-        notes = cls.load_notes()
-        with open(file_name, "w", newline="") as file:
-            writer = csv.DictWriter(file, fieldnames=["id", "title", "content", "timestamp"])
-            writer.writeheader()
-            for note in notes:
-                writer.writerow(note.to_dict())
-        print("Заметки успешно экспортированы!\n")
+        from exporter import export_records
+        file_name = input("Введите имя файла для экспорта (.csv или .jsonl, можно с .gz): ").strip()
+        count = export_records(cls.repository(), file_name, cls.SCHEMA)
+        print(f"Заметки успешно экспортированы! Записей: {count}\n")
 
     @classmethod
     def manage(cls):
@@ -130,9 +188,10 @@ class Note:
             print("3. Просмотреть подробности заметки")
             print("4. Редактировать заметку")
             print("5. Удалить заметку")
-            print("6. Импорт заметок из CSV")
-            print("7. Экспорт заметок в CSV")
-            print("8. Назад")
+            print("6. Поиск заметок")
+            print("7. Импорт заметок из CSV")
+            print("8. Экспорт заметок в CSV/JSONL")
+            print("9. Назад")
 
             choice = input("Выберите действие: ").strip()
 
@@ -147,24 +206,43 @@ class Note:
             elif choice == "5":
                 cls.delete()
             elif choice == "6":
-                cls.import_csv()
+                cls.search()
             elif choice == "7":
-                cls.export_csv()
+                cls.import_csv()
             elif choice == "8":
+                cls.export_csv()
+            elif choice == "9":
                 break
             else:
-                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 8.")
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 9.")
 
 class TasksManager:
     TASKS_FILE = "tasks.json"
-
-    def __init__(self, id=None, title=None, description=None, done=False, priority="Средний", due_date=None):
+    SCHEMA = {
+        "id": ("int", None),
+        "title": ("str", ""),
+        "description": ("str", ""),
+        "done": ("bool", False),
+        "priority": ("str", "Средний"),
+        "due_date": ("date", None),
+        "recurrence": ("str", None),
+        "remind_at": ("str", None),
+    }
+    REQUIRED_FIELDS = ("title",)
+
+    __slots__ = ("id", "title", "description", "done", "priority", "due_date", "recurrence", "remind_at", "version")
+
+    def __init__(self, id=None, title=None, description=None, done=False, priority="Средний", due_date=None,
+                 recurrence=None, remind_at=None, version=0):
         self.id = id
+        self.version = version
         self.title = title
         self.description = description
         self.done = done
-        self.priority = priority
-        self.due_date = due_date
+        self.priority = intern_text(priority)
+        self.due_date = intern_text(due_date)
+        self.recurrence = intern_text(recurrence)
+        self.remind_at = intern_text(remind_at)
 
     def to_dict(self):
         return {
@@ -174,116 +252,235 @@ class TasksManager:
             "done": self.done,
             "priority": self.priority,
             "due_date": self.due_date,
+            "recurrence": self.recurrence,
+            "remind_at": self.remind_at,
+            "version": self.version,
         }
 
     @staticmethod
     def from_dict(data):
         return TasksManager(
-            id=data["id"],
+            id=parse_id(data["id"]),
             title=data["title"],
             description=data["description"],
-            done=data["done"],
+            done=parse_bool(data["done"]),
             priority=data["priority"],
-            due_date=data["due_date"]
+            due_date=data["due_date"],
+            recurrence=data.get("recurrence"),
+            remind_at=data.get("remind_at"),
+            version=data.get("version", 0)
         )
 
+    def summary(self):
+        status = "Выполнено" if self.done else "Не выполнено"
+        text = f"ID: {self.id}, Заголовок: {self.title}, Статус: {status}, Приоритет: {self.priority}, Срок: {self.due_date}"
+        if self.recurrence:
+            text += f", Повтор: {self.recurrence}"
+        if self.remind_at:
+            text += f", Напоминание: {self.remind_at}"
+        return text
+
+    @classmethod
+    def repository(cls):
+        from agenda import open_agenda
+        from history import open_history
+        from reminders import open_reminders
+        repository = get_repository(cls, cls.TASKS_FILE)
+        if not repository.remote:
+            open_agenda(repository)
+            open_reminders(repository)
+            open_history(repository, cls.TASKS_FILE)
+        return repository
+
     @classmethod
     def load_tasks(cls):
-        try:
-            with open(cls.TASKS_FILE, "r") as file:
-                return [cls.from_dict(task) for task in json.load(file)]
-        except (FileNotFoundError):
-            return []
+        return cls.repository().all()
 
     @classmethod
     def save_tasks(cls, tasks):
-        with open(cls.TASKS_FILE, "w") as file:
-            json.dump([task.to_dict() for task in tasks], file, indent=4)
+        cls.repository().replace_all(tasks)
+
+    @staticmethod
+    def check_schedule(recurrence=None, remind_at=None):
+        from recurrence import parse_rule
+        if recurrence:
+            parse_rule(recurrence)
+        if remind_at and parse_time(remind_at) is None:
+            raise ValueError(f"некорректное время напоминания {remind_at!r}, используйте формат ЧЧ:ММ")
+
+    @classmethod
+    def add(cls, title, description="", priority="Средний", due_date=None, recurrence=None, remind_at=None):
+        from recurrence import next_due_date
+        cls.check_schedule(recurrence, remind_at)
+        if recurrence and not parse_date(due_date):
+            # Без срока повторяющаяся задача начинается с ближайшего вхождения.
+            due_date = next_due_date(recurrence, date.today() - timedelta(days=1)).strftime(DATE_FORMAT)
+        task = cls(title=title, description=description, priority=priority, due_date=due_date,
+                   recurrence=recurrence or None, remind_at=remind_at or None)
+        return cls.repository().add(task)
+
+    @classmethod
+    def modify(cls, task_id, version=None, **changes):
+        cls.check_schedule(changes.get("recurrence"), changes.get("remind_at"))
+        task = cls.repository().get(task_id)
+        if task and version is not None and task.version != version:
+            raise ConflictError(f"Запись {task_id} изменена другим пользователем")
+        if task:
+            cls.repository().update(task, **{field: value for field, value in changes.items() if value})
+        return task
+
+    @classmethod
+    def complete(cls, task_id, today=None):
+        from recurrence import next_due_date
+        # Повторяющаяся задача не закрывается, а переносится на следующее
+        # вхождение после текущего срока (но не раньше завтрашнего дня).
+        task = cls.repository().get(task_id)
+        if task and task.recurrence and not task.done:
+            due_date = parse_date(task.due_date)
+            after = max(due_date, today or date.today()) if due_date else today or date.today()
+            try:
+                next_date = next_due_date(task.recurrence, after, due_date)
+            except ValueError:
+                next_date = None
+            if next_date is not None:
+                return cls.modify(task_id, task.version, due_date=next_date.strftime(DATE_FORMAT))
+        return cls.modify(task_id, done=True)
+
+    @classmethod
+    def remove(cls, task_id):
+        return cls.repository().delete(task_id)
+
+    @classmethod
+    @timed("tasks.agenda")
+    def agenda(cls, view="next", limit=10, today=None):
+        from agenda import open_agenda
+        repository = cls.repository()
+        if repository.remote:
+            return [cls.from_dict(data) for data in repository.call("agenda", view=view, limit=limit, today=today)]
+        agenda = open_agenda(repository)
+        if view == "next":
+            return agenda.next(limit)
+        return {"overdue": agenda.overdue, "today": agenda.today, "week": agenda.week}[view](parse_date(today))
+
+    @classmethod
+    @timed("tasks.reminders")
+    def reminders(cls, limit=10):
+        from reminders import open_reminders
+        repository = cls.repository()
+        if repository.remote:
+            return [(datetime.fromisoformat(moment), cls.from_dict(data)) for moment, data in repository.call("reminders", limit=limit)]
+        repository.sync()
+        return open_reminders(repository).upcoming(limit)
 
     @classmethod
     def create(cls):
-        tasks = cls.load_tasks()
-        task_id = max((task.id for task in tasks), default=0) + 1
+        from recurrence import RULE_HELP
         title = input("Введите заголовок задачи: ").strip()
         description = input("Введите описание задачи: ").strip()
         priority = input("Введите приоритет задачи (Высокий/Средний/Низкий): ").strip()
         due_date = input("Введите срок выполнения (ДД-ММ-ГГГГ): ").strip()
-        task = cls(id=task_id, title=title, description=description, priority=priority, due_date=due_date)
-        tasks.append(task)
-        cls.save_tasks(tasks)
+        recurrence = input(f"Повтор ({RULE_HELP}; пусто — без повтора): ").strip()
+        remind_at = input("Время напоминания (ЧЧ:ММ, пусто — без напоминания): ").strip()
+        try:
+            cls.add(title, description, priority, due_date, recurrence, remind_at)
+        except ValueError as error:
+            print(f"Задача не создана: {error}")
+            return
         print("Задача успешно создана!")
 
     @classmethod
     def view_all(cls):
-        tasks = cls.load_tasks()
-        if not tasks:
-            print("Нет доступных задач.")
-            return
+        from pages import browse
+        browse(cls, "Нет доступных задач.")
 
-        for task in tasks:
-            status = "Выполнено" if task.done else "Не выполнено"
-            print(f"ID: {task.id}, Заголовок: {task.title}, Статус: {status}, Приоритет: {task.priority}, Срок: {task.due_date}")
+    @classmethod
+    def view_agenda(cls):
+        sections = [
+            ("Просроченные", "overdue"),
+            ("На сегодня", "today"),
+            ("На ближайшую неделю", "week"),
+            ("Следующие по сроку и приоритету", "next"),
+        ]
+        for title, view in sections:
+            tasks = cls.agenda(view)
+            print(f"{title}:")
+            for task in tasks:
+                print(f"  {task.summary()}")
+            if not tasks:
+                print("  нет задач")
+        print()
+
+    @classmethod
+    def view_reminders(cls):
+        from reminders import format_reminder
+        reminders = cls.reminders()
+        if not reminders:
+            print("Нет запланированных напоминаний.")
+        for moment, task in reminders:
+            print(format_reminder(moment, task))
         print()
 
     @classmethod
     def mark_done(cls):
-        tasks = cls.load_tasks()
         task_id = int(input("Введите ID задачи для отметки как выполненной: ").strip())
-        task = next((task for task in tasks if task.id == task_id), None)
-        if task:
-            task.done = True
-            cls.save_tasks(tasks)
+        if cls.complete(task_id):
             print("Задача отмечена выполненной!")
         else:
             print("Задача не найдена.")
 
     @classmethod
     def edit(cls):
-        tasks = cls.load_tasks()
         task_id = int(input("Введите ID задачи для редактирования: ").strip())
-        task = next((task for task in tasks if task.id == task_id), None)
+        task = cls.repository().get(task_id)
         if task:
-            task.title = input(f"Введите новый заголовок (текущий: {task.title}): ").strip() or task.title
-            task.description = input(f"Введите новое описание (текущее: {task.description}): ").strip() or task.description
-            task.priority = input(f"Введите новый приоритет (текущий: {task.priority}): ").strip() or task.priority
-            task.due_date = input(f"Введите новый срок выполнения (текущий: {task.due_date}): ").strip() or task.due_date
-            cls.save_tasks(tasks)
+            title = input(f"Введите новый заголовок (текущий: {task.title}): ").strip()
+            description = input(f"Введите новое описание (текущее: {task.description}): ").strip()
+            priority = input(f"Введите новый приоритет (текущий: {task.priority}): ").strip()
+            due_date = input(f"Введите новый срок выполнения (текущий: {task.due_date}): ").strip()
+            recurrence = input(f"Введите новое правило повтора (текущее: {task.recurrence}): ").strip()
+            remind_at = input(f"Введите новое время напоминания (текущее: {task.remind_at}): ").strip()
+            try:
+                cls.modify(task_id, task.version, title=title, description=description, priority=priority,
+                           due_date=due_date, recurrence=recurrence, remind_at=remind_at)
+            except ConflictError:
+                print("Задачу изменил другой пользователь, повторите редактирование.")
+                return
+            except ValueError as error:
+                print(f"Задача не обновлена: {error}")
+                return
             print("Задача успешно обновлена!")
         else:
             print("Задача не найдена.")
 
     @classmethod
     def delete(cls):
-        tasks = cls.load_tasks()
         task_id = int(input("Введите ID задачи для удаления: ").strip())
-        tasks = [task for task in tasks if task.id != task_id]
-        cls.save_tasks(tasks)
-        print("Задача успешно удалена!")
+        if cls.remove(task_id):
+            print("Задача успешно удалена!")
+        else:
+            print("Задача не найдена.")
 
     @classmethod
     def import_csv(cls):
+        from importer import import_csv
         file_name = input("Введите имя CSV-файла для импорта: ").strip()
         try:
-            with open(file_name, "r", newline="") as file:
-                reader = csv.DictReader(file)
-                tasks = cls.load_tasks()
-                for row in reader:
-                    tasks.append(cls.from_dict(row))
-                cls.save_tasks(tasks)
-                print("Задачи успешно импортированы!")
+            report = import_csv(cls.repository(), cls.SCHEMA, cls.REQUIRED_FIELDS, file_name)
         except FileNotFoundError:
             print("Файл не найден.")
+            return
+        report.print_summary()
+        print("Задачи успешно импортированы!")
 
     @classmethod
     def export_csv(cls):
-        file_name = input("Введите имя CSV-файла для экспорта: ").strip()
-        tasks = cls.load_tasks()
-        with open(file_name, "w", newline="") as file:
-            writer = csv.DictWriter(file, fieldnames=["id", "title", "description", "done", "priority", "due_date"])
-            writer.writeheader()
-            for task in tasks:
-                writer.writerow(task.to_dict())
-        print("Задачи успешно экспортированы!")
+        from exporter import export_records
+        file_name = input("Введите имя файла для экспорта (.csv или .jsonl, можно с .gz): ").strip()
+        filters = []
+        if input("Экспортировать только невыполненные задачи? (да/нет): ").strip().lower() in ("да", "д", "yes", "y"):
+            filters.append(("done", "=", False))
+        count = export_records(cls.repository(), file_name, cls.SCHEMA, filters)
+        print(f"Задачи успешно экспортированы! Записей: {count}")
 
     @classmethod
     def manage(cls):
@@ -295,8 +492,10 @@ class TasksManager:
             print("4. Редактировать задачу")
             print("5. Удалить задачу")
             print("6. Импорт задач из CSV")
-            print("7. Экспорт задач в CSV")
-            print("8. Назад")
+            print("7. Экспорт задач в CSV/JSONL")
+            print("8. Повестка: просроченные, сегодня, неделя")
+            print("9. Ближайшие напоминания")
+            print("10. Назад")
 
             choice = input("Выберите действие: ").strip()
 
@@ -315,16 +514,30 @@ class TasksManager:
             elif choice == "7":
                 cls.export_csv()
             elif choice == "8":
+                cls.view_agenda()
+            elif choice == "9":
+                cls.view_reminders()
+            elif choice == "10":
                 break
             else:
-                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 8.")
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 10.")
         print()
 
 class ContactsManager:
     CONTACTS_FILE = "contacts.json"
+    SCHEMA = {
+        "id": ("int", None),
+        "name": ("str", ""),
+        "phone": ("str", ""),
+        "email": ("str", ""),
+    }
+    REQUIRED_FIELDS = ("name",)
+
+    __slots__ = ("id", "name", "phone", "email", "version")
 
-    def __init__(self, id=None, name=None, phone=None, email=None):
+    def __init__(self, id=None, name=None, phone=None, email=None, version=0):
         self.id = id
+        self.version = version
         self.name = name
         self.phone = phone
         self.email = email
@@ -335,111 +548,144 @@ class ContactsManager:
             "name": self.name,
             "phone": self.phone,
             "email": self.email,
+            "version": self.version,
         }
 
     @staticmethod
     def from_dict(data):
         return ContactsManager(
-            id=data["id"],
+            id=parse_id(data["id"]),
             name=data["name"],
             phone=data["phone"],
-            email=data["email"]
+            email=data["email"],
+            version=data.get("version", 0)
         )
 
+    def summary(self):
+        return f"ID: {self.id}, Имя: {self.name}, Телефон: {self.phone}, Email: {self.email}"
+
+    @classmethod
+    def repository(cls):
+        from contact_index import open_contact_index
+        from history import open_history
+        repository = get_repository(cls, cls.CONTACTS_FILE)
+        if not repository.remote:
+            open_contact_index(repository)
+            open_history(repository, cls.CONTACTS_FILE)
+        return repository
+
+    @classmethod
+    def search_index(cls):
+        from contact_index import open_contact_index
+        return open_contact_index(cls.repository())
+
     @classmethod
     def load_contacts(cls):
-        try:
-            with open(cls.CONTACTS_FILE, "r") as file:
-                return [cls.from_dict(contact) for contact in json.load(file)]
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        return cls.repository().all()
 
     @classmethod
     def save_contacts(cls, contacts):
-        with open(cls.CONTACTS_FILE, "w") as file:
-            json.dump([contact.to_dict() for contact in contacts], file, indent=4)
+        cls.repository().replace_all(contacts)
+
+    @classmethod
+    def add(cls, name, phone="", email=""):
+        return cls.repository().add(cls(name=name, phone=phone, email=email))
+
+    @classmethod
+    def modify(cls, contact_id, version=None, **changes):
+        contact = cls.repository().get(contact_id)
+        if contact and version is not None and contact.version != version:
+            raise ConflictError(f"Запись {contact_id} изменена другим пользователем")
+        if contact:
+            cls.repository().update(contact, **{field: value for field, value in changes.items() if value})
+        return contact
+
+    @classmethod
+    def remove(cls, contact_id):
+        return cls.repository().delete(contact_id)
+
+    @classmethod
+    def find(cls, search_term, limit=50):
+        repository = cls.repository()
+        if repository.remote:
+            return [contact for contact, _ in repository.search(search_term, limit)]
+        return cls.search_index().search(search_term, limit)
 
     @classmethod
     def create(cls):
-        contacts = cls.load_contacts()
-        contact_id = max((contact.id for contact in contacts), default=0) + 1
         name = input("Введите имя контакта: ").strip()
         phone = input("Введите номер телефона: ").strip()
         email = input("Введите адрес электронной почты: ").strip()
-        contact = cls(id=contact_id, name=name, phone=phone, email=email)
-        contacts.append(contact)
-        cls.save_contacts(contacts)
+        cls.add(name, phone, email)
         print("Контакт успешно создан!")
 
     @classmethod
     def view_all(cls):
-        contacts = cls.load_contacts()
-        if not contacts:
-            print("Нет доступных контактов.")
-            return
-
-        for contact in contacts:
-            print(f"ID: {contact.id}, Имя: {contact.name}, Телефон: {contact.phone}, Email: {contact.email}")
-        print()
+        from pages import browse
+        browse(cls, "Нет доступных контактов.")
 
     @classmethod
     def search(cls):
-        contacts = cls.load_contacts()
-        search_term = input("Введите имя или номер телефона: ").strip().lower()
-        results = [contact for contact in contacts if search_term in contact.name.lower() or search_term in contact.phone]
+        search_term = input("Введите имя, номер телефона или email (@домен — поиск по домену): ").strip()
+        results = cls.find(search_term)
 
         if results:
             for contact in results:
-                print(f"ID: {contact.id}, Имя: {contact.name}, Телефон: {contact.phone}, Email: {contact.email}")
+                print(contact.summary())
         else:
             print("Контакты не найдены.")
 
     @classmethod
     def edit(cls):
-        contacts = cls.load_contacts()
         contact_id = int(input("Введите ID контакта для редактирования: ").strip())
-        contact = next((contact for contact in contacts if contact.id == contact_id), None)
+        contact = cls.repository().get(contact_id)
         if contact:
-            contact.name = input(f"Введите новое имя (текущее: {contact.name}): ").strip() or contact.name
-            contact.phone = input(f"Введите новый номер телефона (текущий: {contact.phone}): ").strip() or contact.phone
-            contact.email = input(f"Введите новый email (текущий: {contact.email}): ").strip() or contact.email
-            cls.save_contacts(contacts)
+            name = input(f"Введите новое имя (текущее: {contact.name}): ").strip()
+            phone = input(f"Введите новый номер телефона (текущий: {contact.phone}): ").strip()
+            email = input(f"Введите новый email (текущий: {contact.email}): ").strip()
+            try:
+                cls.modify(contact_id, contact.version, name=name, phone=phone, email=email)
+            except ConflictError:
+                print("Контакт изменил другой пользователь, повторите редактирование.")
+                return
             print("Контакт успешно обновлён!")
         else:
             print("Контакт не найден.")
 
     @classmethod
     def delete(cls):
-        contacts = cls.load_contacts()
         contact_id = int(input("Введите ID контакта для удаления: ").strip())
-        contacts = [contact for contact in contacts if contact.id != contact_id]
-        cls.save_contacts(contacts)
-        print("Контакт успешно удалён!")
+        if cls.remove(contact_id):
+            print("Контакт успешно удалён!")
+        else:
+            print("Контакт не найден.")
 
     @classmethod
     def import_csv(cls):
+        from dedup import import_filter
+        from importer import import_csv
         file_name = input("Введите имя CSV-файла для импорта: ").strip()
         try:
-            with open(file_name, "r", newline="") as file:
-                reader = csv.DictReader(file)
-                contacts = cls.load_contacts()
-                for row in reader:
-                    contacts.append(cls.from_dict(row))
-                cls.save_contacts(contacts)
-                print("Контакты успешно импортированы!")
+            report = import_csv(cls.repository(), cls.SCHEMA, cls.REQUIRED_FIELDS, file_name,
+                                import_filter(cls.repository(), cls.CONTACTS_FILE))
         except FileNotFoundError:
             print("Файл не найден.")
+            return
+        report.print_summary()
+        print("Контакты успешно импортированы!")
 
     @classmethod
     def export_csv(cls):
-        file_name = input("Введите имя CSV-файла для экспорта: ").strip()
-        contacts = cls.load_contacts()
-        with open(file_name, "w", newline="") as file:
-            writer = csv.DictWriter(file, fieldnames=["id", "name", "phone", "email"])
-            writer.writeheader()
-            for contact in contacts:
-                writer.writerow(contact.to_dict())
-        print("Контакты успешно экспортированы!")
+        from exporter import export_records
+        file_name = input("Введите имя файла для экспорта (.csv или .jsonl, можно с .gz): ").strip()
+        count = export_records(cls.repository(), file_name, cls.SCHEMA)
+        print(f"Контакты успешно экспортированы! Записей: {count}")
+
+    @classmethod
+    def merge_duplicates(cls):
+        from dedup import manage_duplicates
+        fuzzy = input("Искать и похожие имена? (да/нет): ").strip().lower() in ("да", "д", "yes", "y")
+        manage_duplicates(cls, cls.CONTACTS_FILE, fuzzy)
 
     @classmethod
     def manage(cls):
@@ -451,8 +697,9 @@ class ContactsManager:
             print("4. Редактировать контакт")
             print("5. Удалить контакт")
             print("6. Импорт контактов из CSV")
-            print("7. Экспорт контактов в CSV")
-            print("8. Назад")
+            print("7. Экспорт контактов в CSV/JSONL")
+            print("8. Найти и объединить дубликаты")
+            print("9. Назад")
 
             choice = input("Выберите действие: ").strip()
 
@@ -471,128 +718,285 @@ class ContactsManager:
             elif choice == "7":
                 cls.export_csv()
             elif choice == "8":
+                cls.merge_duplicates()
+            elif choice == "9":
                 break
             else:
-                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 8.")
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 9.")
         print()
 
 class FinancesManager:
     FINANCES_FILE = "finance.json"
-
-    def __init__(self, id=None, amount=None, category=None, date=None, description=None):
+    SCHEMA = {
+        "id": ("int", None),
+        "amount": ("money", None),
+        "currency": ("currency", DEFAULT_CURRENCY),
+        "category": ("str", ""),
+        "date": ("date", None),
+        "description": ("str", ""),
+    }
+    REQUIRED_FIELDS = ("amount", "date")
+
+    __slots__ = ("id", "amount", "currency", "category", "date", "description", "version")
+
+    # amount — целое число копеек; записи прежнего формата с суммой в рублях
+    # переводятся при чтении.
+    def __init__(self, id=None, amount=None, category=None, date=None, description=None, currency=DEFAULT_CURRENCY, version=0):
         self.id = id
-        self.amount = amount
-        self.category = category
-        self.date = date
+        self.version = version
+        self.amount = to_minor(amount)
+        self.currency = intern_text(currency)
+        self.category = intern_text(category)
+        self.date = intern_text(date)
         self.description = description
 
     def to_dict(self):
         return {
             "id": self.id,
             "amount": self.amount,
+            "currency": self.currency,
             "category": self.category,
             "date": self.date,
             "description": self.description,
+            "version": self.version,
         }
 
     @staticmethod
     def from_dict(data):
         return FinancesManager(
-            id=data["id"],
+            id=parse_id(data["id"]),
             amount=data["amount"],
             category=data["category"],
             date=data["date"],
-            description=data["description"]
+            description=data["description"],
+            currency=data.get("currency") or DEFAULT_CURRENCY,
+            version=data.get("version", 0)
         )
 
+    def summary(self):
+        return f"ID: {self.id}, Сумма: {format_amount(self.amount)} {self.currency}, Категория: {self.category}, Дата: {self.date}, Описание: {self.description}"
+
+    @classmethod
+    def repository(cls):
+        from history import open_history
+        from rollups import open_rollups
+        repository = get_repository(cls, cls.FINANCES_FILE)
+        if not repository.remote:
+            open_rollups(repository, cls.FINANCES_FILE)
+            open_history(repository, cls.FINANCES_FILE)
+        return repository
+
+    @classmethod
+    def rollups(cls):
+        from rollups import open_rollups
+        return open_rollups(cls.repository(), cls.FINANCES_FILE)
+
     @classmethod
     def load_finances(cls):
-        try:
-            with open(cls.FINANCES_FILE, "r") as file:
-                return [cls.from_dict(record) for record in json.load(file)]
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        return cls.repository().all()
 
     @classmethod
     def save_finances(cls, finances):
-        with open(cls.FINANCES_FILE, "w") as file:
-            json.dump([record.to_dict() for record in finances], file, indent=4)
+        cls.repository().replace_all(finances)
+
+    @classmethod
+    def add(cls, amount, category, date, description="", currency=DEFAULT_CURRENCY):
+        from rates import open_rates
+        # Сумма на входе — в рублях (строка, Decimal или число), внутри — копейки.
+        record = cls(amount=parse_amount(amount), category=category, date=date, description=description,
+                     currency=parse_currency(currency))
+        day = parse_date(date)
+        rates = open_rates()
+        if day is not None and rates.rate(record.currency, day.toordinal()) is None:
+            raise ValueError(f"нет курса {record.currency} к {rates.base} на {date}, добавьте его в таблицу курсов")
+        return cls.repository().add(record)
+
+    @classmethod
+    def remove(cls, record_id):
+        return cls.repository().delete(record_id)
+
+    @classmethod
+    def filters(cls, category=None, start_date=None, end_date=None):
+        filters = []
+        if category:
+            filters.append(("category", "=", category))
+        if start_date:
+            filters.append(("date", ">=", start_date))
+        if end_date:
+            filters.append(("date", "<=", end_date))
+        return filters
+
+    @classmethod
+    @timed("finances.report")
+    def report(cls, start_date, end_date):
+        repository = cls.repository()
+        if repository.remote:
+            from decimal import Decimal
+            return tuple(Decimal(value) for value in repository.call("report", start_date=start_date, end_date=end_date))
+        total_income, total_expense = cls.rollups().totals(start_date, end_date)
+        return to_decimal(total_income), to_decimal(total_expense), to_decimal(total_income + total_expense)
+
+    @classmethod
+    def conversion(cls):
+        # Базовая валюта отчётов и число операций, для которых нет курса.
+        repository = cls.repository()
+        if repository.remote:
+            return tuple(repository.call("conversion"))
+        rollups = cls.rollups()
+        rollups.ensure_loaded()
+        return rollups.rates.base, len(rollups.unconverted)
+
+    @classmethod
+    def print_conversion(cls):
+        currency, unconverted = cls.conversion()
+        print(f"Суммы указаны в {currency}.")
+        if unconverted:
+            print(f"Внимание: не учтены операции без курса на дату: {unconverted}.")
 
     @classmethod
     def create(cls):
-        finances = cls.load_finances()
-        finance_id = max((record.id for record in finances), default=0) + 1
-        amount = float(input("Введите сумму операции (положительная для дохода, отрицательная для расхода): ").strip())
+        amount = input("Введите сумму операции (положительная для дохода, отрицательная для расхода): ").strip()
+        currency = input(f"Введите валюту (пусто — {DEFAULT_CURRENCY}): ").strip()
         category = input("Введите категорию операции: ").strip()
         date = input("Введите дату операции (ДД-ММ-ГГГГ): ").strip()
         description = input("Введите описание операции: ").strip()
-        record = cls(id=finance_id, amount=amount, category=category, date=date, description=description)
-        finances.append(record)
-        cls.save_finances(finances)
+        try:
+            cls.add(amount, category, date, description, currency)
+        except ValueError as error:
+            print(f"Ошибка: {error}")
+            return
         print("Финансовая запись успешно создана!")
 
     @classmethod
     def view_all(cls):
-        finances = cls.load_finances()
-        if not finances:
-            print("Нет доступных финансовых записей.")
-            return
-
-        for record in finances:
-            print(f"ID: {record.id}, Сумма: {record.amount}, Категория: {record.category}, Дата: {record.date}, Описание: {record.description}")
-        print()
+        from pages import browse
+        browse(cls, "Нет доступных финансовых записей.")
 
     @classmethod
     def filter_by_category(cls):
-        finances = cls.load_finances()
-        category = input("Введите категорию для фильтрации: ").strip().lower()
-        filtered = [record for record in finances if record.category.lower() == category]
+        category = input("Введите категорию для фильтрации: ").strip()
+        filtered = cls.repository().find(cls.filters(category=category))
         if filtered:
             for record in filtered:
-                print(f"ID: {record.id}, Сумма: {record.amount}, Категория: {record.category}, Дата: {record.date}, Описание: {record.description}")
+                print(record.summary())
         else:
             print("Записи с указанной категорией не найдены.")
 
     @classmethod
     def generate_report(cls):
-        finances = cls.load_finances()
         start_date = input("Введите начальную дату (ДД-ММ-ГГГГ): ").strip()
         end_date = input("Введите конечную дату (ДД-ММ-ГГГГ): ").strip()
-        filtered = [record for record in finances if start_date <= record.date <= end_date]
+        if parse_date(start_date) is None or parse_date(end_date) is None:
+            print("Некорректная дата. Используйте формат ДД-ММ-ГГГГ.")
+            return
 
-        total_income = sum(record.amount for record in filtered if record.amount > 0)
-        total_expense = sum(record.amount for record in filtered if record.amount < 0)
-        balance = total_income + total_expense
+        total_income, total_expense, balance = cls.report(start_date, end_date)
 
         print(f"Отчёт с {start_date} по {end_date}:")
         print(f"Общий доход: {total_income}")
         print(f"Общие расходы: {total_expense}")
         print(f"Баланс: {balance}")
+        cls.print_conversion()
+
+    @classmethod
+    def analytics(cls):
+        from analytics import finance_columns
+        return finance_columns(cls.repository())
+
+    @classmethod
+    def analytics_menu(cls):
+        while True:
+            print("Аналитика финансов:")
+            print("1. Сводка по месяцам")
+            print("2. Сводка по неделям")
+            print("3. Сводка по категориям")
+            print("4. Топ категорий расходов")
+            print("5. Нарастающий баланс")
+            print("6. Скользящая сумма за период")
+            print("7. Назад")
+
+            choice = input("Выберите действие: ").strip()
+
+            if choice == "7":
+                break
+            if choice not in ["1", "2", "3", "4", "5", "6"]:
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 7.")
+                continue
+
+            start_date = input("Введите начальную дату (ДД-ММ-ГГГГ, пусто — с начала): ").strip()
+            end_date = input("Введите конечную дату (ДД-ММ-ГГГГ, пусто — до конца): ").strip()
+            if (start_date and parse_date(start_date) is None) or (end_date and parse_date(end_date) is None):
+                print("Некорректная дата. Используйте формат ДД-ММ-ГГГГ.")
+                continue
+
+            if choice in ["1", "2", "3"]:
+                # Сводки за целые месяцы берутся из готовых итогов, остальные считаются по журналу.
+                rows = None
+                if choice != "2" and not cls.repository().remote:
+                    rows = {"1": cls.rollups().by_month, "3": cls.rollups().by_category}[choice](start_date, end_date)
+                if rows is None:
+                    columns = cls.analytics()
+                    rows = {"1": columns.by_month, "2": columns.by_week, "3": columns.by_category}[choice](start_date, end_date)
+                for label, income, expense, balance in rows:
+                    print(f"{label}: доход {format_amount(income)}, расходы {format_amount(expense)}, баланс {format_amount(balance)}")
+            elif choice == "4":
+                try:
+                    count = int(input("Сколько категорий показать: ").strip())
+                except ValueError:
+                    print("Ошибка: ввод должен быть числом.")
+                    continue
+                for category, income, expense, balance in cls.analytics().top_categories(count, start_date, end_date):
+                    print(f"{category}: расходы {format_amount(expense)}")
+            elif choice == "5":
+                for day, balance in cls.analytics().running_balance(start_date, end_date):
+                    print(f"{day}: баланс {format_amount(balance)}")
+            elif choice == "6":
+                try:
+                    window = int(input("Размер окна в днях: ").strip())
+                except ValueError:
+                    print("Ошибка: ввод должен быть числом.")
+                    continue
+                if window < 1:
+                    print("Размер окна должен быть положительным.")
+                    continue
+                for day, total in cls.analytics().rolling(window, start_date, end_date):
+                    print(f"{day}: сумма за {window} дн. {format_amount(total)}")
+            cls.print_conversion()
+            print()
 
     @classmethod
     def import_csv(cls):
+        from dedup import import_filter
+        from importer import import_csv
         file_name = input("Введите имя CSV-файла для импорта: ").strip()
         try:
-            with open(file_name, "r", newline="") as file:
-                reader = csv.DictReader(file)
-                finances = cls.load_finances()
-                for row in reader:
-                    finances.append(cls.from_dict(row))
-                cls.save_finances(finances)
-                print("Финансовые записи успешно импортированы!")
+            report = import_csv(cls.repository(), cls.SCHEMA, cls.REQUIRED_FIELDS, file_name,
+                                import_filter(cls.repository(), cls.FINANCES_FILE))
         except FileNotFoundError:
             print("Файл не найден.")
+            return
+        report.print_summary()
+        print("Финансовые записи успешно импортированы!")
 
     @classmethod
     def export_csv(cls):
-        file_name = input("Введите имя CSV-файла для экспорта: ").strip()
-        finances = cls.load_finances()
-        with open(file_name, "w", newline="") as file:
-            writer = csv.DictWriter(file, fieldnames=["id", "amount", "category", "date", "description"])
-            writer.writeheader()
-            for record in finances:
-                writer.writerow(record.to_dict())
-        print("Финансовые записи успешно экспортированы!")
+        from exporter import export_records
+        file_name = input("Введите имя файла для экспорта (.csv или .jsonl, можно с .gz): ").strip()
+        category = input("Категория (пусто — все): ").strip()
+        start_date = input("Начальная дата (ДД-ММ-ГГГГ, пусто — с начала): ").strip()
+        end_date = input("Конечная дата (ДД-ММ-ГГГГ, пусто — до конца): ").strip()
+        if (start_date and parse_date(start_date) is None) or (end_date and parse_date(end_date) is None):
+            print("Некорректная дата. Используйте формат ДД-ММ-ГГГГ.")
+            return
+
+        filters = cls.filters(category, start_date, end_date)
+        count = export_records(cls.repository(), file_name, cls.SCHEMA, filters)
+        print(f"Финансовые записи успешно экспортированы! Записей: {count}")
+
+    @classmethod
+    def merge_duplicates(cls):
+        from dedup import manage_duplicates
+        manage_duplicates(cls, cls.FINANCES_FILE)
 
     @classmethod
     def manage(cls):
@@ -602,9 +1006,11 @@ class FinancesManager:
             print("2. Просмотреть все записи")
             print("3. Фильтрация записей по категории")
             print("4. Генерация отчёта за период")
-            print("5. Импорт финансовых записей из CSV")
-            print("6. Экспорт финансовых записей в CSV")
-            print("7. Назад")
+            print("5. Аналитика")
+            print("6. Импорт финансовых записей из CSV")
+            print("7. Экспорт финансовых записей в CSV/JSONL")
+            print("8. Найти и объединить дубликаты")
+            print("9. Назад")
 
             choice = input("Выберите действие: ").strip()
 
@@ -617,16 +1023,401 @@ class FinancesManager:
             elif choice == "4":
                 cls.generate_report()
             elif choice == "5":
-                cls.import_csv()
+                cls.analytics_menu()
             elif choice == "6":
-                cls.export_csv()
+                cls.import_csv()
             elif choice == "7":
+                cls.export_csv()
+            elif choice == "8":
+                cls.merge_duplicates()
+            elif choice == "9":
                 break
             else:
-                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 7.")
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 9.")
+        print()
+
+class HistoryManager:
+    SECTIONS = {
+        "notes": (Note, Note.NOTES_FILE),
+        "tasks": (TasksManager, TasksManager.TASKS_FILE),
+        "contacts": (ContactsManager, ContactsManager.CONTACTS_FILE),
+        "finances": (FinancesManager, FinancesManager.FINANCES_FILE),
+    }
+    SECTION_NAMES = {"notes": "заметки", "tasks": "задачи", "contacts": "контакты", "finances": "финансы"}
+    KINDS = {"do": "изменение", "undo": "отмена", "redo": "повтор"}
+
+    @classmethod
+    def histories(cls):
+        from history import open_history
+        return {section: open_history(manager.repository(), file_name) for section, (manager, file_name) in cls.SECTIONS.items()}
+
+    @classmethod
+    def client(cls):
+        repository = Note.repository()
+        return repository.client if repository.remote else None
+
+    @classmethod
+    def entries(cls, limit=20):
+        client = cls.client()
+        if client is not None:
+            return [tuple(item) for item in client.call(None, "history", limit=limit)]
+        entries = [(section, entry) for section, history in cls.histories().items() for entry in history.entries(limit)]
+        return sorted(entries, key=lambda item: item[1]["time"])[-limit:]
+
+    @classmethod
+    def revert(cls, kind):
+        # Отменяется (повторяется) самое позднее действие среди всех наборов данных.
+        client = cls.client()
+        if client is not None:
+            result = client.call(None, kind)
+            return tuple(result) if result is not None else None
+        candidates, last_action = [], ""
+        for section, history in cls.histories().items():
+            entry, action = history.latest(kind)
+            last_action = max(last_action, action or "")
+            if entry is not None:
+                candidates.append((entry, section, history))
+        if kind == "redo":
+            # Новое действие в любом наборе данных закрывает повтор отменённого до него.
+            candidates = [item for item in candidates if item[0]["time"] > last_action]
+        if not candidates:
+            return None
+        _, section, history = max(candidates, key=lambda item: item[0]["time"])
+        entry = history.revert(kind)
+        return (section, entry) if entry is not None else None
+
+    @classmethod
+    def undo(cls):
+        return cls.revert("undo")
+
+    @classmethod
+    def redo(cls):
+        return cls.revert("redo")
+
+    @classmethod
+    def as_of(cls, section, moment):
+        manager, file_name = cls.SECTIONS[section]
+        repository = manager.repository()
+        if repository.remote:
+            records, started = repository.call("as_of", moment=moment.isoformat())
+            return [manager.from_dict(data) for data in records], datetime.fromisoformat(started) if started else None
+        from history import open_history
+        return open_history(repository, file_name).state_at(moment)
+
+    @classmethod
+    def describe(cls, section, entry):
+        moment = datetime.fromisoformat(entry["time"]).strftime(TIMESTAMP_FORMAT)
+        changes = []
+        for record_id, before, after in entry["changes"]:
+            action = "добавлена" if before is None else "удалена" if after is None else "изменена"
+            changes.append(f"{record_id} {action}")
+        return f"{moment} [{cls.SECTION_NAMES[section]}] {cls.KINDS[entry['kind']]}: " + ", ".join(changes)
+
+    @classmethod
+    def view_entries(cls):
+        entries = cls.entries()
+        if not entries:
+            print("История изменений пуста.\n")
+            return
+        for section, entry in reversed(entries):
+            print(cls.describe(section, entry))
+        print()
+
+    @classmethod
+    def undo_last(cls):
+        try:
+            result = cls.undo()
+        except ConflictError as error:
+            print(f"Не удалось отменить: {error}\n")
+            return
+        if result is None:
+            print("Нечего отменять.\n")
+            return
+        print(f"Отменено: {cls.describe(*result)}\n")
+
+    @classmethod
+    def redo_last(cls):
+        try:
+            result = cls.redo()
+        except ConflictError as error:
+            print(f"Не удалось повторить: {error}\n")
+            return
+        if result is None:
+            print("Нечего повторять.\n")
+            return
+        print(f"Повторено: {cls.describe(*result)}\n")
+
+    @classmethod
+    def view_as_of(cls):
+        print("Наборы данных: " + ", ".join(f"{index}. {name}" for index, name in enumerate(cls.SECTION_NAMES.values(), start=1)))
+        choice = input("Выберите набор данных: ").strip()
+        sections = list(cls.SECTIONS)
+        if not choice.isdigit() or not 1 <= int(choice) <= len(sections):
+            print("Некорректный ввод.\n")
+            return
+        moment = parse_timestamp(input("Введите момент времени (ДД-ММ-ГГГГ ЧЧ:ММ:СС): "))
+        if moment is None:
+            print("Некорректный формат. Используйте ДД-ММ-ГГГГ ЧЧ:ММ:СС.\n")
+            return
+        records, started = cls.as_of(sections[int(choice) - 1], moment)
+        if started is None or moment < started:
+            print("Внимание: история начинается позже, показано самое раннее известное состояние.")
+        if not records:
+            print("На этот момент записей не было.\n")
+            return
+        for record in records:
+            print(record.summary())
+        print()
+
+    @classmethod
+    def manage(cls):
+        while True:
+            print("\nИстория изменений:")
+            print("1. Последние изменения")
+            print("2. Отменить последнее действие")
+            print("3. Повторить отменённое действие")
+            print("4. Данные на момент времени")
+            print("5. Назад")
+
+            choice = input("Выберите действие: ").strip()
+
+            if choice == "1":
+                cls.view_entries()
+            elif choice == "2":
+                cls.undo_last()
+            elif choice == "3":
+                cls.redo_last()
+            elif choice == "4":
+                cls.view_as_of()
+            elif choice == "5":
+                break
+            else:
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 5.")
+
+class SearchManager:
+    # Один запрос сразу по всем наборам данных, разбор и план — в query.py.
+    @classmethod
+    def sources(cls):
+        return {section: manager for section, (manager, _) in HistoryManager.SECTIONS.items()}
+
+    @classmethod
+    def query(cls, text, limit=20, today=None):
+        from query import QueryResult, run_query
+        client = HistoryManager.client()
+        sources = cls.sources()
+        if client is not None:
+            results = client.call(None, "query", text=text, limit=limit, today=today.isoformat() if today else None)
+            return [QueryResult.from_dict(sources[data["dataset"]], data) for data in results]
+        return run_query(sources, text, limit, today)
+
+    @classmethod
+    def describe(cls, results):
+        lines = []
+        for result in results:
+            if not result.total:
+                continue
+            shown = f", показано {len(result.records)}" if len(result.records) < result.total else ""
+            lines.append(f"[{HistoryManager.SECTION_NAMES[result.dataset]}] найдено {result.total}{shown}:")
+            lines.extend(f"  {record.summary()}" for record in result.records)
+        return lines
+
+    @classmethod
+    def manage(cls):
+        from query import QUERY_HELP
+        print(f"\nПоиск по всем данным: {QUERY_HELP}")
+        while True:
+            text = input("Запрос (пустая строка — назад): ").strip()
+            if not text:
+                print()
+                break
+            try:
+                results = cls.query(text)
+            except ValueError as error:
+                print(f"Ошибка: {error}")
+                continue
+            for line in cls.describe(results) or ["Ничего не найдено."]:
+                print(line)
+
+class StatsManager:
+    # Замеры и профилирование текущего сеанса, при работе через сервер — сервера.
+    @classmethod
+    def snapshot(cls, reset=False):
+        import metrics
+        client = HistoryManager.client()
+        if client is not None:
+            return client.call(None, "stats", reset=reset)
+        data = metrics.snapshot()
+        if reset:
+            metrics.reset()
+        return data
+
+    @classmethod
+    def profile(cls, action, prefix=None):
+        import metrics
+        client = HistoryManager.client()
+        if client is not None:
+            return client.call(None, "profile", action=action, prefix=os.path.abspath(prefix) if prefix else None)
+        if action == "start":
+            metrics.start_profiling()
+            return None
+        return metrics.stop_profiling(prefix)
+
+    @classmethod
+    def view(cls):
+        import metrics
+        for line in metrics.describe(cls.snapshot()):
+            print(line)
         print()
 
+    @classmethod
+    def save(cls):
+        import metrics
+        file_name = input("Введите имя файла для JSON: ").strip()
+        if not file_name:
+            print("Имя файла не указано.\n")
+            return
+        metrics.dump(file_name, cls.snapshot())
+        print(f"Статистика сохранена в {file_name}\n")
+
+    @classmethod
+    def toggle_profiling(cls):
+        try:
+            if not cls.snapshot()["profiling"]:
+                cls.profile("start")
+                print("Профилирование запущено (cProfile и tracemalloc).\n")
+                return
+            prefix = input("Префикс файлов профиля (по умолчанию profile): ").strip() or "profile"
+            files = cls.profile("stop", prefix)
+        except ValueError as error:
+            print(f"Ошибка: {error}\n")
+            return
+        print("Профиль сохранён: " + ", ".join(files) + "\n")
+
+    @classmethod
+    def manage(cls):
+        while True:
+            print("\nСтатистика работы:")
+            print("1. Показать замеры")
+            print("2. Сохранить замеры в JSON")
+            print("3. Сбросить замеры")
+            print("4. Начать или остановить профилирование")
+            print("5. Назад")
+
+            choice = input("Выберите действие: ").strip()
+
+            if choice == "1":
+                cls.view()
+            elif choice == "2":
+                cls.save()
+            elif choice == "3":
+                cls.snapshot(reset=True)
+                print("Замеры сброшены.\n")
+            elif choice == "4":
+                cls.toggle_profiling()
+            elif choice == "5":
+                break
+            else:
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 5.")
+
 class Calculator:
+    # Итоги финансов, доступные в выражениях; считаются, только если встречаются в выражении.
+    FINANCE_VARIABLES = {
+        "доход": ("all", 0), "расход": ("all", 1), "баланс": ("all", 2),
+        "доход_месяц": ("month", 0), "расход_месяц": ("month", 1), "баланс_месяц": ("month", 2),
+    }
+    ASSIGNMENT = re.compile(r"^\s*([^\W\d]\w*)\s*=(.*)$")
+    variables = {}
+
+    @staticmethod
+    def finance_variables(names):
+        today = date.today()
+        ranges = {"all": (None, None), "month": (today.replace(day=1).strftime(DATE_FORMAT), today.strftime(DATE_FORMAT))}
+        totals = {}
+        values = {}
+        for name in names:
+            if name not in Calculator.FINANCE_VARIABLES:
+                continue
+            period, index = Calculator.FINANCE_VARIABLES[name]
+            if period not in totals:
+                totals[period] = FinancesManager.report(*ranges[period])
+            values[name] = float(totals[period][index])
+        return values
+
+    @staticmethod
+    def evaluate(text, variables=None):
+        from expressions import compile_expression
+        # Выражение компилируется один раз и берётся из кэша по тексту.
+        expression = compile_expression(text)
+        return expression.evaluate(Calculator.values_for(expression, variables))
+
+    @staticmethod
+    def evaluate_line(line):
+        # "имя = выражение" сохраняет результат в переменную сессии, ans — последний результат.
+        match = Calculator.ASSIGNMENT.match(line)
+        name, text = (match.group(1), match.group(2)) if match and not match.group(2).startswith("=") else (None, line)
+        if name in Calculator.FINANCE_VARIABLES or name == "ans":
+            raise ValueError(f"имя {name} зарезервировано")
+        result = Calculator.evaluate(text)
+        Calculator.variables["ans"] = result
+        if name is not None:
+            Calculator.variables[name] = result
+        return name, result
+
+    @staticmethod
+    def values_for(expression, variables=None):
+        values = Calculator.finance_variables(expression.variables)
+        values.update(Calculator.variables)
+        values.update(variables or {})
+        return values
+
+    @staticmethod
+    def evaluate_column(text, values, name="x", variables=None):
+        from expressions import compile_expression, evaluate_column
+        return evaluate_column(text, values, name, Calculator.values_for(compile_expression(text), variables))
+
+    @staticmethod
+    def evaluate_file(text, file_name, output_name, column="result", variables=None):
+        from expressions import compile_expression, evaluate_csv
+        expression = compile_expression(text)
+        return evaluate_csv(text, file_name, output_name, column, Calculator.values_for(expression, variables))
+
+    @staticmethod
+    def expression_help():
+        from expressions import FUNCTIONS_HELP
+        print(f"Операции: + - * / // % ^, скобки. Функции: {FUNCTIONS_HELP}.")
+        print(f"Переменные финансов: {', '.join(Calculator.FINANCE_VARIABLES)}; ans — последний результат; имя = выражение — сохранить.")
+
+    @staticmethod
+    def expression_mode():
+        from expressions import format_number
+        Calculator.expression_help()
+        while True:
+            line = input("Выражение (пустая строка — выход): ").strip()
+            if not line:
+                break
+            try:
+                name, result = Calculator.evaluate_line(line)
+            except ValueError as e:
+                print(f"Ошибка: {e}")
+                continue
+            print(f"{name} = {format_number(result)}" if name else f"Результат: {format_number(result)}")
+        print()
+
+    @staticmethod
+    def file_mode():
+        text = input("Введите выражение (столбцы CSV — переменные): ").strip()
+        file_name = input("Введите имя CSV-файла: ").strip()
+        output_name = input("Введите имя файла для результата: ").strip()
+        try:
+            rows, failed = Calculator.evaluate_file(text, file_name, output_name)
+        except FileNotFoundError:
+            print("Файл не найден.\n")
+            return
+        except ValueError as e:
+            print(f"Ошибка: {e}\n")
+            return
+        print(f"Вычислено строк: {rows}, без результата: {failed}. Результат в столбце result файла {output_name}\n")
+
     @staticmethod
     def add(a, b):
         return a + b
@@ -653,7 +1444,9 @@ class Calculator:
             print("2. Вычитание")
             print("3. Умножение")
             print("4. Деление")
-            print("5. Назад")
+            print("5. Вычислить выражение")
+            print("6. Вычислить выражение для CSV-файла")
+            print("7. Назад")
 
             choice = input("Выберите действие: ").strip()
 
@@ -678,9 +1471,13 @@ class Calculator:
                     print("Ошибка: ввод должен быть числом.")
 
             elif choice == "5":
+                Calculator.expression_mode()
+            elif choice == "6":
+                Calculator.file_mode()
+            elif choice == "7":
                 break
             else:
-                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 5.")
+                print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 7.")
         print()
 
 def main_menu():
@@ -692,7 +1489,10 @@ def main_menu():
         print("3. Управление контактами")
         print("4. Управление финансовыми записями")
         print("5. Калькулятор")
-        print("6. Выход")
+        print("6. История изменений")
+        print("7. Поиск по всем данным")
+        print("8. Статистика работы")
+        print("9. Выход")
 
         choice = input("Введите номер действия: ").strip()
 
@@ -707,9 +1507,23 @@ def main_menu():
         elif choice == "5":
             Calculator().manage_calculator()
         elif choice == "6":
+            HistoryManager.manage()
+        elif choice == "7":
+            SearchManager.manage()
+        elif choice == "8":
+            StatsManager.manage()
+        elif choice == "9":
             print("Спасибо за использование Персонального помощника!")
             sys.exit()
         else:
-            print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 6.")
+            print("Некорректный ввод. Пожалуйста, выберите действие от 1 до 9.")
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    install()
+    if len(sys.argv) > 1:
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+    try:
+        main_menu()
+    except StorageError as error:
+        print(f"Ошибка хранилища: {error}")
+        sys.exit(1)
\ No newline at end of file
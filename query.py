@@ -0,0 +1,328 @@
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from dates import DATE_FORMAT, iso_date, iso_timestamp
+from metrics import timed
+from money import to_minor
+from storage import OPERATORS, field_value, filter_value, parse_bool, priority_rank
+from text_index import tokenize
+
+DEFAULT_LIMIT = 20
+QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+# Порядок важен: двухсимвольные операторы проверяются раньше односимвольных.
+PREDICATE = re.compile(r"^([^\W\d]\w*)(>=|<=|:|=|<|>|~)(.*)$")
+DATASET_NAMES = {
+    "notes": "notes", "заметки": "notes",
+    "tasks": "tasks", "задачи": "tasks",
+    "contacts": "contacts", "контакты": "contacts",
+    "finances": "finances", "финансы": "finances",
+}
+# Общее поле «дата» в каждом наборе данных; у контактов даты нет.
+DATE_FIELDS = {"notes": "timestamp", "tasks": "due_date", "finances": "date"}
+DATE_ALIASES = ("дата", "date")
+# Где ищутся слова запроса.
+TEXT_FIELDS = {
+    "notes": ("title", "content"),
+    "tasks": ("title", "description"),
+    "contacts": ("name",),
+    "finances": ("category", "description"),
+}
+PERIOD_UNITS = {"д": 1, "d": 1, "н": 7, "w": 7, "м": 30, "m": 30, "г": 365, "y": 365}
+# Поля, по которым отбор можно передать в SQL: значение колонки совпадает с filter_value.
+PUSHDOWN_KINDS = ("int", "date", "bool", "str", "currency", "money")
+QUERY_HELP = (
+    "слова — поиск по началу слов; поле:значение, поле>=значение, поле<значение, поле~подстрока; "
+    "поле:от..до — диапазон; дата:01-05-2025..31-05-2025 или за:30д (д, н, м, г) — по дате записи; "
+    "в:заметки,задачи — только эти наборы"
+)
+
+
+class Query:
+    def __init__(self, terms, conditions, datasets):
+        self.terms = terms
+        self.conditions = conditions
+        self.datasets = datasets
+
+
+def parse_period(value, today):
+    match = re.fullmatch(r"(\d+)\s*([^\W\d_])", value.strip().casefold())
+    if match is None or match.group(2) not in PERIOD_UNITS:
+        raise ValueError(f"некорректный период {value!r}, например за:30д, за:2н, за:3м")
+    return today - timedelta(days=int(match.group(1)) * PERIOD_UNITS[match.group(2)])
+
+
+def parse_query(text, today=None):
+    # Разбор строки запроса. Условия (поле, оператор, текст значения) переводятся
+    # в значения полей отдельно для каждого набора данных.
+    today = today or date.today()
+    terms, conditions, datasets = [], [], None
+    for quoted, word in QUERY_TOKEN.findall(text):
+        if quoted:
+            terms.extend(tokenize(quoted))
+            continue
+        match = PREDICATE.match(word)
+        if match is None:
+            terms.extend(tokenize(word))
+            continue
+        field, op, value = match.groups()
+        field = field.casefold()
+        if field in ("в", "in"):
+            names = [name.strip().casefold() for name in value.split(",") if name.strip()]
+            unknown = [name for name in names if name not in DATASET_NAMES]
+            if unknown or not names:
+                raise ValueError(f"неизвестный набор данных: {', '.join(unknown) or value!r}")
+            datasets = sorted({DATASET_NAMES[name] for name in names}, key=list(TEXT_FIELDS).index)
+            continue
+        if field in ("за", "last"):
+            conditions.append(("date", ">=", parse_period(value, today).strftime(DATE_FORMAT)))
+            conditions.append(("date", "<=", today.strftime(DATE_FORMAT)))
+            continue
+        if field in DATE_ALIASES:
+            field = "date"
+        if not value:
+            raise ValueError(f"пустое значение в условии {word!r}")
+        if op in (":", "=") and ".." in value:
+            low, _, high = value.partition("..")
+            if low:
+                conditions.append((field, ">=", low))
+            if high:
+                conditions.append((field, "<=", high))
+            continue
+        conditions.append((field, "=" if op == ":" else op, value))
+    return Query(terms, conditions, datasets or list(TEXT_FIELDS))
+
+
+def record_value(kind, field, value):
+    # Значение поля для сравнения: то же, что filter_value, но с учётом типа из SCHEMA.
+    if value is None or value == "":
+        return None
+    if field == "priority":
+        return priority_rank(value)
+    if kind == "money":
+        return to_minor(value)
+    if kind == "timestamp":
+        moment = iso_timestamp(value)
+        return moment[:10] if moment else None
+    if kind == "int":
+        return value if isinstance(value, int) else None
+    return filter_value(field, value)
+
+
+def query_value(kind, field, text):
+    # Значение из запроса -> значение того же вида, что record_value, или None.
+    if field == "priority":
+        rank = priority_rank(text)
+        return rank if rank != priority_rank(None) else None
+    if kind == "money":
+        return to_minor(text)
+    if kind == "date":
+        return iso_date(text)
+    if kind == "timestamp":
+        return iso_date(text) or (iso_timestamp(text) or "")[:10] or None
+    if kind == "int":
+        return int(text) if text.lstrip("-").isdigit() else None
+    if kind == "bool":
+        return parse_bool(text)
+    return filter_value(field, text)
+
+
+class Predicate:
+    # Условия запроса, переведённые в значения полей одного набора данных.
+    def __init__(self, dataset, schema, query):
+        self.dataset = dataset
+        self.schema = schema
+        self.terms = query.terms
+        self.text_fields = TEXT_FIELDS[dataset]
+        self.conditions = []
+        self.missing = None
+        for name, op, text in query.conditions:
+            field = DATE_FIELDS.get(dataset) if name == "date" else name
+            if field not in schema:
+                self.missing = name
+                return
+            kind = schema[field][0]
+            value = filter_value(field, text) if op == "~" else query_value(kind, field, text)
+            if value is None:
+                raise ValueError(f"некорректное значение {text!r} для поля {DATE_ALIASES[0] if name == 'date' else name}")
+            self.conditions.append((field, kind, op, value, text))
+
+    def matches(self, record):
+        for field, kind, op, value, _ in self.conditions:
+            actual = record_value(kind, field, field_value(record, field))
+            if actual is None:
+                return False
+            if op == "~":
+                if value not in str(actual):
+                    return False
+            elif not OPERATORS[op](actual, value):
+                return False
+        if self.terms:
+            words = set()
+            for field in self.text_fields:
+                words.update(tokenize(field_value(record, field)))
+            for term in self.terms:
+                if not any(word.startswith(term) for word in words):
+                    return False
+        return True
+
+
+class Plan:
+    def __init__(self, kind, description, candidates=None, filters=()):
+        self.kind = kind
+        self.description = description
+        self.candidates = candidates
+        self.filters = filters
+
+
+class QueryResult:
+    def __init__(self, dataset, plan, records, total):
+        self.dataset = dataset
+        self.plan = plan
+        self.records = records
+        self.total = total
+
+    def to_dict(self):
+        return {
+            "dataset": self.dataset,
+            "plan": self.plan,
+            "records": [record.to_dict() for record in self.records],
+            "total": self.total,
+        }
+
+    @classmethod
+    def from_dict(cls, record_cls, data):
+        return cls(data["dataset"], data["plan"], [record_cls.from_dict(record) for record in data["records"]], data["total"])
+
+
+def text_candidates(repository, dataset, terms):
+    # id записей, в которых есть слова с началом из каждого слова запроса, по
+    # готовому индексу или None, если индекса нет. Индекс не строится ради
+    # одного запроса: это дороже, чем просмотр.
+    if dataset == "notes":
+        from text_index import open_text_index
+        index = open_text_index(repository, repository.record_cls.NOTES_FILE)
+        if index.postings is None and not index.load():
+            return None
+        lookup = lambda term: (doc_id for key in index.expand(term + "*") for doc_id in index.postings[key])
+    elif dataset == "contacts":
+        from contact_index import open_contact_index
+        index = open_contact_index(repository)
+        if not index.loaded:
+            return None
+        lookup = lambda term: (contact_id for key in index.token_keys.with_prefix(term) for contact_id in index.tokens[key])
+    else:
+        return None
+    candidates = None
+    for term in terms:
+        ids = set(lookup(term))
+        candidates = ids if candidates is None else candidates & ids
+        if not candidates:
+            break
+    return candidates
+
+
+def range_candidates(index, op, value):
+    # Срез отсортированного индекса (пустое?, значение, id) по одному условию.
+    keys = index.current()
+    low, high = 0, len(keys)
+    lowest, highest = (False, value), (False, value, float("inf"))
+    if op in ("=", ">="):
+        low = bisect_left(keys, lowest)
+    elif op == ">":
+        low = bisect_right(keys, highest)
+    if op in ("=", "<="):
+        high = bisect_right(keys, highest)
+    elif op == "<":
+        high = bisect_left(keys, lowest)
+    # Пустые значения лежат в конце и под условие не подходят.
+    high = min(high, bisect_left(keys, (True,)))
+    return {key[2] for key in keys[low:high]}
+
+
+def pushdown_filters(columns, conditions):
+    # Условия для SQL в виде фильтров хранилища: там значение снова проходит
+    # через filter_value, поэтому даты передаются исходным текстом.
+    filters = []
+    for field, kind, op, value, text in conditions:
+        if op == "~":
+            continue
+        if field == "priority" and "priority_rank" in columns:
+            filters.append(("priority_rank", op, value))
+        elif field in columns and kind in PUSHDOWN_KINDS and field != "priority":
+            filters.append((field, op, text if kind == "date" else value))
+    return filters
+
+
+def plan_query(repository, predicate):
+    # Выбор способа: готовый индекс с самым узким отбором, иначе SQL для
+    # условий по колонкам, иначе просмотр записей в памяти или потоком из файла.
+    from pages import existing_sorted_index
+    if predicate.missing:
+        return Plan("skip", f"пропущено: нет поля {predicate.missing}", candidates=set())
+    options = []
+    if predicate.terms:
+        candidates = text_candidates(repository, predicate.dataset, predicate.terms)
+        if candidates is not None:
+            options.append(Plan("text_index", "текстовый индекс", candidates))
+    for field, kind, op, value, _ in predicate.conditions:
+        index = existing_sorted_index(repository, field)
+        if op == "~" or kind == "timestamp" or index is None or index.keys is None:
+            continue
+        options.append(Plan("sorted_index", f"индекс по полю {field}", range_candidates(index, op, value)))
+    if options:
+        return min(options, key=lambda plan: len(plan.candidates))
+    if repository.storage.queryable and repository.pending is None:
+        filters = pushdown_filters(repository.storage.column_names, predicate.conditions)
+        if filters:
+            return Plan("sql", "SQL: " + ", ".join(f"{field} {op} {value}" for field, op, value in filters), filters=filters)
+    if repository.records is not None:
+        return Plan("memory", "просмотр записей в памяти")
+    return Plan("scan", "потоковое чтение хранилища")
+
+
+def execute(repository, predicate, plan, limit):
+    if plan.kind == "skip":
+        return QueryResult(predicate.dataset, plan.description, [], 0)
+    record_cls = repository.record_cls
+    if plan.candidates is not None:
+        records = (repository.get(record_id) for record_id in sorted(plan.candidates))
+        found = [record for record in records if record is not None and predicate.matches(record)]
+    elif plan.kind == "sql":
+        found = [record for record in repository.find(plan.filters) if predicate.matches(record)]
+    elif plan.kind == "memory":
+        repository.sync()
+        found = [record for record in repository.index().values() if predicate.matches(record)]
+    else:
+        # Из файла разбираются только подошедшие записи.
+        found = [record_cls.from_dict(data) for data in repository.iter_records() if predicate.matches(data)]
+    found.sort(key=lambda record: record.id)
+    return QueryResult(predicate.dataset, plan.description, found[:limit], len(found))
+
+
+def run_subquery(repository, predicate, limit):
+    return execute(repository, predicate, plan_query(repository, predicate), limit)
+
+
+@timed("query.run")
+def run_query(sources, text, limit=DEFAULT_LIMIT, today=None):
+    # sources — набор данных -> менеджер. Подзапросы к наборам идут
+    # параллельно: каждый поток работает только со своим хранилищем.
+    query = parse_query(text, today)
+    if not query.terms and not query.conditions:
+        raise ValueError("пустой запрос")
+    known = {field for manager in sources.values() for field in manager.SCHEMA} | {"date"}
+    unknown = sorted({field for field, _, _ in query.conditions} - known)
+    if unknown:
+        raise ValueError(f"неизвестное поле: {', '.join(unknown)}")
+    jobs = []
+    for dataset in query.datasets:
+        repository = sources[dataset].repository()
+        jobs.append((repository, Predicate(dataset, repository.record_cls.SCHEMA, query)))
+    # Запросу к одному набору пул потоков не нужен, и concurrent.futures не загружается.
+    if len(jobs) == 1:
+        return [run_subquery(*jobs[0], limit)]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [pool.submit(run_subquery, repository, predicate, limit) for repository, predicate in jobs]
+        return [future.result() for future in futures]
@@ -0,0 +1,133 @@
+import bisect
+import csv
+import os
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from dates import parse_date
+from importer import to_date
+from lazy import optional_module
+from money import DEFAULT_CURRENCY, parse_currency
+from storage import StorageError, file_stamp
+
+numpy = optional_module("numpy")
+
+RATES_ENV = "PA_RATES"
+DEFAULT_RATES = "rates.csv"
+BASE_CURRENCY_ENV = "PA_BASE_CURRENCY"
+# Курсы хранятся целыми числами с шестью знаками после запятой.
+RATE_SCALE = 10 ** 6
+
+
+def scale_rate(text):
+    try:
+        rate = Decimal(str(text).strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"некорректный курс {text!r}")
+    if not rate.is_finite() or rate <= 0:
+        raise ValueError(f"некорректный курс {text!r}")
+    return int(rate * RATE_SCALE)
+
+
+def convert_minor(amount, rate):
+    # Округление половины от нуля, как у Decimal ROUND_HALF_UP.
+    converted = (abs(amount) * rate + RATE_SCALE // 2) // RATE_SCALE
+    return converted if amount >= 0 else -converted
+
+
+class RateTable:
+    # Курсы валют к базовой по датам: для каждой валюты отсортированные дни
+    # и курсы. Курс на дату — последний известный не позже неё (bisect),
+    # результаты поиска кэшируются по паре (валюта, день).
+    def __init__(self, base, rates=None):
+        self.base = base
+        self.rates = rates or {}
+        self.fingerprint = [base, None]
+        self.rate = lru_cache(maxsize=65536)(self.find_rate)
+
+    @classmethod
+    def from_csv(cls, file_name, base):
+        # Формат: date,currency,rate — сколько единиц базовой валюты стоит одна единица валюты.
+        points = {}
+        with open(file_name, "r", newline="", encoding="utf-8") as file:
+            for line_number, row in enumerate(csv.DictReader(file), start=2):
+                try:
+                    day = parse_date(to_date(row.get("date") or ""))
+                    points.setdefault(parse_currency(row.get("currency")), {})[day.toordinal()] = scale_rate(row.get("rate"))
+                except ValueError as error:
+                    raise StorageError(f"{file_name}, строка {line_number}: {error}")
+        rates = {}
+        for currency, by_day in points.items():
+            days = sorted(by_day)
+            rates[currency] = (days, [by_day[day] for day in days])
+        return cls(base, rates)
+
+    def find_rate(self, currency, day):
+        if currency == self.base:
+            return RATE_SCALE
+        table = self.rates.get(currency)
+        if table is None:
+            return None
+        days, values = table
+        index = bisect.bisect_right(days, day) - 1
+        return values[index] if index >= 0 else None
+
+    def convert(self, amount, currency, day):
+        rate = self.rate(currency or self.base, day)
+        return convert_minor(amount, rate) if rate is not None else None
+
+    def convert_rows(self, amounts, currencies, days, currency_names):
+        converted, found = [], []
+        for amount, currency, day in zip(amounts, currencies, days):
+            rate = self.rate(currency_names[currency], day)
+            converted.append(convert_minor(amount, rate) if rate is not None else 0)
+            found.append(rate is not None)
+        return converted, found
+
+    def convert_many(self, amounts, currencies, days, currency_names):
+        # Пакетный перевод столбцов в базовую валюту. Курс ищется один раз на
+        # уникальную пару (валюта, день), дальше — векторные операции.
+        # Возвращает суммы и маску строк, для которых курс нашёлся.
+        if numpy is None or not len(amounts):
+            return self.convert_rows(amounts, currencies, days, currency_names)
+        amounts = numpy.asarray(amounts, dtype=numpy.int64)
+        keys = numpy.asarray(currencies, dtype=numpy.int64) << 32 | numpy.asarray(days, dtype=numpy.int64)
+        unique, inverse = numpy.unique(keys, return_inverse=True)
+        rates = [self.rate(currency_names[key >> 32], key & 0xFFFFFFFF) for key in unique.tolist()]
+        # Произведение суммы на курс должно уложиться в int64, иначе считаем без numpy.
+        if int(numpy.abs(amounts).max()) * max(rate or 0 for rate in rates) >= 2 ** 62:
+            return self.convert_rows(amounts.tolist(), currencies, days, currency_names)
+        found = numpy.array([rate is not None for rate in rates], dtype=bool)[inverse]
+        rates = numpy.array([rate or 0 for rate in rates], dtype=numpy.int64)[inverse]
+        converted = (numpy.abs(amounts) * rates + RATE_SCALE // 2) // RATE_SCALE
+        return numpy.where(amounts < 0, -converted, converted), found
+
+    def describe(self):
+        rows = []
+        for currency, (days, values) in sorted(self.rates.items()):
+            rows.append((currency, days[0], days[-1], len(days), Decimal(values[-1]) / RATE_SCALE))
+        return rows
+
+
+def rates_file_name():
+    return os.environ.get(RATES_ENV, DEFAULT_RATES)
+
+
+def base_currency():
+    return parse_currency(os.environ.get(BASE_CURRENCY_ENV, DEFAULT_CURRENCY))
+
+
+_tables = {}
+
+
+def open_rates():
+    # Таблица перечитывается, только когда файл курсов изменился.
+    file_name, base = rates_file_name(), base_currency()
+    stamp = file_stamp(file_name)
+    cached = _tables.get((file_name, base))
+    if cached is None or cached[0] != stamp:
+        table = RateTable.from_csv(file_name, base) if stamp is not None else RateTable(base)
+        table.fingerprint = [base, stamp]
+        cached = _tables[(file_name, base)] = (stamp, table)
+    return cached[1]
+
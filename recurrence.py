@@ -0,0 +1,140 @@
+import calendar
+from datetime import date, datetime, time, timedelta
+
+WEEKDAYS = {
+    "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6,
+    "пн": 0, "вт": 1, "ср": 2, "чт": 3, "пт": 4, "сб": 5, "вс": 6,
+}
+CRON_FIELDS = (("минуты", 0, 59), ("часы", 0, 23), ("день месяца", 1, 31), ("месяц", 1, 12), ("день недели", 0, 7))
+# Невыполнимое cron-правило (например, 30 февраля) не должно крутить поиск бесконечно.
+MAX_SEARCH_DAYS = 366 * 8
+
+RULE_HELP = "daily[:N], weekly:пн,ср, monthly:15 (или -1 — последний день), cron:мин час день месяц день_недели"
+
+
+def parse_number(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"некорректное значение {value!r} в поле «{name}»")
+
+
+def parse_cron_field(text, name, low, high):
+    values = set()
+    for part in text.split(","):
+        part, _, step = part.partition("/")
+        step = parse_number(step, name) if step else 1
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (parse_number(value, name) for value in part.split("-", 1))
+        else:
+            start = end = parse_number(part, name)
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"значение {part!r} вне диапазона {low}-{high} в поле «{name}»")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Rule:
+    # Правило повторения. Вхождения не материализуются: next_after вычисляет
+    # ближайшее следующее, occurrences лениво перебирает их по одному.
+    def __init__(self, kind, at=None, anchor=None, interval=1, weekdays=None, day=None, cron=None):
+        self.kind = kind
+        self.at = at or time()
+        self.anchor = anchor
+        self.interval = interval
+        self.weekdays = weekdays
+        self.day = day
+        self.cron = cron
+
+    def next_after(self, moment):
+        if self.kind == "cron":
+            return self.next_cron(moment)
+        day = moment.date()
+        if datetime.combine(day, self.at) <= moment:
+            day += timedelta(days=1)
+        day = self.next_day(day)
+        return datetime.combine(day, self.at) if day else None
+
+    def occurrences(self, after):
+        while True:
+            after = self.next_after(after)
+            if after is None:
+                return
+            yield after
+
+    def next_day(self, day):
+        if self.kind == "daily":
+            if self.anchor is None or self.interval == 1:
+                return day
+            return day + timedelta(days=-(day - self.anchor).days % self.interval)
+        if self.kind == "weekly":
+            return day + timedelta(days=min((weekday - day.weekday()) % 7 for weekday in self.weekdays))
+        year, month = day.year, day.month
+        while True:
+            last = calendar.monthrange(year, month)[1]
+            candidate = date(year, month, last if self.day == -1 else min(self.day, last))
+            if candidate >= day:
+                return candidate
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    def cron_day(self, day):
+        minutes, hours, days, months, weekdays = self.cron
+        if day.month not in months:
+            return False
+        by_day = day.day in days
+        # В cron воскресенье — это 0 или 7, а понедельник — 1.
+        by_weekday = (day.weekday() + 1) % 7 in weekdays or (day.weekday() == 6 and 7 in weekdays)
+        if len(days) < 31 and len(weekdays) < 8:
+            return by_day or by_weekday
+        return by_day and by_weekday
+
+    def next_cron(self, moment):
+        minutes, hours = sorted(self.cron[0]), sorted(self.cron[1])
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = moment.date()
+        for _ in range(MAX_SEARCH_DAYS):
+            if self.cron_day(day):
+                for hour in hours:
+                    for minute in minutes:
+                        candidate = datetime.combine(day, time(hour, minute))
+                        if candidate >= moment:
+                            return candidate
+            day += timedelta(days=1)
+        return None
+
+
+def parse_rule(text, at=None, anchor=None):
+    text = str(text or "").strip()
+    kind, _, argument = text.partition(":")
+    kind = kind.strip().lower()
+    argument = argument.strip()
+    if kind == "daily":
+        interval = parse_number(argument, "интервал") if argument else 1
+        if interval < 1:
+            raise ValueError("интервал повторения должен быть положительным")
+        return Rule(kind, at, anchor, interval=interval)
+    if kind == "weekly":
+        names = [name.strip().lower() for name in argument.split(",") if name.strip()]
+        if not names or any(name not in WEEKDAYS for name in names):
+            raise ValueError(f"укажите дни недели, например weekly:пн,ср; получено {argument!r}")
+        return Rule(kind, at, anchor, weekdays={WEEKDAYS[name] for name in names})
+    if kind == "monthly":
+        day = parse_number(argument, "день месяца") if argument else (anchor.day if anchor else 1)
+        if not (1 <= day <= 31 or day == -1):
+            raise ValueError("день месяца должен быть от 1 до 31 или -1")
+        return Rule(kind, at, anchor, day=day)
+    if kind == "cron":
+        parts = argument.split()
+        if len(parts) != len(CRON_FIELDS):
+            raise ValueError("cron-правило должно содержать 5 полей: мин час день месяц день_недели")
+        cron = [parse_cron_field(part, *field) for part, field in zip(parts, CRON_FIELDS)]
+        return Rule(kind, at, anchor, cron=cron)
+    raise ValueError(f"неизвестное правило повторения {text!r}; допустимо: {RULE_HELP}")
+
+
+def next_due_date(text, after, anchor=None):
+    # Срок следующего вхождения — первый день правила строго после after.
+    moment = parse_rule(text, anchor=anchor).next_after(datetime.combine(after, time.max))
+    return moment.date() if moment else None
@@ -0,0 +1,130 @@
+import heapq
+import time as clock
+from datetime import datetime
+
+from dates import parse_date, parse_time
+from recurrence import parse_rule
+
+
+def next_reminder(task, after):
+    # Ближайшее напоминание по задаче строго после момента after. У повторяющейся
+    # задачи вычисляется только одно следующее вхождение, а не весь ряд.
+    if task.done:
+        return None
+    due_date = parse_date(task.due_date)
+    at = parse_time(task.remind_at)
+    if not task.recurrence:
+        if at is None or due_date is None:
+            return None
+        moment = datetime.combine(due_date, at)
+        return moment if moment > after else None
+    try:
+        rule = parse_rule(task.recurrence, at, due_date)
+    except ValueError:
+        return None
+    # Cron-правило само задаёт время, остальным нужно время напоминания.
+    if at is None and rule.kind != "cron":
+        return None
+    if due_date is not None and rule.kind != "cron":
+        first = datetime.combine(due_date, rule.at)
+        if first > after:
+            return first
+    return rule.next_after(after)
+
+
+class Reminders:
+    # Очередь напоминаний — куча (момент, id задачи) с ленивым удалением, как
+    # в повестке: на каждую задачу в очереди ровно одно ближайшее напоминание,
+    # следующее вхождение повторяющейся задачи добавляется после срабатывания.
+    # Поэтому проверка не перебирает задачи, а смотрит только на вершину кучи.
+    def __init__(self, repository):
+        self.repository = repository
+        self.loaded = False
+        repository.subscribe(self.on_change)
+
+    def ensure_loaded(self, now=None):
+        if self.loaded:
+            return
+        # Напоминания, пропущенные до запуска, не повторяются задним числом.
+        self.now = now or datetime.now()
+        self.times = {}
+        for task in self.repository.all():
+            moment = next_reminder(task, self.now)
+            if moment is not None:
+                self.times[task.id] = moment
+        self.heap = [(moment, task_id) for task_id, moment in self.times.items()]
+        heapq.heapify(self.heap)
+        self.loaded = True
+
+    def schedule(self, task, after):
+        moment = next_reminder(task, after)
+        if moment is None:
+            self.times.pop(task.id, None)
+        elif self.times.get(task.id) != moment:
+            self.times[task.id] = moment
+            heapq.heappush(self.heap, (moment, task.id))
+        if len(self.heap) > 2 * len(self.times) + 64:
+            self.heap = [(moment, task_id) for task_id, moment in self.times.items()]
+            heapq.heapify(self.heap)
+
+    def on_change(self, before, after):
+        if not self.loaded:
+            return
+        if after is None:
+            self.times.pop(before["id"], None)
+        else:
+            self.schedule(after, self.now)
+
+    def clean(self):
+        while self.heap and self.times.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def next_time(self):
+        self.ensure_loaded()
+        self.clean()
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, now=None):
+        now = now or datetime.now()
+        self.ensure_loaded(now)
+        fired = []
+        self.clean()
+        while self.heap and self.heap[0][0] <= now:
+            moment, task_id = heapq.heappop(self.heap)
+            del self.times[task_id]
+            task = self.repository.get(task_id)
+            fired.append((moment, task))
+            self.schedule(task, moment)
+            self.clean()
+        self.now = max(self.now, now)
+        return fired
+
+    def upcoming(self, limit=10):
+        self.ensure_loaded()
+        moments = heapq.nsmallest(limit, ((moment, task_id) for task_id, moment in self.times.items()))
+        return [(moment, self.repository.get(task_id)) for moment, task_id in moments]
+
+
+def format_reminder(moment, task):
+    return f"{moment:%d-%m-%Y %H:%M} — {task.title} (ID: {task.id}, Приоритет: {task.priority})"
+
+
+def dispatch(reminders, notify, stop=None, max_sleep=30.0):
+    # Спит до ближайшего напоминания, но не дольше max_sleep: за это время
+    # могли появиться новые задачи с более ранним сроком.
+    while stop is None or not stop():
+        reminders.repository.sync()
+        for moment, task in reminders.due():
+            notify(moment, task)
+        upcoming = reminders.next_time()
+        delay = max_sleep if upcoming is None else (upcoming - datetime.now()).total_seconds()
+        clock.sleep(min(max(delay, 0.0), max_sleep))
+
+
+_reminders = {}
+
+
+def open_reminders(repository):
+    if id(repository) not in _reminders:
+        _reminders[id(repository)] = Reminders(repository)
+    return _reminders[id(repository)]
@@ -0,0 +1,141 @@
+import json
+import threading
+
+from lazy import LazyModule
+from metrics import timer
+from storage import ConflictError, StorageError
+
+SERVER_ENV = "PA_SERVER"
+DEFAULT_SOCKET = "personal_assistant.sock"
+
+# Сокет нужен только клиенту сервера, локальный запуск его не импортирует.
+socket = LazyModule("socket")
+
+ERRORS = {
+    "ConflictError": ConflictError,
+    "ValueError": ValueError,
+}
+
+
+class RemoteClient:
+    # Одно соединение на процесс, запросы и ответы — JSON по строке.
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.file = None
+
+    def connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.socket_path)
+        except OSError as error:
+            connection.close()
+            raise StorageError(f"Сервер {self.socket_path} недоступен: {error}")
+        self.connection = connection
+        self.file = connection.makefile("rb")
+
+    def call(self, dataset, method, **params):
+        request = json.dumps({"dataset": dataset, "method": method, "params": params}, ensure_ascii=False) + "\n"
+        with self.lock, timer(f"remote.{method}"):
+            if self.connection is None:
+                self.connect()
+            try:
+                self.connection.sendall(request.encode("utf-8"))
+                line = self.file.readline()
+            except OSError:
+                line = b""
+            if not line:
+                self.connection.close()
+                self.connection = None
+                raise StorageError(f"Соединение с сервером {self.socket_path} разорвано")
+        response = json.loads(line)
+        if "error" in response:
+            raise ERRORS.get(response["type"], StorageError)(response["error"])
+        return response["result"]
+
+
+class RemoteStorage:
+    queryable = False
+
+
+class RemoteRepository:
+    # Тонкий клиент с тем же интерфейсом, что у Repository: данные, индексы
+    # и запись на диск живут на сервере.
+    remote = True
+    pending = None
+
+    def __init__(self, record_cls, file_name, client):
+        self.record_cls = record_cls
+        self.file_name = file_name
+        self.client = client
+        self.storage = RemoteStorage()
+
+    def call(self, method, **params):
+        return self.client.call(self.file_name, method, **params)
+
+    @property
+    def revision(self):
+        return self.call("revision")
+
+    def subscribe(self, listener):
+        raise StorageError("Подписка на изменения недоступна в режиме клиента")
+
+    def all(self):
+        return [self.record_cls.from_dict(data) for data in self.call("all")]
+
+    def get(self, record_id):
+        data = self.call("get", id=record_id)
+        return self.record_cls.from_dict(data) if data is not None else None
+
+    def find(self, filters):
+        return [self.record_cls.from_dict(data) for data in self.call("find", filters=filters)]
+
+    def iter_records(self, filters=()):
+        return iter(self.call("find", filters=list(filters)))
+
+    def search(self, query, limit):
+        return [(self.record_cls.from_dict(data), score) for data, score in self.call("search", query=query, limit=limit)]
+
+    def refresh(self, record, data):
+        for field, value in self.record_cls.from_dict(data).to_dict().items():
+            setattr(record, field, value)
+        return record
+
+    def add(self, record):
+        return self.refresh(record, self.call("add", record=record.to_dict()))
+
+    def add_many(self, records):
+        for record, data in zip(records, self.call("add_many", records=[record.to_dict() for record in records])):
+            self.refresh(record, data)
+        return records
+
+    def update(self, record, **changes):
+        self.refresh(record, self.call("update", id=record.id, version=record.version, changes=changes))
+
+    def delete(self, record_id):
+        return self.call("delete", id=record_id)
+
+    def replace_all(self, records):
+        for record, data in zip(records, self.call("replace_all", records=[record.to_dict() for record in records])):
+            self.refresh(record, data)
+
+    def transaction(self):
+        raise StorageError("Транзакции выполняются на сервере: используйте команду batch")
+
+
+_clients = {}
+_repositories = {}
+
+
+def remote_client(socket_path):
+    if socket_path not in _clients:
+        _clients[socket_path] = RemoteClient(socket_path)
+    return _clients[socket_path]
+
+
+def open_remote_repository(record_cls, file_name, socket_path):
+    key = (record_cls, file_name, socket_path)
+    if key not in _repositories:
+        _repositories[key] = RemoteRepository(record_cls, file_name, remote_client(socket_path))
+    return _repositories[key]
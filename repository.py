@@ -0,0 +1,258 @@
+import os
+from contextlib import contextmanager
+
+from metrics import count, timed, timer
+from remote import SERVER_ENV, open_remote_repository
+from storage import ConflictError, matches, open_storage
+
+
+class Repository:
+    remote = False
+
+    def __init__(self, record_cls, storage):
+        self.record_cls = record_cls
+        self.storage = storage
+        self.records = None
+        self.last_id = 0
+        self.revision = 0
+        self.listeners = []
+        self.pending = None
+        self.undo = None
+        self.history = None
+
+    def index(self):
+        if self.records is None:
+            self.records = {}
+            records = self.storage.load()
+            with timer("repository.from_dict"):
+                for data in records:
+                    record = self.record_cls.from_dict(data)
+                    self.records[record.id] = record
+            self.last_id = max((record_id for record_id in self.records if isinstance(record_id, int)), default=0)
+        return self.records
+
+    @timed("repository.sync")
+    def sync(self):
+        # Подтягивает изменения, сделанные другими процессами, и оповещает слушателей.
+        if self.records is None:
+            self.index()
+            return
+        changes = self.storage.changes()
+        if changes is None:
+            count("repository.reloads")
+            fresh = {data["id"]: data for data in self.storage.load()}
+            for record_id in [record_id for record_id in self.records if record_id not in fresh]:
+                self.refresh(record_id, None)
+            for record_id, data in fresh.items():
+                self.refresh(record_id, data)
+            return
+        count("repository.changes_applied", len(changes))
+        for entry in changes:
+            if entry["op"] == "put":
+                self.refresh(entry["record"]["id"], entry["record"])
+            else:
+                self.refresh(entry["id"], None)
+
+    def refresh(self, record_id, data):
+        current = self.records.get(record_id)
+        if data is None:
+            if current is not None:
+                del self.records[record_id]
+                self.revision += 1
+                self.notify(current.to_dict(), None)
+            return
+        record = self.record_cls.from_dict(data)
+        before = current.to_dict() if current is not None else None
+        if before == record.to_dict():
+            return
+        self.records[record_id] = record
+        if isinstance(record_id, int):
+            self.last_id = max(self.last_id, record_id)
+        self.revision += 1
+        self.notify(before, record)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, before, after):
+        for listener in self.listeners:
+            listener(before, after)
+
+    def changed(self, before, after):
+        if self.undo is not None:
+            self.undo.append((before, after.id if after is not None else before["id"]))
+        self.notify(before, after)
+
+    def write(self, entries):
+        self.pending.extend(entries)
+
+    @contextmanager
+    def transaction(self):
+        # Транзакция держит блокировку хранилища и начинается с подтягивания
+        # чужих изменений. Изменения копятся в памяти и записываются одним
+        # пакетом при выходе. При ошибке записи в памяти откатываются, а
+        # слушатели получают обратные изменения, чтобы индексы остались
+        # согласованными. Вложенная транзакция становится частью внешней.
+        if self.pending is not None:
+            yield self
+            return
+        with self.storage.locked():
+            self.sync()
+            self.pending = []
+            self.undo = []
+            try:
+                yield self
+                pending, undo = self.pending, self.undo
+            except BaseException:
+                self.rollback(self.undo)
+                raise
+            finally:
+                self.pending = None
+                self.undo = None
+            try:
+                self.storage.apply(pending)
+            except BaseException:
+                self.rollback(undo)
+                raise
+            if self.history is not None:
+                self.history.record(self.net_changes(undo))
+
+    def net_changes(self, undo):
+        # Итог транзакции по записям: состояние до первого изменения и после последнего.
+        records = self.index()
+        first = {}
+        for before, record_id in undo:
+            first.setdefault(record_id, before)
+        changes = []
+        for record_id, before in first.items():
+            record = records.get(record_id)
+            after = record.to_dict() if record is not None else None
+            if before != after:
+                changes.append([record_id, before, after])
+        return changes
+
+    def rollback(self, undo):
+        records = self.index()
+        for before, record_id in reversed(undo):
+            record = records.get(record_id)
+            if before is None:
+                del records[record_id]
+                self.notify(record.to_dict(), None)
+            elif record is None:
+                record = records[record_id] = self.record_cls.from_dict(before)
+                self.notify(None, record)
+            else:
+                after = record.to_dict()
+                for field, value in before.items():
+                    setattr(record, field, value)
+                self.notify(after, record)
+        self.revision += 1
+
+    def all(self):
+        self.sync()
+        return list(self.index().values())
+
+    def get(self, record_id):
+        return self.index().get(record_id)
+
+    @timed("repository.find")
+    def find(self, filters):
+        # Внутри транзакции хранилище ещё не видит изменений, поэтому ищем в памяти.
+        if self.storage.queryable and self.pending is None:
+            return [self.record_cls.from_dict(data) for data in self.storage.select(filters)]
+        self.sync()
+        return [record for record in self.index().values() if matches(record, filters)]
+
+    def iter_records(self, filters=()):
+        if self.pending is None:
+            return self.storage.iter_records(filters)
+        return (record.to_dict() for record in self.index().values() if matches(record, filters))
+
+    def allocate_id(self):
+        self.index()
+        self.last_id += 1
+        return self.last_id
+
+    def track(self, record):
+        records = self.index()
+        if record.id is None or record.id in records:
+            record.id = self.allocate_id()
+        elif isinstance(record.id, int):
+            self.last_id = max(self.last_id, record.id)
+        records[record.id] = record
+        self.revision += 1
+
+    def add(self, record):
+        with self.transaction():
+            self.track(record)
+            self.write([{"op": "put", "record": record.to_dict(), "expected": None}])
+            self.changed(None, record)
+        return record
+
+    def add_many(self, records):
+        with self.transaction():
+            for record in records:
+                self.track(record)
+            self.write([{"op": "put", "record": record.to_dict(), "expected": None} for record in records])
+            for record in records:
+                self.changed(None, record)
+        return records
+
+    def update(self, record, **changes):
+        # Оптимистическая проверка: запись должна быть той версии, которую видел вызывающий.
+        with self.transaction():
+            current = self.index().get(record.id)
+            if current is None:
+                raise ConflictError(f"Запись {record.id} удалена другим пользователем")
+            if current.version != record.version:
+                raise ConflictError(f"Запись {record.id} изменена другим пользователем")
+            before = current.to_dict()
+            for field, value in changes.items():
+                setattr(record, field, value)
+            record.version = before["version"] + 1
+            self.index()[record.id] = record
+            self.revision += 1
+            self.write([{"op": "put", "record": record.to_dict(), "expected": before["version"]}])
+            self.changed(before, record)
+
+    def delete(self, record_id):
+        with self.transaction():
+            record = self.index().pop(record_id, None)
+            if record is None:
+                return False
+            self.revision += 1
+            self.write([{"op": "delete", "id": record_id}])
+            self.changed(record.to_dict(), None)
+        return True
+
+    def replace_all(self, records):
+        if self.pending is not None:
+            raise RuntimeError("Полная перезапись недоступна внутри транзакции")
+        with self.storage.locked():
+            previous = self.all()
+            earlier = [(record.to_dict(), record.id) for record in previous]
+            self.records = {}
+            self.last_id = 0
+            for record in records:
+                self.track(record)
+            self.storage.save_all([record.to_dict() for record in records])
+            if self.history is not None:
+                self.history.record(self.net_changes(earlier + [(None, record.id) for record in records]))
+        for record in previous:
+            self.notify(record.to_dict(), None)
+        for record in records:
+            self.notify(None, record)
+
+
+_repositories = {}
+
+
+def get_repository(record_cls, file_name):
+    server = os.environ.get(SERVER_ENV)
+    if server:
+        return open_remote_repository(record_cls, file_name, server)
+    storage = open_storage(file_name)
+    key = (record_cls, id(storage))
+    if key not in _repositories:
+        _repositories[key] = Repository(record_cls, storage)
+    return _repositories[key]
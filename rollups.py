@@ -0,0 +1,307 @@
+import atexit
+import json
+import os
+from datetime import date, timedelta
+
+from analytics import FinanceColumns
+from dates import parse_date
+from metrics import timed
+from money import DEFAULT_CURRENCY, to_minor
+from rates import open_rates
+from storage import field_value, write_snapshot
+
+# Запас дней по краям дерева, чтобы операции на соседние даты не требовали перестройки.
+DAY_MARGIN = 366
+
+
+def rollup_file_name(file_name):
+    return os.path.splitext(file_name)[0] + ".rollups.json"
+
+
+def month_key(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+class Fenwick:
+    # Дерево Фенвика: прибавление к элементу и сумма префикса за O(log n).
+    def __init__(self, values):
+        tree = [0] + list(values)
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self.tree = tree
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, index, delta):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, end):
+        # Сумма элементов [0, end).
+        total = 0
+        end = min(end, len(self))
+        while end > 0:
+            total += self.tree[end]
+            end -= end & -end
+        return total
+
+
+class FinanceRollups:
+    # Материализованные итоги журнала операций в копейках базовой валюты:
+    # доходы и расходы по дням (разреженно в days и в деревьях Фенвика для
+    # сумм за период) и корзины месяц × категория для сводок. Каждая операция
+    # переводится по курсу на свою дату. Итоги обновляются по событиям
+    # репозитория и сохраняются рядом с файлом данных вместе с отпечатками
+    # данных и таблицы курсов. Операции без курса учитываются в unconverted.
+    def __init__(self, repository, file_name):
+        self.repository = repository
+        self.file_name = file_name
+        self.days = None
+        self.months = None
+        self.names = None
+        self.unconverted = None
+        self.rates = None
+        self.first = None
+        self.income = None
+        self.expense = None
+        self.dirty = False
+        # Отпечаток файла данных, если итоги загружены без репозитория.
+        self.detached = None
+        repository.subscribe(self.on_change)
+        atexit.register(self.save)
+
+    def ensure_loaded(self):
+        rates = open_rates()
+        if self.days is not None and self.rates is rates and self.current():
+            return
+        self.rates = rates
+        # Пока репозиторий не загружен, сохранённые итоги сверяются только
+        # с отпечатком файла данных: холодный отчёт не разбирает все операции.
+        # Иначе сначала догоняем файл в памяти. Незаписанные изменения открытой
+        # транзакции есть только в памяти — тогда итоги пересчитываются по ней.
+        with self.repository.storage.locked(exclusive=False):
+            self.detached = None
+            if self.repository.records is None and self.load():
+                self.detached = self.repository.storage.fingerprint()
+                return
+            self.repository.sync()
+            if self.repository.pending or not self.load():
+                self.rebuild()
+
+    def current(self):
+        # Загруженный репозиторий сначала догоняет файл данных, и итоги идут за
+        # его событиями. Итоги, загруженные без репозитория, верны, пока файл
+        # данных не менялся: при том же отпечатке записи репозитория совпадают с ними.
+        with self.repository.storage.locked(exclusive=False):
+            if self.repository.records is not None:
+                self.repository.sync()
+            if self.days is None:
+                return False
+            if self.detached is None:
+                return True
+            if self.repository.storage.fingerprint() != self.detached:
+                self.days = None
+                self.detached = None
+                return False
+            if self.repository.records is not None:
+                self.detached = None
+            return True
+
+    def attach(self):
+        # Первое изменение после загрузки без репозитория приходит из транзакции,
+        # когда файл данных ещё не записан: при прежнем отпечатке итоги годятся,
+        # иначе они пересчитаются при следующем обращении.
+        if self.repository.storage.fingerprint() == self.detached:
+            self.detached = None
+            return True
+        self.days = None
+        self.detached = None
+        return False
+
+    def load(self):
+        try:
+            with open(self.file_name, "r") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return False
+        if data.get("fingerprint") != [self.repository.storage.fingerprint(), self.rates.fingerprint]:
+            return False
+        self.days = {int(day): totals for day, totals in data["days"].items()}
+        self.months = data["months"]
+        self.names = data["names"]
+        self.unconverted = set(data["unconverted"])
+        self.build_trees()
+        return True
+
+    @timed("finances.rollups_rebuild")
+    def rebuild(self):
+        self.days = {}
+        self.months = {}
+        self.names = {}
+        # Перевод в базовую валюту — одним пакетом по столбцам, а не по записи.
+        records = FinanceColumns.from_records(self.repository.records.values())
+        columns = records.converted(self.rates)
+        for day, category, amount in zip(columns.days, columns.categories, columns.amounts):
+            self.add(day, columns.category_names[category], amount, 1)
+        self.unconverted = set(records.ids) - set(columns.ids)
+        self.build_trees()
+        self.dirty = True
+
+    def build_trees(self):
+        if not self.days:
+            self.first, self.income, self.expense = None, Fenwick([]), Fenwick([])
+            return
+        self.first = min(self.days) - DAY_MARGIN
+        size = max(self.days) + DAY_MARGIN - self.first + 1
+        income, expense = [0] * size, [0] * size
+        for day, (day_income, day_expense) in self.days.items():
+            income[day - self.first] = day_income
+            expense[day - self.first] = day_expense
+        self.income, self.expense = Fenwick(income), Fenwick(expense)
+
+    def save(self):
+        if not self.dirty:
+            return
+        # Отпечаток берём под блокировкой после синхронизации: иначе чужая
+        # запись между ними попала бы в отпечаток, но не в итоги.
+        # Изменённые итоги следуют за событиями загруженного репозитория, так что
+        # sync здесь только сверяет отпечаток; незагруженный репозиторий не читается.
+        with self.repository.storage.locked(exclusive=False):
+            if self.repository.records is not None:
+                self.repository.sync()
+            fingerprint = [self.repository.storage.fingerprint(), self.rates.fingerprint]
+        write_snapshot(self.file_name, {
+            "fingerprint": fingerprint,
+            "days": self.days,
+            "months": self.months,
+            "names": self.names,
+            "unconverted": sorted(self.unconverted),
+        })
+        self.dirty = False
+
+    def apply(self, record, sign):
+        day = parse_date(field_value(record, "date"))
+        amount = to_minor(field_value(record, "amount"))
+        if day is None or amount is None:
+            return None
+        amount = self.rates.convert(amount, field_value(record, "currency") or DEFAULT_CURRENCY, day.toordinal())
+        if amount is None:
+            if sign > 0:
+                self.unconverted.add(field_value(record, "id"))
+            else:
+                self.unconverted.discard(field_value(record, "id"))
+            return None
+        return self.add(day.toordinal(), str(field_value(record, "category") or ""), amount, sign)
+
+    def add(self, ordinal, category, amount, sign):
+        # Возвращает день операции, если он лёг вне деревьев и их нужно перестроить.
+        day = date.fromordinal(ordinal)
+        side = 0 if amount > 0 else 1
+        delta = sign * amount
+
+        totals = self.days.setdefault(ordinal, [0, 0])
+        totals[side] += delta
+        if totals == [0, 0] and sign < 0:
+            del self.days[ordinal]
+
+        key = category.casefold()
+        self.names.setdefault(key, category)
+        month = self.months.setdefault(month_key(day), {})
+        bucket = month.setdefault(key, [0, 0, 0])
+        bucket[side] += delta
+        bucket[2] += sign
+        if bucket[2] == 0:
+            del month[key]
+            if not month:
+                del self.months[month_key(day)]
+
+        if self.first is None or not 0 <= ordinal - self.first < len(self.income):
+            return ordinal
+        (self.income if side == 0 else self.expense).add(ordinal - self.first, delta)
+        return None
+
+    def on_change(self, before, after):
+        if self.days is None or (self.detached is not None and not self.attach()):
+            return
+        outside = False
+        if before is not None:
+            outside = self.apply(before, -1) is not None or outside
+        if after is not None:
+            outside = self.apply(after, 1) is not None or outside
+        if outside:
+            self.build_trees()
+        self.dirty = True
+
+    def bounds(self, start, end):
+        start = parse_date(start) if start else None
+        end = parse_date(end) if end else None
+        low = start.toordinal() - self.first if start else 0
+        high = end.toordinal() - self.first + 1 if end else len(self.income)
+        return max(low, 0), max(high, 0)
+
+    def totals(self, start=None, end=None):
+        # Доходы и расходы за период в копейках — две разности префиксных сумм, O(log дней).
+        self.ensure_loaded()
+        if self.first is None:
+            return 0, 0
+        low, high = self.bounds(start, end)
+        if low >= high:
+            return 0, 0
+        income = self.income.prefix(high) - self.income.prefix(low)
+        expense = self.expense.prefix(high) - self.expense.prefix(low)
+        return income, expense
+
+    def month_range(self, start, end):
+        # Корзины подходят, только если период состоит из целых месяцев.
+        start = parse_date(start) if start else None
+        end = parse_date(end) if end else None
+        if start is not None and start.day != 1:
+            return None
+        if end is not None and (end + timedelta(days=1)).day != 1:
+            return None
+        return (month_key(start) if start else "0000-00"), (month_key(end) if end else "9999-99")
+
+    def by_month(self, start=None, end=None):
+        self.ensure_loaded()
+        months = self.month_range(start, end)
+        if months is None:
+            return None
+        rows = []
+        for month in sorted(self.months):
+            if months[0] <= month <= months[1]:
+                income = sum(bucket[0] for bucket in self.months[month].values())
+                expense = sum(bucket[1] for bucket in self.months[month].values())
+                rows.append((month, income, expense, income + expense))
+        return rows
+
+    def by_category(self, start=None, end=None):
+        self.ensure_loaded()
+        months = self.month_range(start, end)
+        if months is None:
+            return None
+        totals = {}
+        for month, buckets in self.months.items():
+            if months[0] <= month <= months[1]:
+                for key, (income, expense, _) in buckets.items():
+                    category = totals.setdefault(key, [0, 0])
+                    category[0] += income
+                    category[1] += expense
+        rows = [
+            (self.names[key], income, expense, income + expense)
+            for key, (income, expense) in totals.items()
+        ]
+        return sorted(rows, key=lambda row: row[0].casefold())
+
+
+_rollups = {}
+
+
+def open_rollups(repository, file_name):
+    if id(repository) not in _rollups:
+        _rollups[id(repository)] = FinanceRollups(repository, rollup_file_name(file_name))
+    return _rollups[id(repository)]
@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import signal
+import sys
+from contextlib import ExitStack
+from datetime import date, datetime
+
+from history import open_history
+from metrics import timer
+from pages import fetch_page
+from reminders import format_reminder, open_reminders
+from remote import SERVER_ENV
+from storage import ConflictError, StorageError
+
+FLUSH_DELAY = 0.05
+REMINDER_CHECK = 30.0
+
+
+class Server:
+    # Держит все наборы данных в памяти и обслуживает клиентов через Unix-сокет.
+    # Записи сразу применяются в памяти, а на диск попадают пакетом: первая
+    # запись открывает транзакцию набора, через FLUSH_DELAY она закрывается
+    # одним вызовом storage.apply на все накопленные изменения.
+    def __init__(self, socket_path, flush_delay=FLUSH_DELAY):
+        # Сам сервер работает с файлами напрямую, а не через другой сервер.
+        os.environ.pop(SERVER_ENV, None)
+        from personal_assistant import ContactsManager, FinancesManager, Note, TasksManager
+
+        self.socket_path = socket_path
+        self.flush_delay = flush_delay
+        self.managers = {
+            Note.NOTES_FILE: Note,
+            TasksManager.TASKS_FILE: TasksManager,
+            ContactsManager.CONTACTS_FILE: ContactsManager,
+            FinancesManager.FINANCES_FILE: FinancesManager,
+        }
+        self.repositories = {file_name: manager.repository() for file_name, manager in self.managers.items()}
+        for repository in self.repositories.values():
+            repository.all()
+        self.open_writes = ExitStack()
+        self.writing = set()
+        self.flush_handle = None
+        self.stopped = None
+
+    def begin_write(self, file_name):
+        if file_name not in self.writing:
+            self.open_writes.enter_context(self.repositories[file_name].transaction())
+            self.writing.add(file_name)
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        open_writes, self.open_writes = self.open_writes, ExitStack()
+        self.writing = set()
+        try:
+            open_writes.close()
+        except StorageError as error:
+            print(f"Ошибка записи на диск, изменения отменены: {error}", file=sys.stderr)
+
+    def record(self, repository, record_id):
+        record = repository.get(record_id)
+        return record.to_dict() if record is not None else None
+
+    def dispatch(self, file_name, method, params):
+        if method == "batch":
+            return self.batch(params["lines"])
+        if method in ("history", "undo", "redo"):
+            return self.history(method, params)
+        if method == "query":
+            return self.query(params)
+        if method in ("stats", "profile"):
+            return self.metrics(method, params)
+        if file_name not in self.repositories:
+            raise ValueError(f"Неизвестный набор данных: {file_name}")
+        manager = self.managers[file_name]
+        repository = self.repositories[file_name]
+
+        if method == "all":
+            return [record.to_dict() for record in repository.all()]
+        if method == "get":
+            return self.record(repository, params["id"])
+        if method == "find":
+            filters = [tuple(condition) for condition in params["filters"]]
+            return [record.to_dict() for record in repository.find(filters)]
+        if method == "revision":
+            return repository.revision
+        if method == "agenda":
+            return [task.to_dict() for task in manager.agenda(params["view"], params["limit"], params["today"])]
+        if method == "reminders":
+            return [[moment.isoformat(), task.to_dict()] for moment, task in manager.reminders(params["limit"])]
+        if method == "conversion":
+            return list(manager.conversion())
+        if method == "report":
+            return [str(value) for value in manager.report(params["start_date"], params["end_date"])]
+        if method == "page":
+            page = fetch_page(repository, **params)
+            return page.to_dict() if page is not None else None
+        if method == "as_of":
+            self.flush()
+            records, started = open_history(repository, file_name).state_at(datetime.fromisoformat(params["moment"]))
+            return [[record.to_dict() for record in records], started.isoformat() if started else None]
+        if method == "search":
+            # Заметки возвращаются с оценкой релевантности, контакты — без неё.
+            results = (item if isinstance(item, tuple) else (item, None) for item in manager.find(params["query"], params["limit"]))
+            return [[record.to_dict(), score] for record, score in results]
+
+        if method == "deduplicate":
+            from dedup import deduplicate
+
+            if params["apply"]:
+                self.begin_write(file_name)
+            groups, removed = deduplicate(repository, file_name, **params)
+            return [[group.to_dict() for group in groups], removed]
+
+        if method == "replace_all":
+            self.flush()
+            records = [manager.from_dict(data) for data in params["records"]]
+            repository.replace_all(records)
+            return [record.to_dict() for record in records]
+        self.begin_write(file_name)
+        if method == "add":
+            return repository.add(manager.from_dict(params["record"])).to_dict()
+        if method == "add_many":
+            records = repository.add_many([manager.from_dict(data) for data in params["records"]])
+            return [record.to_dict() for record in records]
+        if method == "update":
+            record = repository.get(params["id"])
+            if record is None:
+                raise ConflictError(f"Запись {params['id']} удалена другим пользователем")
+            if record.version != params["version"]:
+                raise ConflictError(f"Запись {params['id']} изменена другим пользователем")
+            repository.update(record, **params["changes"])
+            return record.to_dict()
+        if method == "delete":
+            return repository.delete(params["id"])
+        raise ValueError(f"Неизвестный метод: {method}")
+
+    def history(self, method, params):
+        # История общая для всех наборов данных, отмена идёт своей транзакцией.
+        from personal_assistant import HistoryManager
+
+        self.flush()
+        if method == "history":
+            return [list(item) for item in HistoryManager.entries(params["limit"])]
+        result = HistoryManager.revert(method)
+        return list(result) if result is not None else None
+
+    def query(self, params):
+        from personal_assistant import SearchManager
+
+        today = date.fromisoformat(params["today"]) if params["today"] else None
+        return [result.to_dict() for result in SearchManager.query(params["text"], params["limit"], today)]
+
+    def metrics(self, method, params):
+        # Замеры копятся в процессе сервера: клиентские процессы живут одну команду.
+        import metrics
+
+        if method == "profile":
+            if params["action"] == "start":
+                metrics.start_profiling()
+                return None
+            return metrics.stop_profiling(params["prefix"])
+        data = metrics.snapshot()
+        if params.get("reset"):
+            metrics.reset()
+        return data
+
+    def batch(self, lines):
+        from cli import CommandError, execute_batch
+
+        self.flush()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            try:
+                execute_batch(lines)
+            except CommandError as error:
+                print(f"Ошибка: {error}")
+                return False, output.getvalue()
+        return True, output.getvalue()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    with timer(f"server.{request['method']}"):
+                        response = {"result": self.dispatch(request.get("dataset"), request["method"], request.get("params", {}))}
+                except (StorageError, ValueError, KeyError, TypeError) as error:
+                    response = {"error": str(error), "type": type(error).__name__}
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def remind(self):
+        # Сервер сам рассылает напоминания: спит до вершины кучи напоминаний,
+        # но не дольше REMINDER_CHECK: у новых задач напоминание может оказаться раньше.
+        from personal_assistant import TasksManager
+
+        reminders = open_reminders(self.repositories[TasksManager.TASKS_FILE])
+        while True:
+            for moment, task in reminders.due():
+                print(f"Напоминание: {format_reminder(moment, task)}", flush=True)
+            upcoming = reminders.next_time()
+            delay = REMINDER_CHECK if upcoming is None else (upcoming - datetime.now()).total_seconds()
+            await asyncio.sleep(min(max(delay, 0.0), REMINDER_CHECK))
+
+    async def run(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, self.stopped.set)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path, limit=2 ** 26)
+        print(f"Сервер запущен: {self.socket_path}")
+        reminding = asyncio.create_task(self.remind())
+        try:
+            async with server:
+                await self.stopped.wait()
+        finally:
+            reminding.cancel()
+            self.flush()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        print("Сервер остановлен, изменения записаны.")
+
+
+def serve(socket_path):
+    asyncio.run(Server(socket_path).run())
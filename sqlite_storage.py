@@ -0,0 +1,206 @@
+import itertools
+import json
+import os
+import sqlite3
+import sys
+
+from dates import iso_date, iso_timestamp
+from metrics import timed
+from money import to_minor
+from storage import (
+    ConflictError,
+    FileLock,
+    JournalStorage,
+    JsonStorage,
+    file_stamp,
+    filter_value,
+    matches,
+    parse_bool,
+    priority_rank,
+)
+
+DATABASE_ENV = "PA_DATABASE"
+DEFAULT_DATABASE = "personal_assistant.db"
+# Версия правил вычисляемых колонок: при её смене колонки пересчитываются из data.
+COLUMNS_VERSION = 2
+
+
+def casefold(value):
+    return str(value or "").casefold()
+
+
+def note_columns(record):
+    return {"timestamp_iso": iso_timestamp(record.get("timestamp"))}
+
+
+def task_columns(record):
+    return {
+        "done": int(parse_bool(record.get("done"))),
+        "priority": casefold(record.get("priority")),
+        "priority_rank": priority_rank(record.get("priority")),
+        "due_date": iso_date(record.get("due_date")),
+    }
+
+
+def contact_columns(record):
+    return {"name": casefold(record.get("name"))}
+
+
+def finance_columns(record):
+    return {
+        "amount": to_minor(record.get("amount")),
+        "category": casefold(record.get("category")),
+        "date": iso_date(record.get("date")),
+    }
+
+
+# Для каждого набора данных: таблица, вычисляемые колонки и индексы по ним.
+# Сама запись целиком лежит в колонке data, колонки нужны только для поиска.
+SCHEMAS = {
+    "notes.json": ("notes", note_columns, [("timestamp_iso",)]),
+    "tasks.json": ("tasks", task_columns, [("done", "due_date", "priority_rank"), ("priority_rank",), ("due_date",)]),
+    "contacts.json": ("contacts", contact_columns, [("name",)]),
+    "finance.json": ("finances", finance_columns, [("category", "date"), ("date",)]),
+}
+
+
+class SqliteStorage(JsonStorage):
+    queryable = True
+
+    def __init__(self, file_name, database=None):
+        super().__init__(file_name)
+        self.table, self.columns, self.indexes = SCHEMAS[os.path.basename(file_name)]
+        self.column_names = ["version"] + list(self.columns({}))
+        self.database = database or os.environ.get(DATABASE_ENV, DEFAULT_DATABASE)
+        self.locked = FileLock(self.database + ".lock")
+        self.connection = sqlite3.connect(self.database, check_same_thread=False)
+        self.create_table()
+
+    def create_table(self):
+        columns = "".join(f", {name}" for name in self.column_names)
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY, data TEXT NOT NULL{columns})")
+            existing = {row[1] for row in self.connection.execute(f"PRAGMA table_info({self.table})")}
+            if "version" not in existing:
+                self.connection.execute(f"ALTER TABLE {self.table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS column_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            row = self.connection.execute("SELECT version FROM column_versions WHERE name = ?", (self.table,)).fetchone()
+            if row is None or row[0] != COLUMNS_VERSION:
+                self.recompute_columns()
+                self.connection.execute("INSERT OR REPLACE INTO column_versions VALUES (?, ?)", (self.table, COLUMNS_VERSION))
+            for index in self.indexes:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_{'_'.join(index)} ON {self.table} ({', '.join(index)})"
+                )
+
+    def recompute_columns(self):
+        assignments = ", ".join(f"{name} = ?" for name in ["data"] + self.column_names)
+        rows = [self.row(json.loads(data)) for (data,) in self.connection.execute(f"SELECT data FROM {self.table}")]
+        self.connection.executemany(
+            f"UPDATE {self.table} SET {assignments} WHERE id = ?",
+            [values + [record_id] for record_id, *values in rows],
+        )
+
+    def fingerprint(self):
+        return [file_stamp(self.database)]
+
+    def row(self, record):
+        values = dict(self.columns(record), version=record.get("version", 0))
+        return [record["id"], json.dumps(record, ensure_ascii=False)] + [values[name] for name in self.column_names]
+
+    def data_version(self):
+        # Меняется, когда базу изменило другое соединение; свои коммиты его не трогают.
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    @timed("storage.load")
+    def load(self):
+        self.seen = self.data_version()
+        return [json.loads(data) for (data,) in self.connection.execute(f"SELECT data FROM {self.table} ORDER BY id")]
+
+    def changes(self):
+        return [] if self.seen is not None and self.seen == self.data_version() else None
+
+    @timed("storage.save_all")
+    def save_all(self, records):
+        with self.locked(), self.connection:
+            self.connection.execute(f"DELETE FROM {self.table}")
+            self.insert(records)
+
+    @timed("storage.apply")
+    def apply(self, entries):
+        # Все изменения пакета применяются в одной транзакции, соседние операции
+        # одного типа группируются в один executemany с сохранением порядка.
+        # Обновление проходит, только если версия в базе совпадает с ожидаемой.
+        with self.locked(), self.connection:
+            for op, group in itertools.groupby(entries, key=lambda entry: entry["op"]):
+                if op == "put":
+                    group = list(group)
+                    self.insert([entry["record"] for entry in group if "expected" not in entry])
+                    self.insert_new([entry["record"] for entry in group if entry.get("expected", 0) is None])
+                    self.update_versioned([entry for entry in group if entry.get("expected") is not None])
+                else:
+                    self.connection.executemany(f"DELETE FROM {self.table} WHERE id = ?", [(entry["id"],) for entry in group])
+
+    def insert(self, records):
+        placeholders = ", ".join("?" for _ in range(len(self.column_names) + 2))
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (id, data, {', '.join(self.column_names)}) VALUES ({placeholders})",
+            [self.row(record) for record in records],
+        )
+
+    def insert_new(self, records):
+        placeholders = ", ".join("?" for _ in range(len(self.column_names) + 2))
+        try:
+            self.connection.executemany(
+                f"INSERT INTO {self.table} (id, data, {', '.join(self.column_names)}) VALUES ({placeholders})",
+                [self.row(record) for record in records],
+            )
+        except sqlite3.IntegrityError:
+            raise ConflictError("Запись с таким ID уже добавлена другим пользователем")
+
+    def update_versioned(self, entries):
+        assignments = ", ".join(f"{name} = ?" for name in ["data"] + self.column_names)
+        query = f"UPDATE {self.table} SET {assignments} WHERE id = ? AND version = ?"
+        for entry in entries:
+            record_id, *values = self.row(entry["record"])
+            if self.connection.execute(query, values + [record_id, entry["expected"]]).rowcount != 1:
+                raise ConflictError(f"Запись {record_id} изменена другим пользователем")
+
+    def where(self, filters):
+        # Условия по вычисляемым колонкам уходят в SQL, остальные проверяются в Python.
+        conditions = []
+        params = []
+        rest = []
+        for field, op, value in filters:
+            if field not in self.column_names:
+                rest.append((field, op, value))
+                continue
+            value = filter_value(field, value)
+            conditions.append(f"{field} {op} ?")
+            params.append(int(value) if isinstance(value, bool) else value)
+        if not conditions:
+            return "", params, rest
+        return "WHERE " + " AND ".join(conditions), params, rest
+
+    def iter_records(self, filters=()):
+        where, params, rest = self.where(filters)
+        query = f"SELECT data FROM {self.table} {where} ORDER BY id"
+        for (data,) in self.connection.execute(query, params):
+            record = json.loads(data)
+            if matches(record, rest):
+                yield record
+
+    @timed("storage.select")
+    def select(self, filters):
+        return list(self.iter_records(filters))
+
+
+def migrate(database=None):
+    for file_name in SCHEMAS:
+        records = JournalStorage(file_name).load()
+        SqliteStorage(file_name, database).save_all(records)
+        print(f"{file_name}: перенесено записей: {len(records)}")
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,476 @@
+import json
+import operator
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+from dates import iso_date
+from metrics import timed
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STORAGE_ENV = "PA_STORAGE"
+DEFAULT_BACKEND = "journal"
+
+PRIORITY_RANKS = {"высокий": 0, "средний": 1, "низкий": 2}
+
+DATE_FIELDS = {"date", "due_date"}
+BOOL_FIELDS = {"done"}
+OPERATORS = {
+    "=": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class StorageError(Exception):
+    pass
+
+
+class ConflictError(StorageError):
+    pass
+
+
+def parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "да", "yes")
+    return bool(value)
+
+
+def parse_id(value):
+    # id записи — целое число; в старых файлах встречается строка из цифр.
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+
+def normalize_ids(records):
+    # Старые файлы могут хранить id строкой ("2" рядом с 2) или повторять его
+    # (прежний импорт CSV). Записи хранятся по id, и такие записи слились бы
+    # в одну, поэтому id приводится к числу, а повторы и некорректные id
+    # получают новые номера после наибольшего. Возвращает записи и пары
+    # (прежний id, новый id) для каждой изменённой записи.
+    seen, fixes, rest = set(), [], []
+    for record in records:
+        record_id = parse_id(record.get("id"))
+        if not isinstance(record_id, int) or isinstance(record_id, bool) or record_id in seen:
+            rest.append(record)
+            continue
+        seen.add(record_id)
+        if type(record.get("id")) is not int:
+            fixes.append((record.get("id"), record_id))
+            record["id"] = record_id
+    last_id = max(seen, default=0)
+    for record in rest:
+        last_id += 1
+        fixes.append((record.get("id"), last_id))
+        record["id"] = last_id
+    return records, fixes
+
+
+def report_ids(file_name, fixes):
+    for old_id, new_id in fixes:
+        print(f"{file_name}: запись с ID {old_id!r} теперь имеет ID {new_id}", file=sys.stderr)
+
+
+def priority_rank(priority):
+    return PRIORITY_RANKS.get(str(priority or "").strip().casefold(), len(PRIORITY_RANKS))
+
+
+def filter_value(field, value):
+    if field in DATE_FIELDS:
+        return iso_date(value)
+    if field in BOOL_FIELDS:
+        return parse_bool(value)
+    if isinstance(value, str):
+        return value.casefold()
+    return value
+
+
+def field_value(record, field):
+    if isinstance(record, dict):
+        return record.get(field)
+    return getattr(record, field, None)
+
+
+def matches(record, filters):
+    for field, op, value in filters:
+        actual = filter_value(field, field_value(record, field))
+        if actual is None or not OPERATORS[op](actual, filter_value(field, value)):
+            return False
+    return True
+
+
+def iter_json_array(file_name, chunk_size=64 * 1024):
+    # Читает JSON-массив объектов по частям, не загружая файл целиком.
+    try:
+        file = open(file_name, "r")
+    except FileNotFoundError:
+        return
+    yield from read_json_array(file, chunk_size)
+
+
+def read_json_array(file, chunk_size=64 * 1024):
+    decoder = json.JSONDecoder()
+    with file:
+        buffer = ""
+        position = 0
+        started = False
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                buffer = file.read(chunk_size)
+                position = 0
+                if not buffer:
+                    return
+                continue
+            if not started:
+                if buffer[position] != "[":
+                    raise StorageError(f"Файл {file.name} не содержит JSON-массив")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield record
+
+
+@timed("storage.write_snapshot")
+def write_snapshot(file_name, records):
+    # Имя временного файла уникально для процесса: снимки индексов пишутся без блокировки.
+    tmp_name = f"{file_name}.{os.getpid()}.tmp"
+    with open(tmp_name, "w") as file:
+        json.dump(records, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_name, file_name)
+
+
+class FileLock:
+    # Рекурсивная advisory-блокировка через fcntl.flock на отдельном файле
+    # рядом с данными. Внутри процесса дополнительно защищает RLock.
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.thread_lock = threading.RLock()
+        self.file = None
+        self.depth = 0
+
+    @contextmanager
+    def __call__(self, exclusive=True):
+        with self.thread_lock:
+            if self.depth == 0 and fcntl is not None:
+                self.file = open(self.file_name, "a")
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if self.depth == 0 and self.file is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+                    self.file.close()
+                    self.file = None
+
+
+def apply_entries(records, entries):
+    for entry in entries:
+        if entry["op"] == "put":
+            records[entry["record"]["id"]] = entry["record"]
+        else:
+            records.pop(entry["id"], None)
+    return records
+
+
+def file_size(file_name):
+    try:
+        return os.path.getsize(file_name)
+    except FileNotFoundError:
+        return 0
+
+
+def file_stamp(file_name):
+    try:
+        stat = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class JsonStorage:
+    queryable = False
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.locked = FileLock(file_name + ".lock")
+        self.seen = None
+
+    @timed("storage.read")
+    def read(self):
+        try:
+            with open(self.file_name, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError as error:
+            # Пустой список здесь привёл бы к потере данных при следующем сохранении.
+            raise StorageError(f"Файл {self.file_name} повреждён: {error}")
+
+    @timed("storage.load")
+    def load(self):
+        with self.locked(exclusive=False):
+            records, fixes = normalize_ids(self.read())
+            self.seen = self.fingerprint()
+        if fixes:
+            self.repair()
+            return self.load()
+        return records
+
+    def repair(self):
+        # Исправленные id сразу записываются в файл: иначе они менялись бы при
+        # каждом чтении, а потоковое чтение видело бы прежние.
+        with self.locked():
+            records, fixes = normalize_ids(self.read())
+            if fixes:
+                write_snapshot(self.file_name, records)
+                report_ids(self.file_name, fixes)
+
+    def changes(self):
+        # Изменения, сделанные другими процессами с момента последнего чтения:
+        # пустой список, если их нет, или None, если нужно перечитать всё.
+        return [] if self.seen is not None and self.seen == self.fingerprint() else None
+
+    @timed("storage.save_all")
+    def save_all(self, records):
+        with self.locked():
+            caught_up = self.changes() == []
+            write_snapshot(self.file_name, records)
+            self.seen = self.fingerprint() if caught_up else None
+
+    def fingerprint(self):
+        return [file_stamp(self.file_name)]
+
+    def put(self, record):
+        self.put_many([record])
+
+    def put_many(self, records):
+        self.apply([{"op": "put", "record": record} for record in records])
+
+    def delete(self, record_id):
+        self.apply([{"op": "delete", "id": record_id}])
+
+    @timed("storage.apply")
+    def apply(self, entries):
+        if not entries:
+            return
+        with self.locked():
+            caught_up = self.changes() == []
+            records, fixes = normalize_ids(self.read())
+            report_ids(self.file_name, fixes)
+            by_id = {record["id"]: record for record in records}
+            apply_entries(by_id, entries)
+            write_snapshot(self.file_name, list(by_id.values()))
+            self.seen = self.fingerprint() if caught_up else None
+
+    def iter_records(self, filters=()):
+        for record in iter_json_array(self.file_name):
+            if matches(record, filters):
+                yield record
+
+    @timed("storage.select")
+    def select(self, filters):
+        return list(self.iter_records(filters))
+
+    def export_json(self, file_name):
+        write_snapshot(file_name, self.load())
+
+    def import_json(self, file_name):
+        with open(file_name, "r") as file:
+            self.put_many(json.load(file))
+
+
+class JournalStorage(JsonStorage):
+    # Снимок хранится в исходном JSON-файле, изменения дописываются в журнал
+    # по одной строке и периодически сворачиваются в новый снимок. Позиция
+    # в журнале запоминается, чтобы дочитывать только чужие изменения.
+    COMPACT_MIN_BYTES = 1024 * 1024
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        self.journal_name = file_name + ".journal"
+        self.offset = None
+
+    @timed("storage.load")
+    def load(self):
+        with self.locked(exclusive=False):
+            self.seen = file_stamp(self.file_name)
+            records, fixes, self.offset = self.merged()
+        if fixes:
+            self.repair()
+            return self.load()
+        return records
+
+    def merged(self):
+        # Снимок с применённым журналом. Журнал, записанный до исправления id,
+        # может ссылаться на прежние id, поэтому проверяется и результат.
+        records, fixes = normalize_ids(self.read())
+        entries, offset = self.replay()
+        records = list(apply_entries({record["id"]: record for record in records}, entries).values())
+        records, more = normalize_ids(records)
+        return records, fixes + more, offset
+
+    def repair(self):
+        with self.locked():
+            records, fixes, _ = self.merged()
+            if fixes:
+                self.write(records)
+                report_ids(self.file_name, fixes)
+
+    def changes(self):
+        if self.offset is None or self.seen != file_stamp(self.file_name):
+            return None
+        if file_size(self.journal_name) == self.offset:
+            return []
+        with self.locked(exclusive=False):
+            if file_size(self.journal_name) < self.offset:
+                return None
+            entries, self.offset = self.replay(self.offset)
+        return entries
+
+    def fingerprint(self):
+        return [file_stamp(self.file_name), file_stamp(self.journal_name)]
+
+    def iter_records(self, filters=()):
+        # Журнал ограничен порогом сжатия, поэтому в памяти держим только его,
+        # а снимок читаем потоково и подменяем изменённые записи. Снимок
+        # открываем под блокировкой: он заменяется переименованием, так что
+        # открытый файл остаётся согласованным с прочитанным журналом.
+        changes = {}
+        with self.locked(exclusive=False):
+            entries, _ = self.replay()
+            try:
+                snapshot = open(self.file_name, "r")
+            except FileNotFoundError:
+                snapshot = None
+        for entry in entries:
+            if entry["op"] == "put":
+                changes.pop(entry["record"]["id"], None)
+                changes[entry["record"]["id"]] = entry["record"]
+            else:
+                changes[entry["id"]] = None
+        for record in read_json_array(snapshot) if snapshot is not None else ():
+            if record["id"] not in changes and matches(record, filters):
+                yield record
+        for record in changes.values():
+            if record is not None and matches(record, filters):
+                yield record
+
+    def replay(self, offset=0):
+        try:
+            file = open(self.journal_name, "rb")
+        except FileNotFoundError:
+            return [], 0
+
+        entries = []
+        valid_size = offset
+        with file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                # Пакет изменений пишется одной строкой и применяется целиком либо никак.
+                if entry["op"] == "batch":
+                    entries.extend(entry["entries"])
+                else:
+                    entries.append(entry)
+                valid_size += len(line)
+
+        # Хвост, оборванный при сбое, отбрасываем, чтобы следующие записи не склеились с ним.
+        # Писатели держат исключительную блокировку, поэтому незаконченной записи здесь быть не может.
+        if valid_size < file_size(self.journal_name):
+            os.truncate(self.journal_name, valid_size)
+        return entries, valid_size
+
+    @timed("storage.apply")
+    def apply(self, entries):
+        entries = [{key: value for key, value in entry.items() if key != "expected"} for entry in entries]
+        if len(entries) > 1:
+            entries = [{"op": "batch", "entries": entries}]
+        self.append(entries)
+
+    def append(self, entries):
+        if not entries:
+            return
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with self.locked():
+            caught_up = self.changes() == []
+            with open(self.journal_name, "ab") as file:
+                file.write(data.encode("utf-8"))
+                file.flush()
+                os.fsync(file.fileno())
+                journal_size = file.tell()
+            self.offset = journal_size if caught_up else None
+
+            if journal_size > max(self.COMPACT_MIN_BYTES, file_size(self.file_name)):
+                self.compact()
+
+    @timed("storage.compact")
+    def compact(self):
+        with self.locked():
+            caught_up = self.changes() == []
+            records = self.load()
+            self.write(records)
+            if not caught_up:
+                self.offset = None
+
+    @timed("storage.save_all")
+    def save_all(self, records):
+        with self.locked():
+            self.write(records)
+
+    def write(self, records):
+        write_snapshot(self.file_name, records)
+        with open(self.journal_name, "wb") as file:
+            os.fsync(file.fileno())
+        self.seen = file_stamp(self.file_name)
+        self.offset = 0
+
+
+BACKENDS = {
+    "json": JsonStorage,
+    "journal": JournalStorage,
+}
+
+_storages = {}
+
+
+def open_storage(file_name, backend=None):
+    backend = backend or os.environ.get(STORAGE_ENV, DEFAULT_BACKEND)
+    if backend == "sqlite" and backend not in BACKENDS:
+        from sqlite_storage import SqliteStorage
+        BACKENDS[backend] = SqliteStorage
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный тип хранилища: {backend}")
+    key = (backend, file_name)
+    if key not in _storages:
+        _storages[key] = BACKENDS[backend](file_name)
+    return _storages[key]
@@ -0,0 +1,174 @@
+import atexit
+import bisect
+import json
+import math
+import os
+import re
+
+from metrics import timed
+from storage import write_snapshot
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    return str(text or "").casefold().replace("ё", "е")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def index_file_name(file_name):
+    return os.path.splitext(file_name)[0] + ".index.json"
+
+
+class TextIndex:
+    # Инвертированный индекс: термин -> {id документа: взвешенная частота}.
+    # Заголовок весит больше содержимого, ранжирование по BM25.
+    K1 = 1.5
+    B = 0.75
+    FIELDS = {"title": 2, "content": 1}
+
+    def __init__(self, repository, file_name):
+        self.repository = repository
+        self.file_name = file_name
+        self.postings = None
+        self.documents = None
+        self.lengths = None
+        self.terms = None
+        self.total_length = 0
+        self.dirty = False
+        repository.subscribe(self.on_change)
+        atexit.register(self.save)
+
+    def ensure_loaded(self):
+        if self.postings is None and not self.load():
+            self.rebuild()
+
+    @timed("notes.index_load")
+    def load(self):
+        try:
+            with open(self.file_name, "r") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return False
+        if data.get("fingerprint") != self.repository.storage.fingerprint():
+            return False
+
+        self.postings = {}
+        self.documents = {}
+        for term, documents in data["postings"].items():
+            postings = self.postings[term] = {}
+            for doc_id, frequency in documents.items():
+                doc_id = int(doc_id)
+                postings[doc_id] = frequency
+                self.documents.setdefault(doc_id, []).append(term)
+        self.lengths = {int(doc_id): length for doc_id, length in data["lengths"].items()}
+        self.total_length = sum(self.lengths.values())
+        self.terms = sorted(self.postings)
+        return True
+
+    @timed("notes.index_rebuild")
+    def rebuild(self):
+        self.postings = {}
+        self.documents = {}
+        self.lengths = {}
+        self.terms = []
+        self.total_length = 0
+        for record in self.repository.all():
+            self.add(record)
+        self.terms.sort()
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        # Как в итогах по финансам: сначала чужие изменения, потом отпечаток,
+        # иначе индекс без новой заметки сохранился бы как актуальный.
+        with self.repository.storage.locked(exclusive=False):
+            self.repository.sync()
+            fingerprint = self.repository.storage.fingerprint()
+        write_snapshot(self.file_name, {
+            "fingerprint": fingerprint,
+            "postings": self.postings,
+            "lengths": self.lengths,
+        })
+        self.dirty = False
+
+    def on_change(self, before, after):
+        self.ensure_loaded()
+        doc_id = after.id if after is not None else before["id"]
+        self.remove(doc_id)
+        if after is not None:
+            self.add(after, keep_sorted=True)
+        self.dirty = True
+
+    def add(self, record, keep_sorted=False):
+        frequencies = {}
+        length = 0
+        for field, weight in self.FIELDS.items():
+            for token in tokenize(getattr(record, field, "")):
+                frequencies[token] = frequencies.get(token, 0) + weight
+                length += weight
+        for term, frequency in frequencies.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self.terms, term)
+                else:
+                    self.terms.append(term)
+            postings[record.id] = frequency
+        self.documents[record.id] = list(frequencies)
+        self.lengths[record.id] = length
+        self.total_length += length
+
+    def remove(self, doc_id):
+        for term in self.documents.pop(doc_id, []):
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+        self.total_length -= self.lengths.pop(doc_id, 0)
+
+    def expand(self, token):
+        if not token.endswith("*"):
+            return [token] if token in self.postings else []
+        prefix = token.rstrip("*")
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + "\U0010ffff")
+        return self.terms[start:end]
+
+    @timed("notes.search")
+    def search(self, query, limit=20):
+        self.ensure_loaded()
+        if not self.lengths:
+            return []
+        count = len(self.lengths)
+        average_length = self.total_length / count
+        scores = {}
+        for word in query.split():
+            tokens = tokenize(word)
+            if word.endswith("*") and tokens:
+                tokens[-1] += "*"
+            for token in tokens:
+                for term in self.expand(token):
+                    postings = self.postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, frequency in postings.items():
+                        norm = self.K1 * (1 - self.B + self.B * self.lengths[doc_id] / average_length)
+                        scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        results = [(self.repository.get(doc_id), score) for doc_id, score in ranked]
+        return [(record, score) for record, score in results if record is not None]
+
+
+_indexes = {}
+
+
+def open_text_index(repository, file_name):
+    if id(repository) not in _indexes:
+        _indexes[id(repository)] = TextIndex(repository, index_file_name(file_name))
+    return _indexes[id(repository)]